@@ -0,0 +1,220 @@
+"""Benchmark the curation pipeline stages on synthetic TLC-shaped data.
+
+Each stage reports wall time, rows per second and peak resident memory.
+Results can be saved as a baseline and later runs compared against it:
+
+    python -m benchmarks.bench_pipeline --scale 1m --save-baseline
+    python -m benchmarks.bench_pipeline --scale 1m --compare
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.batch_curate import curate_many
+from scripts.clean_curate import clean_data, curate_file, derive_features, read_raw
+from scripts.metrics import current_rss_mb, peak_rss_mb, reset_peak_rss
+from scripts.synthetic import write_trips
+from scripts.validate_curated import validate_curated_data, validate_file
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, '.data')
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+SCALES = {'1k': 1_000, '1m': 1_000_000, '50m': 50_000_000}
+IN_MEMORY_STAGES = ['read', 'clean', 'derive', 'validate']
+STREAMING_STAGES = ['curate_stream', 'curate_prefetch', 'validate_stream', 'batch_stream', 'batch_prefetch']
+# In-memory stage -> the stage whose output it consumes, which must be the last in-memory stage before it
+STAGE_INPUTS = {'clean': 'read', 'derive': 'clean', 'validate': 'derive'}
+# The 50M scale does not fit in memory on a normal worker, so only stream it
+DEFAULT_STAGES = {'1k': IN_MEMORY_STAGES + STREAMING_STAGES,
+                  '1m': IN_MEMORY_STAGES + STREAMING_STAGES,
+                  '50m': STREAMING_STAGES}
+STREAM_CHUNKSIZE = 1_000_000
+BATCH_PARTS = 4
+
+def synthetic_input(scale, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'trips_{scale}_seed{seed}.csv')
+    if not os.path.exists(path):
+        print(f"Generating {SCALES[scale]:,} synthetic trips into {path}")
+        write_trips(path + '.tmp', SCALES[scale], seed=seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+def synthetic_parts(scale, seed):
+    """Write the scale as BATCH_PARTS files, the way monthly inputs arrive."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    paths = []
+    for part in range(BATCH_PARTS):
+        path = os.path.join(DATA_DIR, f'trips_{scale}_seed{seed}_part{part}.csv')
+        if not os.path.exists(path):
+            print(f"Generating part {part} of {SCALES[scale]:,} synthetic trips into {path}")
+            write_trips(path + '.tmp', SCALES[scale] // BATCH_PARTS, seed=[seed, part])
+            os.replace(path + '.tmp', path)
+        paths.append(path)
+    return paths
+
+def run_stage(name, state):
+    """Run one stage against the shared state and return the number of rows it consumed."""
+    if name == 'read':
+        state['raw'] = read_raw(state['input'])[0]
+        return len(state['raw'])
+    if name == 'clean':
+        state['clean'] = clean_data(state.pop('raw'))
+        return state['input_rows']
+    if name == 'derive':
+        state['enriched'] = derive_features(state.pop('clean'))
+        return len(state['enriched'])
+    if name == 'validate':
+        validate_curated_data(state.pop('enriched'))
+        return state['enriched_rows']
+    if name == 'curate_stream':
+        return curate_file(state['input'], state['stream_output'], chunksize=STREAM_CHUNKSIZE)
+    if name == 'curate_prefetch':
+        # Same work as curate_stream with the next chunks read on a background thread
+        return curate_file(state['input'], state['stream_output'], chunksize=STREAM_CHUNKSIZE, prefetch=2)
+    if name == 'validate_stream':
+        return validate_file(state['stream_output'], chunksize=STREAM_CHUNKSIZE)[1]
+    if name in ('batch_stream', 'batch_prefetch'):
+        # One process over several files; batch_prefetch reads into the next file while curating
+        inputs = synthetic_parts(state['scale'], state['seed'])
+        results = curate_many(inputs, state['batch_output'], workers=1, chunksize=STREAM_CHUNKSIZE // BATCH_PARTS,
+                              prefetch=2 if name == 'batch_prefetch' else 0)
+        return sum(rows for _, outputs in results for _, rows in outputs)
+    raise ValueError(f"Unknown stage {name!r}")
+
+def run_benchmark(scale, stages, seed=0, repeat=1):
+    input_file = synthetic_input(scale, seed)
+    results = {}
+    for _ in range(repeat):
+        state = {'input': input_file, 'input_rows': SCALES[scale], 'scale': scale, 'seed': seed,
+                 'stream_output': stream_output(scale, seed),
+                 'batch_output': os.path.join(DATA_DIR, f'enriched_{scale}_seed{seed}_batch')}
+        for name in stages:
+            resettable = reset_peak_rss()
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+            rows = run_stage(name, state)
+            seconds = time.perf_counter() - start
+            if name == 'derive':
+                state['enriched_rows'] = rows
+            peak = peak_rss_mb()
+            best = results.get(name)
+            if best is None or seconds < best['seconds']:
+                results[name] = {
+                    'seconds': round(seconds, 4),
+                    'rows': rows,
+                    'rows_per_sec': round(rows / seconds) if seconds else None,
+                    'peak_rss_mb': round(peak, 1),
+                    'rss_growth_mb': round(peak - rss_before, 1) if resettable else None,
+                }
+    return {
+        'scale': scale,
+        'rows': SCALES[scale],
+        'seed': seed,
+        'repeat': repeat,
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+        },
+        'stages': results,
+    }
+
+def compare(report, baseline, tolerance):
+    """Return the stages that got slower or hungrier than the baseline by more than tolerance."""
+    regressions = []
+    for name, current in report['stages'].items():
+        previous = baseline['stages'].get(name)
+        if previous is None:
+            continue
+        time_ratio = current['seconds'] / previous['seconds'] if previous['seconds'] else 1.0
+        memory_ratio = current['peak_rss_mb'] / previous['peak_rss_mb'] if previous['peak_rss_mb'] else 1.0
+        flagged = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        print(f"  {name:<16} time x{time_ratio:5.2f}  peak RSS x{memory_ratio:5.2f}{'  REGRESSION' if flagged else ''}")
+        if flagged:
+            regressions.append(name)
+    return regressions
+
+def print_report(report):
+    print(f"Scale {report['scale']} ({report['rows']:,} rows, seed {report['seed']}, best of {report['repeat']})")
+    print(f"  {'stage':<16} {'seconds':>9} {'rows/sec':>12} {'peak RSS MB':>12} {'growth MB':>10}")
+    for name, stage in report['stages'].items():
+        growth = '-' if stage['rss_growth_mb'] is None else f"{stage['rss_growth_mb']:.1f}"
+        print(f"  {name:<16} {stage['seconds']:>9.3f} {stage['rows_per_sec'] or 0:>12,} "
+              f"{stage['peak_rss_mb']:>12.1f} {growth:>10}")
+
+def stream_output(scale, seed):
+    return os.path.join(DATA_DIR, f'enriched_{scale}_seed{seed}.parquet')
+
+def stage_order_error(stages, scale, seed):
+    """Return why run_stage cannot run stages in this order, or None if it can."""
+    previous = None
+    curated = os.path.exists(stream_output(scale, seed))
+    for name in stages:
+        if name in STAGE_INPUTS and previous != STAGE_INPUTS[name]:
+            return f"stage {name!r} needs {STAGE_INPUTS[name]!r} as the in-memory stage right before it"
+        if name == 'validate_stream' and not curated:
+            return "stage 'validate_stream' needs 'curate_stream' or 'curate_prefetch' before it"
+        if name in IN_MEMORY_STAGES:
+            previous = name
+        curated = curated or name in ('curate_stream', 'curate_prefetch')
+    return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the curation pipeline on synthetic trips.')
+    parser.add_argument('--scale', choices=SCALES, default='1m', help='number of synthetic trips')
+    parser.add_argument('--stages', nargs='+', choices=IN_MEMORY_STAGES + STREAMING_STAGES,
+                        help='stages to run, in order (default depends on the scale)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per stage, the fastest is kept')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='compare against the stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown or memory growth before a stage is flagged')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+    if args.stages:
+        error = stage_order_error(args.stages, args.scale, args.seed)
+        if error:
+            parser.error(error)
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    stages = args.stages or DEFAULT_STAGES[args.scale]
+    report = run_benchmark(args.scale, stages, seed=args.seed, repeat=args.repeat)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline_path = os.path.join(BASELINE_DIR, f'{args.scale}.json')
+    status = 0
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            print(f"No baseline at {baseline_path}, run with --save-baseline first.")
+            return 2
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"Compared with baseline from {baseline['machine']['platform']}:")
+        if compare(report, baseline, args.tolerance):
+            status = 1
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
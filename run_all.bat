@@ -1,10 +1,6 @@
 @echo off
-echo Running data curation...
-python scripts/clean_curate.py
-echo Running validation...
-python scripts/validate_curated.py
-echo Generating visualizations...
-python scripts/visualize_data.py
+echo Running curation, validation and visualizations...
+python -m scripts.pipeline
 echo Creating project logo...
 python scripts/create_logo.py
 echo Generating PDF article...
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from scripts.features import TRIP_TYPES, trip_type_codes
+from scripts.sketches import Moments
+from scripts.storage import iter_table, read_table
+
+CORRELATION_FEATURES = ['trip_distance', 'trip_duration', 'trip_speed_mph', 'tip_percentage', 'is_peak_hour']
+AGGREGATED_COLUMNS = ['trip_distance', 'trip_duration', 'trip_speed_mph', 'tip_percentage',
+                      'trip_type', 'is_peak_hour']
+
+# Fixed bin edges, so aggregates of different chunks can simply be added up.
+# Values outside an edge range are counted in its first or last bin.
+SPEED_BINS = np.linspace(0, 100, 31)
+TIP_BINS = np.linspace(0, 100, 21)
+# Fine tip bins (0.1%) for the box plot quantiles
+TIP_QUANTILE_BINS = np.linspace(0, 100, 1001)
+DENSITY_DISTANCE_BINS = np.linspace(0, 40, 81)
+DENSITY_SPEED_BINS = np.linspace(0, 100, 51)
+# Key prefix of the CORRELATION_FEATURES moments, stored with Moments.to_arrays
+MOMENTS = 'moments'
+
+def _bin_index(values, edges):
+    index = np.searchsorted(edges, values, side='right') - 1
+    return np.clip(index, 0, len(edges) - 2)
+
+def _histogram(values, edges, groups=None, n_groups=1):
+    index = _bin_index(values, edges)
+    if groups is not None:
+        index = groups * (len(edges) - 1) + index
+    counts = np.bincount(index, minlength=n_groups * (len(edges) - 1))
+    return counts.reshape(n_groups, len(edges) - 1) if groups is not None else counts
+
+def compute_plot_aggregates(df):
+    """Reduce an enriched frame to the fixed-size arrays every chart is drawn from.
+
+    A single pass over each column builds the histograms, per trip type tip
+    histograms, the speed/distance density, the sums for means and the running
+    moments behind the correlation matrix. The result does not grow with the
+    number of rows.
+    """
+    speed = df['trip_speed_mph'].to_numpy(dtype='float64', na_value=np.nan)
+    tip = df['tip_percentage'].to_numpy(dtype='float64', na_value=np.nan)
+    distance = df['trip_distance'].to_numpy(dtype='float64', na_value=np.nan)
+    peak = df['is_peak_hour'].to_numpy(dtype='float64', na_value=np.nan)
+    trip_type = trip_type_codes(df['trip_type'])
+
+    has_speed = ~np.isnan(speed)
+    has_tip = ~np.isnan(tip)
+    peak_flag = peak == 1
+    typed = (trip_type >= 0) & has_tip
+    density = has_speed & ~np.isnan(distance)
+
+    features = np.column_stack([df[c].to_numpy(dtype='float64', na_value=np.nan) for c in CORRELATION_FEATURES])
+
+    return {
+        'rows': np.array(len(df)),
+        'speed_hist': _histogram(speed[has_speed], SPEED_BINS),
+        'speed_sum': np.array(speed[has_speed].sum()),
+        'speed_count': np.array(has_speed.sum()),
+        'speed_peak_hist': _histogram(speed[has_speed], SPEED_BINS, peak_flag[has_speed].astype(int), 2),
+        'tip_hist': _histogram(tip[has_tip], TIP_BINS),
+        'tip_sum': np.array(tip[has_tip].sum()),
+        'tip_count': np.array(has_tip.sum()),
+        'tip_type_hist': _histogram(tip[typed], TIP_QUANTILE_BINS, trip_type[typed], len(TRIP_TYPES)),
+        'trip_type_counts': np.bincount(trip_type[trip_type >= 0], minlength=len(TRIP_TYPES)),
+        'peak_counts': np.array([(peak == 0).sum(), peak_flag.sum()]),
+        'density': _histogram(speed[density], DENSITY_SPEED_BINS,
+                              _bin_index(distance[density], DENSITY_DISTANCE_BINS),
+                              len(DENSITY_DISTANCE_BINS) - 1),
+        **Moments(len(CORRELATION_FEATURES)).update(features).to_arrays(MOMENTS),
+    }
+
+def empty_plot_aggregates():
+    """Aggregates of no rows, which merge_plot_aggregates leaves unchanged."""
+    return compute_plot_aggregates(pd.DataFrame({column: np.array([], dtype='float64')
+                                                 for column in AGGREGATED_COLUMNS}))
+
+def merge_plot_aggregates(left, right):
+    """Combine the aggregates of two disjoint sets of rows."""
+    merged = {key: left[key] + right[key] for key in left if not key.startswith(f'{MOMENTS}/')}
+    moments = Moments.from_arrays(left, MOMENTS).merge(Moments.from_arrays(right, MOMENTS))
+    return {**merged, **moments.to_arrays(MOMENTS)}
+
+def aggregate_file(file_path, chunksize=None, fmt=None):
+    """Compute plot aggregates for an enriched file, streaming it when chunksize is set."""
+    if not chunksize:
+        return compute_plot_aggregates(read_table(file_path, columns=AGGREGATED_COLUMNS, fmt=fmt))
+    totals = empty_plot_aggregates()
+    for chunk in iter_table(file_path, chunksize, columns=AGGREGATED_COLUMNS, fmt=fmt):
+        totals = merge_plot_aggregates(totals, compute_plot_aggregates(chunk))
+    return totals
+
+def mean(aggregates, name):
+    count = aggregates[f'{name}_count']
+    return float(aggregates[f'{name}_sum'] / count) if count else float('nan')
+
+def histogram_quantiles(counts, edges, quantiles):
+    """Interpolate quantiles from a histogram, exact to within one bin width.
+
+    Quantiles stay within the first and last non-empty bins, so 0 and 1 give
+    the data's minimum and maximum rather than the outer edges.
+    """
+    filled = np.flatnonzero(counts)
+    if not len(filled):
+        return np.full(len(quantiles), np.nan)
+    first, last = filled[0], filled[-1] + 1
+    cumulative = np.cumsum(counts[first:last])
+    positions = np.concatenate([[0], cumulative]) / cumulative[-1]
+    return np.interp(quantiles, positions, edges[first:last + 1])
+
+def box_stats(aggregates):
+    """Box plot statistics of tip percentage per trip type, in the form Axes.bxp expects."""
+    stats = []
+    for label, counts in zip(TRIP_TYPES, aggregates['tip_type_hist']):
+        low, q1, med, q3, high = histogram_quantiles(counts, TIP_QUANTILE_BINS, [0, 0.25, 0.5, 0.75, 1])
+        iqr = q3 - q1
+        stats.append({
+            'label': label, 'q1': q1, 'med': med, 'q3': q3, 'fliers': [],
+            'whislo': max(low, q1 - 1.5 * iqr), 'whishi': min(high, q3 + 1.5 * iqr),
+        })
+    return stats
+
+def correlation_matrix(aggregates):
+    """Pearson correlation of CORRELATION_FEATURES from the accumulated running moments."""
+    return Moments.from_arrays(aggregates, MOMENTS).correlation()
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+from scripts.features import TRIP_TYPES, trip_type_codes
+from scripts.sketches import KLLSketch
+from scripts.storage import iter_table, read_table
+
+# Modified z-score cut-off of Iglewicz and Hoaglin
+ROBUST_Z_THRESHOLD = 3.5
+# Groups with fewer trips are too small to call anything in them an outlier
+MIN_GROUP_ROWS = 30
+# Scales the median absolute deviation to a standard deviation for normal data
+MAD_TO_STD = 1.4826
+N_GROUPS = 24 * len(TRIP_TYPES)
+ANOMALY_COLUMNS = ['pickup_hour', 'trip_type', 'trip_distance', 'trip_duration', 'fare_amount', 'fare_per_mile']
+QUARANTINE_COLUMNS = ['row_id', 'metric', 'pickup_hour', 'trip_type', 'value', 'robust_z']
+
+def _speed_mph(df):
+    # Recomputed rather than read from trip_speed_mph, which derive_features caps
+    if 'trip_distance' not in df.columns or 'trip_duration' not in df.columns:
+        return None
+    distance = df['trip_distance'].to_numpy(dtype='float64', na_value=np.nan)
+    duration = df['trip_duration'].to_numpy(dtype='float64', na_value=np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return distance / (duration / 3600)
+
+def _fare_per_mile(df):
+    if 'fare_per_mile' in df.columns:
+        return df['fare_per_mile'].to_numpy(dtype='float64', na_value=np.nan)
+    if 'fare_amount' not in df.columns or 'trip_distance' not in df.columns:
+        return None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (df['fare_amount'].to_numpy(dtype='float64', na_value=np.nan)
+                / df['trip_distance'].to_numpy(dtype='float64', na_value=np.nan))
+
+# Metric name -> function returning its values for a frame, or None when its inputs are missing
+ANOMALY_METRICS = {
+    'speed_mph': _speed_mph,
+    'fare_per_mile': _fare_per_mile,
+}
+
+def group_codes(df):
+    """Code every row by pickup hour x trip type, -1 where either is missing or unknown."""
+    hours = df['pickup_hour'].to_numpy(dtype='float64', na_value=np.nan)
+    trip_type = trip_type_codes(df['trip_type'])
+    valid = (hours >= 0) & (hours < 24) & (trip_type >= 0)
+    codes = np.where(valid, np.nan_to_num(hours).astype('int64') * len(TRIP_TYPES) + trip_type, -1)
+    return codes
+
+def _usable(values, groups):
+    return (groups >= 0) & np.isfinite(values)
+
+def grouped_median(values, groups, n_groups=N_GROUPS):
+    """Median of values per group code, NaN for empty groups, from a single sort."""
+    order = np.lexsort((values, groups))
+    values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    low = starts + np.maximum(counts - 1, 0) // 2
+    high = starts + counts // 2
+    medians = np.full(n_groups, np.nan)
+    present = counts > 0
+    medians[present] = (values[low[present]] + values[high[present]]) / 2
+    return medians
+
+def robust_stats(values, groups, n_groups=N_GROUPS):
+    """Exact per-group median, median absolute deviation and row count of the finite values."""
+    usable = _usable(values, groups)
+    values, groups = values[usable], groups[usable]
+    median = grouped_median(values, groups, n_groups)
+    mad = grouped_median(np.abs(values - median[groups]), groups, n_groups)
+    return median, mad, np.bincount(groups, minlength=n_groups)
+
+def robust_z(values, groups, stats):
+    """Modified z-score of every value against its group, NaN where it cannot be scored."""
+    median, mad, counts = stats
+    scored = _usable(values, groups)
+    scored[scored] = (counts[groups[scored]] >= MIN_GROUP_ROWS) & (mad[groups[scored]] > 0)
+    z = np.full(len(values), np.nan)
+    index = groups[scored]
+    z[scored] = (values[scored] - median[index]) / (MAD_TO_STD * mad[index])
+    return z
+
+def exact_anomaly_stats(df):
+    """Per metric robust statistics of a frame held in memory."""
+    groups = group_codes(df)
+    stats = {}
+    for name, metric in ANOMALY_METRICS.items():
+        values = metric(df)
+        if values is not None:
+            stats[name] = robust_stats(values, groups)
+    return stats
+
+def sketched_anomaly_stats(chunks):
+    """Per metric robust statistics of a stream of frames, from one KLL sketch per group.
+
+    Memory stays constant however many chunks there are; medians and deviations
+    are approximate, to within the sketches' rank error.
+    """
+    sketches = {}
+    for chunk in chunks:
+        groups = group_codes(chunk)
+        for name, metric in ANOMALY_METRICS.items():
+            values = metric(chunk)
+            if values is None:
+                continue
+            group_sketches = sketches.setdefault(name, [KLLSketch() for _ in range(N_GROUPS)])
+            usable = _usable(values, groups)
+            order = np.argsort(groups[usable], kind='stable')
+            values = values[usable][order]
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(groups[usable], minlength=N_GROUPS))])
+            for group, sketch in enumerate(group_sketches):
+                if bounds[group + 1] > bounds[group]:
+                    sketch.update(values[bounds[group]:bounds[group + 1]])
+    return {name: (np.array([sketch.quantiles([0.5])[0] for sketch in group_sketches]),
+                   np.array([sketch.median_absolute_deviation() for sketch in group_sketches]),
+                   np.array([sketch.count for sketch in group_sketches]))
+            for name, group_sketches in sketches.items()}
+
+def _concat(flagged):
+    if not flagged:
+        return pd.DataFrame(columns=QUARANTINE_COLUMNS)
+    return pd.concat(flagged, ignore_index=True)
+
+def detect_anomalies(df, stats=None, threshold=ROBUST_Z_THRESHOLD):
+    """Flag the rows of df whose metrics are outliers within their hour x trip type group.
+
+    Nothing in df is modified. Returns one row per flagged (row, metric) with the
+    row's index label, so the trips can be quarantined by ID. stats defaults to
+    exact statistics of df itself; pass those of a whole file to score chunks.
+    """
+    stats = exact_anomaly_stats(df) if stats is None else stats
+    groups = group_codes(df)
+    flagged = []
+    for name, metric_stats in stats.items():
+        values = ANOMALY_METRICS[name](df)
+        z = robust_z(values, groups, metric_stats)
+        positions = np.flatnonzero(np.abs(z) > threshold)
+        flagged.append(pd.DataFrame({
+            'row_id': df.index[positions],
+            'metric': pd.Categorical([name] * len(positions), categories=list(ANOMALY_METRICS)),
+            'pickup_hour': groups[positions] // len(TRIP_TYPES),
+            'trip_type': pd.Categorical.from_codes(groups[positions] % len(TRIP_TYPES), categories=TRIP_TYPES),
+            'value': values[positions],
+            'robust_z': z[positions],
+        }))
+    return _concat(flagged)
+
+def detect_file_anomalies(file_path, chunksize=None, fmt=None, threshold=ROBUST_Z_THRESHOLD):
+    """Flag outliers in an enriched file, with row IDs being row positions in the file.
+
+    With a chunksize the file is read twice, once to sketch the group statistics
+    and once to score the rows, so memory does not grow with the file.
+    """
+    if not chunksize:
+        df = read_table(file_path, columns=ANOMALY_COLUMNS, fmt=fmt)
+        return detect_anomalies(df.reset_index(drop=True), threshold=threshold)
+    stats = sketched_anomaly_stats(iter_table(file_path, chunksize, columns=ANOMALY_COLUMNS, fmt=fmt))
+    flagged = []
+    rows = 0
+    for chunk in iter_table(file_path, chunksize, columns=ANOMALY_COLUMNS, fmt=fmt):
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        flagged.append(detect_anomalies(chunk, stats, threshold))
+        rows += len(chunk)
+    return _concat(flagged)
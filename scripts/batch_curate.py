@@ -0,0 +1,221 @@
+import argparse
+import functools
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.clean_curate import (RAW_DATETIME_FORMAT, RAW_TRIP_DTYPES, curate_frame, curation_settings, raw_columns,
+                                  read_raw)
+from scripts.features import FEATURES
+from scripts.manifest import (MANIFEST_NAME, input_fingerprint, is_up_to_date, load_manifest,
+                              record_input, recorded_outputs, save_manifest)
+from scripts.partitions import update_partition_index
+from scripts.prefetch import read_ahead
+from scripts.storage import FORMATS, TableWriter, apply_dtypes, infer_format, remove_table
+
+FORMAT_SUFFIXES = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather', 'npy': '.npy'}
+
+def expand_inputs(patterns):
+    """Expand globs and plain paths into a sorted, de-duplicated list of raw files."""
+    inputs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for path in matches:
+            if path not in inputs:
+                inputs.append(path)
+
+    stems = [os.path.basename(path).split('.')[0] for path in inputs]
+    duplicates = sorted({stem for stem in stems if stems.count(stem) > 1})
+    if duplicates:
+        raise ValueError(f"Input files must have distinct names, got duplicates: {duplicates}")
+    return inputs
+
+def plan_partitions(inputs, split_row_groups=False, input_format=None):
+    """Return one (input_file, row_group) task per file, or per Parquet row group."""
+    tasks = []
+    for input_file in inputs:
+        if split_row_groups and infer_format(input_file, input_format) == 'parquet':
+            import pyarrow.parquet as pq
+            num_row_groups = pq.ParquetFile(input_file).num_row_groups
+            tasks.extend((input_file, i) for i in range(num_row_groups))
+        else:
+            tasks.append((input_file, None))
+    return tasks
+
+def partition_dir(output_dir, year, month):
+    return os.path.join(output_dir, f'year={year:04d}', f'month={month:02d}')
+
+def _read_partition(input_file, row_group, chunksize, input_format, columns=None):
+    if row_group is not None:
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(input_file)
+        if columns is not None:
+            columns = [c for c in parquet_file.schema_arrow.names if c in columns]
+        df = parquet_file.read_row_group(row_group, columns=columns).to_pandas()
+        return [apply_dtypes(df, RAW_TRIP_DTYPES, RAW_DATETIME_FORMAT)]
+    return read_raw(input_file, chunksize, input_format, columns)
+
+def _partition_chunks(task):
+    input_file, row_group, _, _, chunksize, input_format, features = task
+    columns = raw_columns(features) if features is not None else None
+    return _read_partition(input_file, row_group, chunksize, input_format, columns)
+
+def _prefetched_partitions(tasks, depth):
+    """Yield (task, chunks) for every task, reading up to depth raw chunks ahead on one thread.
+
+    The read-ahead runs across partition boundaries, so the next input is
+    already being read while the last chunks of the current one are curated.
+    Each partition's chunks must be consumed before the next is requested.
+    """
+    chunks = read_ahead(((index, chunk) for index, task in enumerate(tasks) for chunk in _partition_chunks(task)),
+                        depth)
+    upcoming = next(chunks, None)
+
+    def partition(index):
+        nonlocal upcoming
+        while upcoming is not None and upcoming[0] == index:
+            yield upcoming[1]
+            upcoming = next(chunks, None)
+
+    for index, task in enumerate(tasks):
+        yield task, partition(index)
+
+def curate_partition(task, chunks=None, prefetch=0):
+    """Clean and enrich one input partition into the year=/month= layout.
+
+    The raw chunks are read from the input unless given. With prefetch, a
+    background thread reads up to that many of them ahead while the current
+    one is curated. Returns the input file and a sorted list of
+    (output_file, rows) pairs.
+    """
+    input_file, row_group, output_dir, fmt, chunksize, input_format, features = task
+    name = os.path.basename(input_file).split('.')[0]
+    if row_group is not None:
+        name = f'{name}-rg{row_group:04d}'
+    if chunks is None:
+        chunks = _partition_chunks(task)
+        if prefetch:
+            chunks = read_ahead(chunks, prefetch)
+
+    writers = {}
+    try:
+        for chunk in chunks:
+            chunk = curate_frame(chunk, features)
+            pickups = chunk['pickup_datetime'].dt
+            for (year, month), part in chunk.groupby([pickups.year, pickups.month], sort=True):
+                key = (int(year), int(month))
+                if key not in writers:
+                    directory = partition_dir(output_dir, *key)
+                    os.makedirs(directory, exist_ok=True)
+                    writers[key] = TableWriter(os.path.join(directory, name + FORMAT_SUFFIXES[fmt]), fmt)
+                writers[key].write(part)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    outputs = [(writers[key].path, writers[key].rows) for key in sorted(writers)]
+    return input_file, outputs
+
+def curate_many(inputs, output_dir, workers=None, fmt='parquet', chunksize=None,
+                input_format=None, split_row_groups=False, features=None, prefetch=0):
+    """Curate many raw files in parallel, one process per partition.
+
+    Results come back in input order regardless of which worker finishes first.
+    With a list of features only those are derived from only the columns they need.
+
+    With prefetch, up to prefetch raw chunks are read ahead on a thread,
+    overlapping I/O with compute, so a chunksize should be set to bound memory.
+    In a single process the read-ahead continues into the next inputs; each
+    pool worker reads ahead within its own partition.
+    """
+    tasks = [(input_file, row_group, output_dir, fmt, chunksize, input_format, features)
+             for input_file, row_group in plan_partitions(inputs, split_row_groups, input_format)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        if prefetch:
+            return [curate_partition(task, chunks) for task, chunks in _prefetched_partitions(tasks, prefetch)]
+        return [curate_partition(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        return list(executor.map(functools.partial(curate_partition, prefetch=prefetch), tasks))
+
+def curate_incremental(inputs, output_dir, force=False, checksum=False, **options):
+    """Curate only the inputs that are new or changed since the last run.
+
+    A manifest in output_dir records each input's fingerprint, the curation
+    settings and the partitions it produced. Returns the curate_many results for
+    the recomputed inputs and the list of skipped ones. The partition index read
+    by scripts.partitions.load_trips is brought up to date as well.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    settings = curation_settings(options.get('fmt', 'parquet'), output_dir=os.path.abspath(output_dir),
+                                 split_row_groups=options.get('split_row_groups', False),
+                                 features=options.get('features'))
+    fingerprints = {path: input_fingerprint(path, checksum=checksum) for path in inputs}
+
+    pending = [path for path in inputs
+               if force or not is_up_to_date(manifest, path, fingerprints[path], settings)]
+    skipped = [path for path in inputs if path not in pending]
+    for path in pending:
+        # Drop partitions from the previous run, the new data may not reach them all
+        for output in recorded_outputs(manifest, path):
+            if os.path.exists(output):
+                remove_table(output)
+
+    results = curate_many(pending, output_dir, **options)
+    outputs = {path: [] for path in pending}
+    for input_file, partitions in results:
+        outputs[input_file].extend(output for output, _ in partitions)
+    for path in pending:
+        record_input(manifest, path, fingerprints[path], settings, outputs[path])
+    os.makedirs(output_dir, exist_ok=True)
+    save_manifest(manifest, manifest_path)
+    update_partition_index(output_dir)
+    return results, skipped
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Clean and enrich many raw NYC yellow taxi files in parallel.')
+    parser.add_argument('inputs', nargs='+', help='raw trip files or glob patterns')
+    parser.add_argument('--output-dir', default='data/enriched', help='root of the year=/month= output layout')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--format', choices=FORMATS, default='parquet', help='enriched file format')
+    parser.add_argument('--input-format', choices=FORMATS, default=None,
+                        help='raw file format (default: from the file extension)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream each input in chunks of this many rows to bound worker memory')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='with --chunksize, read this many raw chunks ahead on a background thread')
+    parser.add_argument('--split-row-groups', action='store_true',
+                        help='process every Parquet row group as its own partition')
+    parser.add_argument('--features', nargs='+', choices=list(FEATURES), default=None,
+                        help='derive only these features and read only the raw columns they need')
+    parser.add_argument('--force', action='store_true',
+                        help='recompute every input, not only new or changed ones')
+    parser.add_argument('--checksum', action='store_true',
+                        help='detect input changes by SHA-256 instead of size and modification time')
+    args = parser.parse_args(argv)
+    if args.prefetch and not args.chunksize:
+        parser.error('--prefetch reads raw chunks ahead and needs --chunksize')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    inputs = expand_inputs(args.inputs)
+    missing = [path for path in inputs if not os.path.exists(path)]
+    if missing:
+        print(f"Input files not found: {', '.join(missing)}")
+        return
+
+    results, skipped = curate_incremental(inputs, args.output_dir, force=args.force, checksum=args.checksum,
+                                          workers=args.workers, fmt=args.format, chunksize=args.chunksize,
+                                          input_format=args.input_format, split_row_groups=args.split_row_groups,
+                                          features=args.features, prefetch=args.prefetch)
+    if skipped:
+        print(f"Skipped {len(skipped)} unchanged inputs")
+    for input_file, outputs in results:
+        rows = sum(count for _, count in outputs)
+        print(f"{input_file}: {rows} rows in {len(outputs)} partitions")
+    print(f"Enriched partitions saved to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
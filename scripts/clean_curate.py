@@ -1,52 +1,350 @@
-import pandas as pd
+import argparse
 import os
 
-def derive_features(df):
-    # Calculate trip speed (miles per hour)
-    # Assume trip_duration is in seconds
-    df['trip_speed_mph'] = df['trip_distance'] / (df['trip_duration'] / 3600)
-    df['trip_speed_mph'] = df['trip_speed_mph'].clip(upper=100)  # Limit unrealistic speeds
+import numpy as np
+import pandas as pd
 
-    # Calculate tip percentage
-    df['tip_percentage'] = (df['tip_amount'] / df['total_amount'].replace(0, pd.NA)) * 100
-    df['tip_percentage'] = df['tip_percentage'].fillna(0).clip(upper=100)
+from scripts.cube import CUBE_FEATURES, compute_cube, empty_cube, merge_cubes, save_cube
+from scripts.feature_cache import DEFAULT_MAX_BYTES, FeatureCache
+from scripts.features import (CLEAN_INPUT_COLUMNS, CLEAN_OUTPUT_COLUMNS, DEFAULT_FEATURES, FEATURES,
+                              feature_inputs, resolve_features)
+from scripts.manifest import MANIFEST_NAME, input_fingerprint, is_up_to_date, load_manifest, record_input, save_manifest
+from scripts.metrics import PipelineMetrics, null_stage, profiled
+from scripts.prefetch import read_ahead
+from scripts.storage import FORMATS, TableWriter, infer_format, iter_table, read_table, write_table
+from scripts.windows import WINDOW_INPUT_COLUMNS, WindowAggregator
+from scripts.zones import ZONE_INPUT_COLUMNS, add_zone_columns, load_zone_lookup
 
-    # Mark peak hours
-    df['is_peak_hour'] = df['pickup_hour'].isin([7, 8, 17, 18]).astype(int)
+DEFAULT_INPUT_FILE = 'data/nyc_taxi_raw.csv'
+DEFAULT_OUTPUT_FILE = 'data/nyc_taxi_enriched.csv'
 
-    # Categorize trip type based on duration (in minutes)
-    df['trip_type'] = pd.cut(df['trip_duration'] / 60, bins=[0, 10, 30, float('inf')], labels=['short', 'medium', 'long'])
+# Bump whenever clean_data or derive_features change their output, so that
+# incremental runs recompute inputs curated by the previous logic
+FEATURE_VERSION = 1
 
-    return df
+# TLC Parquet/CSV releases prefix the timestamps with the service type
+RAW_COLUMN_ALIASES = {
+    'tpep_pickup_datetime': 'pickup_datetime',
+    'tpep_dropoff_datetime': 'dropoff_datetime',
+    'lpep_pickup_datetime': 'pickup_datetime',
+    'lpep_dropoff_datetime': 'dropoff_datetime',
+}
+
+# Raw TLC timestamps are always written as e.g. 2024-01-31 23:59:58
+RAW_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Compact types for the raw trip columns, following the TLC data dictionary
+VENDOR_ID_DTYPE = pd.CategoricalDtype([1, 2, 6, 7])
+RATE_CODE_DTYPE = pd.CategoricalDtype([1, 2, 3, 4, 5, 6, 99])
+PAYMENT_TYPE_DTYPE = pd.CategoricalDtype([0, 1, 2, 3, 4, 5, 6])
+AMOUNT_COLUMNS = ['trip_distance', 'fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
+                  'improvement_surcharge', 'total_amount', 'congestion_surcharge', 'airport_fee',
+                  'Airport_fee', 'cbd_congestion_fee']
+RAW_TRIP_DTYPES = {
+    'VendorID': VENDOR_ID_DTYPE,
+    'pickup_datetime': 'datetime64[ns]',
+    'dropoff_datetime': 'datetime64[ns]',
+    'tpep_pickup_datetime': 'datetime64[ns]',
+    'tpep_dropoff_datetime': 'datetime64[ns]',
+    'lpep_pickup_datetime': 'datetime64[ns]',
+    'lpep_dropoff_datetime': 'datetime64[ns]',
+    'passenger_count': 'float32',  # missing on some trips
+    'RatecodeID': RATE_CODE_DTYPE,
+    'store_and_fwd_flag': pd.CategoricalDtype(['N', 'Y']),
+    'PULocationID': 'int16',
+    'DOLocationID': 'int16',
+    'payment_type': PAYMENT_TYPE_DTYPE,
+    **{column: 'float32' for column in AMOUNT_COLUMNS},
+}
 
-def clean_data(df):
-    # Basic quality filters
-    df = df.dropna(subset=['pickup_datetime', 'dropoff_datetime', 'trip_distance'])
-    df = df[df['trip_distance'] > 0]
-    df = df[df['total_amount'] > 0]
+def derive_features(df, cache=None, features=None):
+    """Add the derived feature columns to df.
+
+    features names the registered features to add (DEFAULT_FEATURES by default).
+    Features they depend on are computed first and dropped again unless requested.
+    With a FeatureCache, each feature is looked up by the content of its input
+    columns and its parameters, and only computed when no cached copy exists.
+    """
+    features = DEFAULT_FEATURES if features is None else features
+    digests = {}
+    resolved = resolve_features(features)
+    for name in resolved:
+        fn, inputs, params = FEATURES[name]
+        if cache is None:
+            df[name] = fn(df)
+        else:
+            params = {**params, 'feature_version': FEATURE_VERSION}
+            df[name] = cache.get_or_compute(name, params, df, inputs, fn, digests)
+    intermediates = [name for name in resolved if name not in features]
+    return df.drop(columns=intermediates) if intermediates else df
+
+def raw_columns(features):
+    """Return the raw columns, under every TLC alias, that clean_data and features need."""
+    columns = CLEAN_INPUT_COLUMNS + [column for column in feature_inputs(features)
+                                     if column not in CLEAN_INPUT_COLUMNS + CLEAN_OUTPUT_COLUMNS]
+    aliases = [alias for alias, column in RAW_COLUMN_ALIASES.items() if column in columns]
+    return columns + aliases
+
+def _values(series):
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+def clean_data(df, metrics=None):
+    # Shallow copy, so converted columns never leak back into the caller's frame
+    df = df.copy(deep=False)
+    df.rename(columns=RAW_COLUMN_ALIASES, inplace=True)
+    # Timestamps are normally parsed at read time, convert any still held as text
+    for column in ['pickup_datetime', 'dropoff_datetime']:
+        if not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], format=RAW_DATETIME_FORMAT)
     # Calculate trip_duration if it doesn't exist
+    if 'trip_duration' in df.columns:
+        duration = _values(df['trip_duration'])
+    else:
+        duration = _values((df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds())
+
+    # Basic quality filters, combined into one mask so the frame is compacted once.
+    # Each dropped row is attributed to the first filter it fails.
+    filters = [
+        ('missing_values', df[['pickup_datetime', 'dropoff_datetime', 'trip_distance']].notna().all(axis=1).to_numpy()),
+        ('non_positive_distance', _values(df['trip_distance']) > 0),
+        ('non_positive_total_amount', _values(df['total_amount']) > 0),
+        ('non_positive_duration', duration > 0),
+    ]
+    valid = np.ones(len(df), dtype=bool)
+    for name, passed in filters:
+        if metrics is not None:
+            metrics.count_filtered(name, np.count_nonzero(valid & ~passed))
+        valid &= passed
+    positions = np.flatnonzero(valid)
+    df = df.take(positions)
+
     if 'trip_duration' not in df.columns:
-        df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
-        df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
-        df['trip_duration'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds()
-    df = df[df['trip_duration'] > 0]
+        df['trip_duration'] = duration[positions]
     # Extract pickup_hour
-    df['pickup_hour'] = df['pickup_datetime'].dt.hour
+    df['pickup_hour'] = df['pickup_datetime'].dt.hour.astype('int8')
     return df
 
-def main():
-    input_file = 'data/nyc_taxi_raw.csv'
-    output_file = 'data/nyc_taxi_enriched.csv'
-    
+def curate_frame(df, features=None):
+    df = clean_data(df)
+    return derive_features(df, features=features)
+
+def read_raw(input_file, chunksize=None, input_format=None, columns=None):
+    """Read a raw trip file with the declared raw schema, whole or in chunks."""
+    options = {'columns': columns, 'fmt': input_format, 'dtypes': RAW_TRIP_DTYPES,
+               'date_format': RAW_DATETIME_FORMAT}
+    if chunksize:
+        return iter_table(input_file, chunksize, **options)
+    return [read_table(input_file, **options)]
+
+def iter_curated(input_file, chunksize=None, input_format=None, metrics=None, feature_cache=None, features=None,
+                 prefetch=0, zones=None, windows=None):
+    """Yield input_file cleaned and enriched, whole or in chunks of at most chunksize raw rows.
+
+    Takes the same options as curate_file, which writes what this yields.
+    """
+    stage = metrics.stage if metrics is not None else null_stage
+    columns = raw_columns(features) if features is not None else None
+    if columns is not None and zones is not None:
+        columns += ZONE_INPUT_COLUMNS
+    if columns is not None and windows is not None:
+        columns += [column for column in WINDOW_INPUT_COLUMNS if column not in columns]
+    chunks = iter(read_raw(input_file, chunksize, input_format, columns))
+    if prefetch:
+        chunks = read_ahead(chunks, prefetch)
+    while True:
+        with stage('read') as record:
+            chunk = next(chunks, None)
+            record['rows_out'] = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            break
+        with stage('clean', rows_in=len(chunk)) as record:
+            chunk = clean_data(chunk, metrics)
+            record['rows_out'] = len(chunk)
+        with stage('derive', rows_in=len(chunk)) as record:
+            chunk = derive_features(chunk, feature_cache, features)
+            record['rows_out'] = len(chunk)
+        if zones is not None:
+            with stage('zones', rows_in=len(chunk)):
+                chunk = add_zone_columns(chunk, zones)
+        if windows is not None:
+            with stage('windows', rows_in=len(chunk)) as record:
+                chunk = windows.update(chunk)
+                record['rows_out'] = len(chunk)
+            if not len(chunk):
+                continue
+        yield chunk
+    if windows is not None:
+        with stage('windows') as record:
+            chunk = windows.finish()
+            record['rows_out'] = len(chunk)
+        if len(chunk):
+            yield chunk
+
+def curate_file(input_file, output_file, chunksize=None, input_format=None, output_format=None, metrics=None,
+                feature_cache=None, features=None, prefetch=0, cube_path=None, zones=None, windows=None):
+    """Clean and enrich input_file into output_file, returning the number of rows written.
+
+    With a chunksize the raw file is streamed in chunks of that many rows and each
+    curated chunk is appended to the output, so peak memory is bounded by the chunk
+    size instead of the file size. Every row is cleaned and derived independently,
+    so the streamed output matches the in-memory output byte for byte.
+
+    Pass a PipelineMetrics to record the read, clean, derive and write stages, and
+    a FeatureCache to reuse derived columns computed by earlier runs.
+
+    With a list of features only those are derived, and only the raw columns
+    they and clean_data need are read. The default keeps every raw column.
+
+    With prefetch, a background thread reads up to that many chunks ahead while
+    the current one is cleaned and derived.
+
+    With a zone lookup from scripts.zones.load_zone_lookup, the pickup and
+    dropoff borough, zone and service zone are added as categorical columns.
+
+    With a scripts.windows.WindowAggregator, per 15-minute bucket trip counts
+    and median speeds and per zone pickups in the last hour are added. The
+    input must then be sorted by pickup bucket, and rows come out in pickup order.
+
+    With a cube_path, the aggregate cube of the enriched rows (see scripts.cube)
+    is built alongside and saved there. The features the cube reads are then
+    derived as well, together with whatever they depend on.
+    """
+    stage = metrics.stage if metrics is not None else null_stage
+    if cube_path:
+        features = with_cube_features(features)
+    chunks = iter_curated(input_file, chunksize, input_format, metrics, feature_cache, features, prefetch,
+                          zones, windows)
+    if cube_path:
+        chunks = with_cube(chunks, cube_path, metrics)
+    with TableWriter(output_file, output_format) as writer:
+        for chunk in chunks:
+            with stage('write', rows_in=len(chunk)):
+                writer.write(chunk)
+    return writer.rows
+
+def with_cube_features(features):
+    """Return features plus the ones the aggregate cube reads (None keeps the default set)."""
+    if features is None:
+        return None
+    return list(features) + [name for name in CUBE_FEATURES if name not in features]
+
+def with_cube(chunks, cube_path, metrics=None):
+    """Yield the enriched chunks, building their aggregate cube and saving it to cube_path at the end."""
+    stage = metrics.stage if metrics is not None else null_stage
+    cube = empty_cube()
+    for chunk in chunks:
+        with stage('cube', rows_in=len(chunk)):
+            cube = merge_cubes(cube, compute_cube(chunk))
+        yield chunk
+    save_cube(cube, cube_path)
+
+def curation_settings(output_format, **extra):
+    """Everything besides the input bytes that determines the curated output."""
+    return {'feature_version': FEATURE_VERSION, 'format': output_format, **extra}
+
+def manifest_path(output_file):
+    return os.path.join(os.path.dirname(output_file) or '.', MANIFEST_NAME)
+
+def add_curation_arguments(parser):
+    """Add the options that decide what --input is curated into, shared with scripts.pipeline."""
+    parser.add_argument('--force', action='store_true',
+                        help='recompute even if the input is unchanged since the last run')
+    parser.add_argument('--checksum', action='store_true',
+                        help='detect input changes by SHA-256 instead of size and modification time')
+    parser.add_argument('--features', nargs='+', choices=list(FEATURES), default=None,
+                        help='derive only these features and read only the raw columns they need '
+                             '(default: %s, keeping every raw column)' % ' '.join(DEFAULT_FEATURES))
+    parser.add_argument('--zone-lookup', default=None,
+                        help='TLC taxi zone lookup CSV; adds pickup and dropoff borough, zone and service zone')
+    parser.add_argument('--windows', action='store_true',
+                        help='add 15-minute bucket and last-hour zone features; the input must be sorted by pickup time')
+    parser.add_argument('--window-series', default=None,
+                        help='with --windows, write the trip count and median speed of every bucket to this file')
+    parser.add_argument('--cube', default=None,
+                        help='also write the aggregate cube of the enriched trips to this .npz file')
+    parser.add_argument('--feature-cache', default=None,
+                        help='directory caching derived feature columns across runs')
+    parser.add_argument('--feature-cache-size', type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help='evict least recently used cached features beyond this many MB (default: %(default)g)')
+
+def settings_from_args(args):
+    """Return the manifest settings of a run parsed with add_curation_arguments."""
+    return curation_settings(infer_format(args.output, args.output_format),
+                             output=os.path.abspath(args.output), features=args.features,
+                             cube=os.path.abspath(args.cube) if args.cube else None,
+                             zones=input_fingerprint(args.zone_lookup) if args.zone_lookup else None,
+                             windows=args.windows,
+                             window_series=os.path.abspath(args.window_series) if args.window_series else None)
+
+def options_from_args(args):
+    """Return the iter_curated keyword arguments of a run parsed with add_curation_arguments."""
+    feature_cache = None
+    if args.feature_cache:
+        feature_cache = FeatureCache(args.feature_cache, max_bytes=int(args.feature_cache_size * 2**20))
+    return {'feature_cache': feature_cache,
+            'features': with_cube_features(args.features) if args.cube else args.features,
+            'zones': load_zone_lookup(args.zone_lookup) if args.zone_lookup else None,
+            'windows': WindowAggregator() if args.windows else None}
+
+def finish_outputs(args, windows):
+    """Write the window series if asked for and return every file the run produced."""
+    outputs = [args.output] + ([args.cube] if args.cube else [])
+    if windows is not None and args.window_series:
+        write_table(windows.bucket_series(), args.window_series)
+        outputs.append(args.window_series)
+    return outputs
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Clean and enrich NYC yellow taxi trip data.')
+    parser.add_argument('--input', default=DEFAULT_INPUT_FILE, help='raw trip file')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE, help='enriched output file')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the input in chunks of this many rows to bound memory')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='with --chunksize, read this many chunks ahead on a background thread')
+    parser.add_argument('--input-format', choices=FORMATS, default=None,
+                        help='raw file format (default: from the file extension)')
+    parser.add_argument('--format', dest='output_format', choices=FORMATS, default=None,
+                        help='enriched file format (default: from the file extension)')
+    parser.add_argument('--metrics-json', default=None,
+                        help='write per-stage timings, row counts, filter drops and peak memory to this JSON file')
+    parser.add_argument('--profile', default=None,
+                        help='write a cProfile dump (or a pyinstrument report for .html) to this file')
+    add_curation_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.prefetch and not args.chunksize:
+        parser.error('--prefetch reads chunks ahead and needs --chunksize')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    input_file = args.input
+    output_file = args.output
+
     if not os.path.exists(input_file):
         print(f"Input file {input_file} not found.")
         return
-    
-    df = pd.read_csv(input_file)
-    df = clean_data(df)
-    df = derive_features(df)
-    df.to_csv(output_file, index=False)
+
+    manifest_file = manifest_path(output_file)
+    manifest = load_manifest(manifest_file)
+    fingerprint = input_fingerprint(input_file, checksum=args.checksum)
+    settings = settings_from_args(args)
+    if not args.force and is_up_to_date(manifest, input_file, fingerprint, settings):
+        print(f"{input_file} is unchanged since the last run, {output_file} is up to date.")
+        return
+
+    metrics = PipelineMetrics('clean_curate')
+    options = options_from_args(args)
+    with profiled(args.profile):
+        curate_file(input_file, output_file, chunksize=args.chunksize, input_format=args.input_format,
+                    output_format=args.output_format, metrics=metrics, prefetch=args.prefetch,
+                    cube_path=args.cube, **options)
+    outputs = finish_outputs(args, options['windows'])
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    record_input(manifest, input_file, fingerprint, settings, outputs)
+    save_manifest(manifest, manifest_file)
     print(f"Enriched data saved to {output_file}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,270 @@
+import bz2
+import gzip
+import io
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.prefetch import prefetched, read_ahead
+
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2'}
+COMPRESSIONS = sorted(COMPRESSION_EXTENSIONS.values())
+
+# Uncompressed bytes handed to one decompression or compression task
+TASK_BYTES = 4 << 20
+# Uncompressed bytes per BGZF member, the htslib default that keeps members under 64 KiB
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+ZSTD_MAGIC = 0xFD2FB528
+
+def infer_compression(path):
+    """Return the compression of path from its extension, or None."""
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(str(path))[1].lower())
+
+def strip_compression(path):
+    """Return path without its compression extension, e.g. trips.csv for trips.csv.gz."""
+    path = str(path)
+    return os.path.splitext(path)[0] if infer_compression(path) else path
+
+def _require_zstandard():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImportError("Zstandard support requires zstandard (pip install zstandard)") from exc
+    return zstandard
+
+def _threads(threads):
+    return threads or os.cpu_count() or 1
+
+def _is_bgzf(f):
+    # BGZF members are gzip members whose only extra subfield is BC, holding the member size
+    header = f.read(18)
+    f.seek(0)
+    return (len(header) == 18 and header[:3] == b'\x1f\x8b\x08' and header[3] & 4
+            and header[10:14] == b'\x06\x00BC')
+
+def _bgzf_members(f):
+    while True:
+        header = f.read(18)
+        if not header:
+            return
+        if len(header) < 18 or header[12:14] != b'BC':
+            raise ValueError(f"Corrupt BGZF member in {f.name}")
+        size = struct.unpack('<H', header[16:18])[0] + 1
+        yield header + f.read(size - 18)
+
+def _zstd_frames(f):
+    """Yield (offset, size, content_size) of every zstd frame of f, skipping over its blocks unread.
+
+    content_size is the decompressed size from the frame header, or None when
+    the writer left it out.
+    """
+    while True:
+        offset = f.tell()
+        magic = f.read(4)
+        if not magic:
+            return
+        (number,) = struct.unpack('<I', magic)
+        if number & 0xFFFFFFF0 == 0x184D2A50:
+            # Skippable frame, e.g. the seek table some tools append
+            (size,) = struct.unpack('<I', f.read(4))
+            f.seek(size, os.SEEK_CUR)
+            continue
+        if number != ZSTD_MAGIC:
+            raise ValueError(f"Corrupt zstd frame in {f.name}")
+        flags = f.read(1)[0]
+        single_segment = flags >> 5 & 1
+        content_size_bytes = [single_segment, 2, 4, 8][flags >> 6]
+        header = f.read((0 if single_segment else 1) + [0, 1, 2, 4][flags & 3] + content_size_bytes)
+        content_size = None
+        if content_size_bytes:
+            content_size = int.from_bytes(header[len(header) - content_size_bytes:], 'little')
+            content_size += 256 if content_size_bytes == 2 else 0
+        last = False
+        while not last:
+            block_header = f.read(3)
+            if len(block_header) < 3:
+                raise ValueError(f"Truncated zstd frame in {f.name}")
+            value = int.from_bytes(block_header, 'little')
+            last = value & 1
+            block_type = value >> 1 & 3
+            if block_type == 3:
+                raise ValueError(f"Corrupt zstd block in {f.name}")
+            f.seek(1 if block_type == 1 else value >> 3, os.SEEK_CUR)
+        if flags >> 2 & 1:
+            f.seek(4, os.SEEK_CUR)
+        yield offset, f.tell() - offset, content_size
+
+def _frame_bytes(frame):
+    # Work in a frame is its decompressed size where the header records it
+    _, size, content_size = frame
+    return size if content_size is None else content_size
+
+def _read_frames(f, batches):
+    for batch in batches:
+        frames = []
+        for offset, size, _ in batch:
+            f.seek(offset)
+            frames.append(f.read(size))
+        yield frames
+
+def _batched(members, size=TASK_BYTES, weight=len):
+    batch = []
+    batch_bytes = 0
+    for member in members:
+        batch.append(member)
+        batch_bytes += weight(member)
+        if batch_bytes >= size:
+            yield batch
+            batch = []
+            batch_bytes = 0
+    if batch:
+        yield batch
+
+def _gunzip_members(batch):
+    return b''.join(zlib.decompress(member, 31) for member in batch)
+
+def _unzstd_frames(batch):
+    zstandard = _require_zstandard()
+    return b''.join(zstandard.ZstdDecompressor().decompressobj().decompress(frame) for frame in batch)
+
+def _stream_blocks(stream):
+    with stream:
+        for block in iter(lambda: stream.read(TASK_BYTES), b''):
+            yield block
+
+def iter_decompressed(path, threads=None):
+    """Yield the decompressed bytes of path in order, block by block.
+
+    BGZF gzip members and the frames of zstd files written in several frames are
+    located without decompressing them and decompressed on up to threads threads
+    at once, in tasks of about TASK_BYTES. Other gzip files, bz2, and zstd files
+    of one frame or of frames larger than TASK_BYTES (the zstd tool writes one)
+    are streamed on one background thread, overlapping with the caller's work.
+    That includes multi-member gzip such as `pigz --independent` or concatenated
+    .gz output: without the BGZF size field a member ends only where inflating
+    it ends, so its boundaries cannot be found ahead of time. Either way only a
+    few blocks are held in memory.
+    """
+    codec = infer_compression(path)
+    threads = _threads(threads)
+    with open(path, 'rb') as f:
+        if codec == 'gzip' and _is_bgzf(f):
+            batches, decompress = _batched(_bgzf_members(f)), _gunzip_members
+        elif codec == 'zstd':
+            zstandard = _require_zstandard()
+            frames = list(_zstd_frames(f))
+            f.seek(0)
+            if len(frames) > 1 and all(_frame_bytes(frame) <= TASK_BYTES for frame in frames):
+                batches = _read_frames(f, _batched(frames, weight=_frame_bytes))
+                decompress = _unzstd_frames
+            else:
+                stream = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+                yield from read_ahead(_stream_blocks(stream), 2)
+                return
+        else:
+            stream = gzip.GzipFile(fileobj=f) if codec == 'gzip' else bz2.BZ2File(f)
+            yield from read_ahead(_stream_blocks(stream), 2)
+            return
+        for _, data in prefetched(batches, decompress, threads):
+            yield data
+
+class _BlockReader(io.RawIOBase):
+    """Read-only file over an iterator of byte blocks."""
+
+    def __init__(self, blocks):
+        self._blocks = blocks
+        self._block = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self._block):
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._block = memoryview(block)
+        size = min(len(buffer), len(self._block))
+        buffer[:size] = self._block[:size]
+        self._block = self._block[size:]
+        return size
+
+    def close(self):
+        self._blocks.close()
+        super().close()
+
+def open_decompressed(path, threads=None):
+    """Open a compressed file for binary reading, decompressing it as in iter_decompressed."""
+    return io.BufferedReader(_BlockReader(iter_decompressed(path, threads)), buffer_size=1 << 20)
+
+def _bgzf_compress(data, level=6):
+    members = []
+    for start in range(0, len(data), BGZF_BLOCK_SIZE):
+        block = data[start:start + BGZF_BLOCK_SIZE]
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        deflated = compressor.compress(block) + compressor.flush()
+        size = 18 + len(deflated) + 8
+        members += [struct.pack('<4BI2BH2sHH', 0x1f, 0x8b, 8, 4, 0, 0, 255, 6, b'BC', 2, size - 1),
+                    deflated, struct.pack('<II', zlib.crc32(block), len(block))]
+    return b''.join(members)
+
+def _zstd_compress(data, level=3):
+    return _require_zstandard().ZstdCompressor(level=level).compress(data)
+
+COMPRESSORS = {'gzip': _bgzf_compress, 'zstd': _zstd_compress, 'bz2': bz2.compress}
+
+class CompressedWriter(io.RawIOBase):
+    """Write-only file compressing its input in independent pieces on a thread pool.
+
+    gzip output is BGZF and zstd output one frame per piece, so iter_decompressed
+    can decompress the file in parallel again. bz2 pieces become bz2 streams.
+    Every format stays readable by the standard command line tools.
+    """
+
+    def __init__(self, path, compression=None, threads=None):
+        self.compression = compression or infer_compression(path)
+        if self.compression not in COMPRESSORS:
+            raise ValueError(f"Unknown compression {self.compression!r}, expected one of {COMPRESSIONS}")
+        if self.compression == 'zstd':
+            _require_zstandard()
+        self._compress = COMPRESSORS[self.compression]
+        self._threads = _threads(threads)
+        self._executor = ThreadPoolExecutor(max_workers=self._threads)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._file = open(path, 'wb')
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= TASK_BYTES:
+            self._submit(bytes(self._buffer[:TASK_BYTES]))
+            del self._buffer[:TASK_BYTES]
+        return len(data)
+
+    def _submit(self, data):
+        # Bound the compressed pieces held in memory to two per thread
+        if len(self._pending) >= 2 * self._threads:
+            self._file.write(self._pending.popleft().result())
+        self._pending.append(self._executor.submit(self._compress, data))
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._file.write(self._pending.popleft().result())
+            if self.compression == 'gzip':
+                self._file.write(BGZF_EOF)
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._file.close()
+            super().close()
@@ -0,0 +1,279 @@
+import argparse
+import functools
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from scripts.features import TRIP_TYPES, trip_type_codes
+from scripts.storage import FORMATS, iter_table, read_table
+
+DEFAULT_CUBE_FILE = 'data/nyc_taxi_cube.npz'
+# Dimension name -> values along its axis, in axis order
+CUBE_DIMENSIONS = {
+    'pickup_hour': list(range(24)),
+    'pickup_weekday': list(range(7)),
+    'trip_type': TRIP_TYPES,
+    'is_peak_hour': [0, 1],
+}
+CUBE_MEASURES = ['trip_speed_mph', 'tip_percentage', 'trip_distance', 'trip_duration']
+CUBE_SHAPE = tuple(len(values) for values in CUBE_DIMENSIONS.values())
+# Registered features the cube reads; pickup_weekday falls back to pickup_datetime
+CUBE_FEATURES = ['trip_type', 'is_peak_hour', 'trip_speed_mph', 'tip_percentage']
+CUBE_COLUMNS = ['pickup_datetime', 'pickup_weekday', 'pickup_hour', 'trip_type', 'is_peak_hour'] + CUBE_MEASURES
+DEFAULT_CACHE_SIZE = 256
+
+def _cells(df):
+    # Flat cell of every row, -1 where a dimension is missing or out of range
+    hours = df['pickup_hour'].to_numpy(dtype='float64', na_value=np.nan)
+    if 'pickup_weekday' in df.columns:
+        weekdays = df['pickup_weekday'].to_numpy(dtype='float64', na_value=np.nan)
+    else:
+        weekdays = df['pickup_datetime'].dt.dayofweek.to_numpy(dtype='float64', na_value=np.nan)
+    trip_type = trip_type_codes(df['trip_type'])
+    peak = df['is_peak_hour'].to_numpy(dtype='float64', na_value=np.nan)
+    valid = ((hours >= 0) & (hours < 24) & (weekdays >= 0) & (weekdays < 7) & (trip_type >= 0)
+             & ((peak == 0) | (peak == 1)))
+    codes = np.ravel_multi_index((np.nan_to_num(hours).astype('int64'), np.nan_to_num(weekdays).astype('int64'),
+                                  np.maximum(trip_type, 0), np.nan_to_num(peak).astype('int64')),
+                                 CUBE_SHAPE, mode='clip')
+    return np.where(valid, codes, -1)
+
+def compute_cube(df):
+    """Reduce an enriched frame to trip counts and per measure count, sum and sum of squares per cell.
+
+    Cells are pickup hour x weekday x trip type x peak flag. Rows with a missing
+    or invalid dimension are left out. Cubes of disjoint rows add up.
+    """
+    cells = _cells(df)
+    placed = cells >= 0
+    size = int(np.prod(CUBE_SHAPE))
+    cube = {'count': np.bincount(cells[placed], minlength=size).reshape(CUBE_SHAPE)}
+    for measure in CUBE_MEASURES:
+        values = df[measure].to_numpy(dtype='float64', na_value=np.nan)
+        present = placed & ~np.isnan(values)
+        cells_present, values = cells[present], values[present]
+        cube[f'{measure}_count'] = np.bincount(cells_present, minlength=size).reshape(CUBE_SHAPE)
+        cube[f'{measure}_sum'] = np.bincount(cells_present, values, minlength=size).reshape(CUBE_SHAPE)
+        cube[f'{measure}_sumsq'] = np.bincount(cells_present, values * values, minlength=size).reshape(CUBE_SHAPE)
+    return cube
+
+def empty_cube():
+    cube = {'count': np.zeros(CUBE_SHAPE, dtype='int64')}
+    for measure in CUBE_MEASURES:
+        cube[f'{measure}_count'] = np.zeros(CUBE_SHAPE, dtype='int64')
+        cube[f'{measure}_sum'] = np.zeros(CUBE_SHAPE)
+        cube[f'{measure}_sumsq'] = np.zeros(CUBE_SHAPE)
+    return cube
+
+def merge_cubes(left, right):
+    """Combine the cubes of two disjoint sets of rows."""
+    return {key: left[key] + right[key] for key in left}
+
+def build_cube(file_path, chunksize=None, fmt=None):
+    """Compute the cube of an enriched file, streaming it when chunksize is set."""
+    if not chunksize:
+        return compute_cube(read_table(file_path, columns=CUBE_COLUMNS, fmt=fmt))
+    cube = empty_cube()
+    for chunk in iter_table(file_path, chunksize, columns=CUBE_COLUMNS, fmt=fmt):
+        cube = merge_cubes(cube, compute_cube(chunk))
+    return cube
+
+def save_cube(cube, path):
+    tmp_path = f'{path}.tmp'
+    # np.savez would append .npz to any other name
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **cube)
+    os.replace(tmp_path, path)
+
+def load_cube(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+def _select(values, dimension):
+    labels = CUBE_DIMENSIONS[dimension]
+    positions = []
+    for value in values if isinstance(values, (list, tuple)) else [values]:
+        # Query strings carry numbers as text
+        value = int(value) if isinstance(labels[0], int) and not isinstance(value, int) else value
+        if value not in labels:
+            raise ValueError(f"Unknown {dimension} {value!r}, expected one of {labels}")
+        positions.append(labels.index(value))
+    return positions
+
+def query_cube(cube, measure=None, by=(), where=None):
+    """Group a measure of the cube by some dimensions, filtered to where.
+
+    where maps dimensions to a value or a list of values to keep. Returns a
+    frame indexed by the by dimensions with the trip count (or the count of
+    the measure's non-missing values) and, for a measure, its sum, mean and
+    population standard deviation. Only cube cells are touched, never the trips.
+    """
+    by = list(by)
+    unknown = [dimension for dimension in by + list(where or {}) if dimension not in CUBE_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimensions {unknown}, expected some of {list(CUBE_DIMENSIONS)}")
+    if measure is not None and measure not in CUBE_MEASURES:
+        raise ValueError(f"Unknown measure {measure!r}, expected one of {CUBE_MEASURES}")
+    names = ['count'] if measure is None else [f'{measure}_count', f'{measure}_sum', f'{measure}_sumsq']
+    dimensions = list(CUBE_DIMENSIONS)
+    summed = tuple(axis for axis, dimension in enumerate(dimensions) if dimension not in by)
+    arrays = []
+    for name in names:
+        array = cube[name]
+        for dimension, values in (where or {}).items():
+            array = np.take(array, _select(values, dimension), axis=dimensions.index(dimension))
+        array = array.sum(axis=summed)
+        # Put the remaining axes in the order of by
+        arrays.append(np.moveaxis(array, range(array.ndim), [by.index(d) for d in dimensions if d in by]).ravel())
+
+    levels = []
+    for dimension in by:
+        labels = CUBE_DIMENSIONS[dimension]
+        if where and dimension in where:
+            labels = [labels[position] for position in _select(where[dimension], dimension)]
+        levels.append(labels)
+    if len(by) > 1:
+        index = pd.MultiIndex.from_product(levels, names=by)
+    elif by:
+        index = pd.Index(levels[0], name=by[0])
+    else:
+        index = pd.RangeIndex(1)
+    result = pd.DataFrame({'count': arrays[0].astype('int64')}, index=index)
+    if measure is not None:
+        count, total, squares = arrays
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            variance = np.maximum(squares / count - mean * mean, 0)
+        result['sum'] = total
+        result['mean'] = mean
+        result['std'] = np.sqrt(variance)
+    return result
+
+class CubeStore:
+    """Answers cube queries, keeping the most recent results in an LRU cache.
+
+    The cube file is reloaded when it changes on disk, e.g. after a new
+    clean_curate run, and results computed from the old cube are not reused.
+    """
+
+    def __init__(self, path=DEFAULT_CUBE_FILE, cache_size=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self._version = None
+        self._cube = None
+        self._cached_query = functools.lru_cache(maxsize=cache_size)(self._query)
+
+    def cube(self):
+        version = os.stat(self.path).st_mtime_ns
+        if version != self._version:
+            self._cube, self._version = load_cube(self.path), version
+        return self._cube
+
+    def _query(self, version, measure, by, where):
+        return query_cube(self._cube, measure, by, {dimension: list(values) for dimension, values in where})
+
+    def query(self, measure=None, by=(), where=None):
+        """query_cube on the stored cube, from the cache when asked before."""
+        self.cube()
+        key_where = tuple(sorted((dimension, tuple(values) if isinstance(values, (list, tuple)) else (values,))
+                                 for dimension, values in (where or {}).items()))
+        return self._cached_query(self._version, measure, tuple(by), key_where).copy()
+
+    def cache_info(self):
+        return self._cached_query.cache_info()
+
+def _result_json(result):
+    table = result.reset_index() if result.index.names[0] is not None else result
+    return {'columns': list(table.columns), 'rows': json.loads(table.to_json(orient='values'))}
+
+def make_handler(store):
+    class CubeRequestHandler(BaseHTTPRequestHandler):
+        """GET /query?measure=trip_speed_mph&by=pickup_hour&trip_type=short answers from the cube."""
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/query':
+                return self._reply(404, {'error': f'Unknown path {url.path}, use /query'})
+            params = parse_qs(url.query)
+            by = [dimension for values in params.pop('by', []) for dimension in values.split(',') if dimension]
+            measure = params.pop('measure', [None])[0]
+            where = {dimension: [value for values in items for value in values.split(',')]
+                     for dimension, items in params.items()}
+            try:
+                result = store.query(measure, by, where)
+            except (KeyError, ValueError) as exc:
+                return self._reply(400, {'error': str(exc)})
+            self._reply(200, _result_json(result))
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return CubeRequestHandler
+
+def serve(store, host='127.0.0.1', port=8765):
+    """Serve cube queries over HTTP on localhost until interrupted."""
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    print(f"Serving {store.path} on http://{host}:{server.server_port}/query")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def _parse_where(items):
+    where = {}
+    for item in items:
+        dimension, _, values = item.partition('=')
+        where[dimension] = values.split(',')
+    return where
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Query the aggregate cube of enriched NYC yellow taxi trips.')
+    parser.add_argument('--cube', default=DEFAULT_CUBE_FILE, help='cube file written by clean_curate --cube')
+    parser.add_argument('--build', nargs='+', default=None,
+                        help='build the cube from these enriched files instead of querying it')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='enriched file format (default: from the file extension)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream each enriched file in chunks of this many rows while building')
+    parser.add_argument('--measure', choices=CUBE_MEASURES, default=None,
+                        help='measure to aggregate (default: trip counts only)')
+    parser.add_argument('--by', nargs='*', choices=list(CUBE_DIMENSIONS), default=[], help='dimensions to group by')
+    parser.add_argument('--where', nargs='*', default=[], metavar='DIMENSION=VALUES',
+                        help='keep only these dimension values, e.g. trip_type=short,medium')
+    parser.add_argument('--serve', action='store_true', help='answer queries over HTTP on localhost')
+    parser.add_argument('--port', type=int, default=8765, help='port for --serve')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.build:
+        cube = empty_cube()
+        for path in args.build:
+            cube = merge_cubes(cube, build_cube(path, chunksize=args.chunksize, fmt=args.format))
+        save_cube(cube, args.cube)
+        print(f"Cube of {int(cube['count'].sum())} trips saved to {args.cube}")
+        return
+    if not os.path.exists(args.cube):
+        print(f"Cube file {args.cube} not found. Run clean_curate with --cube first.")
+        return
+    store = CubeStore(args.cube)
+    if args.serve:
+        serve(store, port=args.port)
+        return
+    print(store.query(args.measure, args.by, _parse_where(args.where)).to_string())
+
+if __name__ == "__main__":
+    main()
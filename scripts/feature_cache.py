@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+def column_digest(series):
+    """Content hash of a column's values and dtype, ignoring its index."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        digest.update(repr(series.dtype).encode())
+        values = series.cat.codes.to_numpy()
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        digest.update(str(series.dtype).encode())
+        values = series.to_numpy().view('int64')
+    else:
+        digest.update(str(series.dtype).encode())
+        values = series.to_numpy()
+    if values.dtype == object:
+        values = pd.util.hash_array(values)
+    digest.update(np.ascontiguousarray(values).data)
+    return digest.hexdigest()
+
+class FeatureCache:
+    """Size-bounded on-disk cache of derived feature columns.
+
+    Entries are keyed on the feature's name and parameters plus the content of
+    its input columns, stored as .npy files and loaded back memory-mapped.
+    Categorical features are stored as codes with their categories alongside.
+    When the cache outgrows max_bytes the least recently used entries are
+    removed; a hit refreshes an entry's modification time.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, feature, params, input_digests):
+        payload = json.dumps({'feature': feature, 'params': params, 'inputs': input_digests},
+                             sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.npy', base + '.json'
+
+    def load(self, key, index):
+        values_path, meta_path = self._paths(key)
+        try:
+            values = np.load(values_path, mmap_mode='r')
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if len(values) != len(index):
+            self.misses += 1
+            return None
+        os.utime(values_path)
+        self.hits += 1
+        if meta['categories'] is not None:
+            dtype = pd.CategoricalDtype(meta['categories'], ordered=meta['ordered'])
+            return pd.Series(pd.Categorical.from_codes(values, dtype=dtype), index=index, name=meta['name'])
+        return pd.Series(values, index=index, name=meta['name'])
+
+    def store(self, key, series):
+        values_path, meta_path = self._paths(key)
+        meta = {'name': series.name, 'categories': None, 'ordered': False}
+        values = series.to_numpy()
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            meta['categories'] = series.cat.categories.tolist()
+            meta['ordered'] = bool(series.cat.ordered)
+            values = series.cat.codes.to_numpy()
+        if values.dtype == object:
+            return
+        # Metadata first and values last, so a readable .npy always has its metadata
+        for path, write in ((meta_path, lambda f: f.write(json.dumps(meta).encode())),
+                            (values_path, lambda f: np.save(f, values))):
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        self.evict()
+
+    def size_bytes(self):
+        return sum(os.path.getsize(os.path.join(self.cache_dir, name)) for name in os.listdir(self.cache_dir))
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy'):
+                continue
+            values_path = os.path.join(self.cache_dir, name)
+            meta_path = values_path[:-4] + '.json'
+            size = os.path.getsize(values_path) + (os.path.getsize(meta_path) if os.path.exists(meta_path) else 0)
+            entries.append((os.path.getmtime(values_path), values_path, meta_path, size))
+            total += size
+        for _, values_path, meta_path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (values_path, meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+
+    def get_or_compute(self, feature, params, df, inputs, compute, digests=None):
+        """Return the cached feature column for these inputs, computing and storing it on a miss."""
+        digests = {} if digests is None else digests
+        for column in inputs:
+            if column not in digests:
+                digests[column] = column_digest(df[column])
+        key = self.key(feature, params, [digests[column] for column in inputs])
+        cached = self.load(key, df.index)
+        if cached is not None:
+            return cached
+        series = pd.Series(compute(df), index=df.index, name=feature)
+        self.store(key, series)
+        return series
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# Parameters of the derived features, part of each feature's cache key
+SPEED_CAP_MPH = 100
+TIP_PERCENTAGE_CAP = 100
+PEAK_HOURS = [7, 8, 17, 18]
+TRIP_TYPE_BINS = [0, 10, 30, float('inf')]
+TRIP_TYPES = ['short', 'medium', 'long']
+
+# Raw columns clean_data always reads, and the columns it adds to every frame
+CLEAN_INPUT_COLUMNS = ['pickup_datetime', 'dropoff_datetime', 'trip_distance', 'total_amount', 'trip_duration']
+CLEAN_OUTPUT_COLUMNS = ['trip_duration', 'pickup_hour']
+
+# Feature name -> (function, input columns, parameters), in registration order.
+# Inputs are raw columns, clean_data columns or other registered features.
+FEATURES = {}
+
+def trip_type_codes(series):
+    """Position of every trip type in TRIP_TYPES, or -1 for missing and unknown labels."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = list(series.cat.categories)
+        lookup = np.array([TRIP_TYPES.index(c) if c in TRIP_TYPES else -1 for c in categories] + [-1])
+        return lookup[series.cat.codes.to_numpy()]
+    return pd.Index(TRIP_TYPES).get_indexer(series)
+
+def register_feature(name, inputs, params=None, registry=FEATURES):
+    """Decorator adding fn(df) -> Series to the registry as the feature name."""
+    def decorator(fn):
+        if name in registry:
+            raise ValueError(f"Feature {name!r} is already registered")
+        registry[name] = (fn, list(inputs), dict(params or {}))
+        return fn
+    return decorator
+
+def resolve_features(names=None, registry=FEATURES):
+    """Return names and the features they depend on, each after its dependencies.
+
+    Without names every registered feature is resolved, in registration order.
+    """
+    names = list(registry) if names is None else list(names)
+    unknown = [name for name in names if name not in registry]
+    if unknown:
+        raise ValueError(f"Unknown features {unknown}, expected some of {list(registry)}")
+
+    ordered = []
+    visiting = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name in visiting:
+            raise ValueError(f"Features depend on each other: {' -> '.join(visiting + [name])}")
+        visiting.append(name)
+        for column in registry[name][1]:
+            if column in registry:
+                visit(column)
+        visiting.pop()
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+def feature_inputs(names=None, registry=FEATURES):
+    """Return the non-feature columns needed to compute names, in first-use order."""
+    columns = []
+    for name in resolve_features(names, registry):
+        for column in registry[name][1]:
+            if column not in registry and column not in columns:
+                columns.append(column)
+    return columns
+
+@register_feature('trip_speed_mph', ['trip_distance', 'trip_duration'], {'cap': SPEED_CAP_MPH})
+def trip_speed_mph(df):
+    # Calculate trip speed (miles per hour)
+    # Assume trip_duration is in seconds
+    speed = df['trip_distance'] / (df['trip_duration'] / 3600)
+    return speed.clip(upper=SPEED_CAP_MPH)  # Limit unrealistic speeds
+
+@register_feature('tip_percentage', ['tip_amount', 'total_amount'], {'cap': TIP_PERCENTAGE_CAP})
+def tip_percentage(df):
+    # Calculate tip percentage
+    tip_percentage = (df['tip_amount'] / df['total_amount'].replace(0, pd.NA)) * 100
+    return tip_percentage.fillna(0).clip(upper=TIP_PERCENTAGE_CAP)
+
+@register_feature('is_peak_hour', ['pickup_hour'], {'hours': PEAK_HOURS})
+def is_peak_hour(df):
+    # Mark peak hours
+    return df['pickup_hour'].isin(PEAK_HOURS).astype('int8')
+
+@register_feature('trip_type', ['trip_duration'], {'bins': TRIP_TYPE_BINS, 'labels': TRIP_TYPES})
+def trip_type(df):
+    # Categorize trip type based on duration (in minutes)
+    return pd.cut(df['trip_duration'] / 60, bins=TRIP_TYPE_BINS, labels=TRIP_TYPES)
+
+@register_feature('fare_per_mile', ['fare_amount', 'trip_distance'])
+def fare_per_mile(df):
+    # clean_data drops trips without a positive distance
+    return df['fare_amount'] / df['trip_distance']
+
+@register_feature('pickup_weekday', ['pickup_datetime'])
+def pickup_weekday(df):
+    # Monday is 0 and Sunday 6
+    return df['pickup_datetime'].dt.dayofweek.astype('int8')
+
+# Features written by the pipeline unless others are requested
+DEFAULT_FEATURES = ['trip_speed_mph', 'tip_percentage', 'is_peak_hour', 'trip_type']
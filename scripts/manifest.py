@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '_curate_manifest.json'
+
+def input_fingerprint(path, checksum=False):
+    """Describe an input file by size and mtime, plus a SHA-256 of its bytes if checksum is set."""
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if checksum:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        fingerprint = {'size': stat.st_size, 'sha256': digest.hexdigest()}
+    return fingerprint
+
+def output_state(path):
+    """Size and mtime of an output file, or the total size and latest mtime of the files in an output directory."""
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    stats = [entry.stat() for entry in os.scandir(path) if entry.is_file()]
+    return {'size': sum(stat.st_size for stat in stats),
+            'mtime_ns': max((stat.st_mtime_ns for stat in stats), default=0)}
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, path):
+    # Write to a temporary file first so an interrupted run never leaves a torn manifest
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _manifest_key(input_file):
+    return os.path.abspath(input_file)
+
+def is_up_to_date(manifest, input_file, fingerprint, settings):
+    """True if input_file was processed with the same content and settings and its outputs are as it left them.
+
+    Outputs rewritten since, e.g. by a run on another input, count as stale.
+    """
+    entry = manifest.get(_manifest_key(input_file))
+    if entry is None:
+        return False
+    return (entry['fingerprint'] == fingerprint
+            and entry['settings'] == settings
+            and all(os.path.exists(output) for output in entry['outputs'])
+            and entry.get('output_states') == {output: output_state(output) for output in entry['outputs']})
+
+def recorded_outputs(manifest, input_file):
+    entry = manifest.get(_manifest_key(input_file))
+    return entry['outputs'] if entry else []
+
+def record_input(manifest, input_file, fingerprint, settings, outputs):
+    outputs = sorted(os.path.abspath(output) for output in outputs)
+    manifest[_manifest_key(input_file)] = {
+        'fingerprint': fingerprint,
+        'settings': settings,
+        'outputs': outputs,
+        'output_states': {output: output_state(output) for output in outputs},
+    }
@@ -0,0 +1,130 @@
+import cProfile
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+def _status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter so the next reading covers only what follows.
+
+    Only Linux supports this; elsewhere the peak stays the process-wide maximum
+    and False is returned.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    if os.path.exists('/proc/self/status'):
+        return _status_kb('VmHWM:') / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def current_rss_mb():
+    return _status_kb('VmRSS:') / 1024 if os.path.exists('/proc/self/status') else float('nan')
+
+class PipelineMetrics:
+    """Collect per-stage timings, row counts and peak memory for one script run.
+
+    Stages entered more than once, e.g. once per chunk, are accumulated into a
+    single entry. The collected metrics are written out as JSON.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.stages = {}
+        self.filters = {}
+        self._start = time.perf_counter()
+        self._peak_rss_mb = 0.0
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Time the enclosed block. Set 'rows_out' on the yielded dict to record output rows."""
+        record = {'rows_in': rows_in, 'rows_out': None}
+        reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            peak = peak_rss_mb()
+            self._peak_rss_mb = max(self._peak_rss_mb, peak)
+            entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rows_in': None,
+                                                  'rows_out': None, 'peak_rss_mb': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['peak_rss_mb'] = round(max(entry['peak_rss_mb'], peak), 1)
+            for key in ('rows_in', 'rows_out'):
+                if record[key] is not None:
+                    entry[key] = (entry[key] or 0) + int(record[key])
+
+    def count_filtered(self, name, dropped):
+        """Add the number of rows a named filter removed."""
+        self.filters[name] = self.filters.get(name, 0) + int(dropped)
+
+    def to_dict(self):
+        stages = {}
+        for name, entry in self.stages.items():
+            rows = entry['rows_in'] if entry['rows_in'] is not None else entry['rows_out']
+            stages[name] = {**entry, 'seconds': round(entry['seconds'], 4),
+                            'rows_per_sec': round(rows / entry['seconds']) if rows and entry['seconds'] else None}
+        return {
+            'script': self.script,
+            'started_at': self.started_at,
+            'total_seconds': round(time.perf_counter() - self._start, 4),
+            'peak_rss_mb': round(max(self._peak_rss_mb, peak_rss_mb()), 1),
+            'stages': stages,
+            'filters': dict(self.filters),
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+@contextmanager
+def profiled(path):
+    """Profile the enclosed block into path, or do nothing when path is empty.
+
+    A path ending in .html is rendered with pyinstrument if it is installed;
+    anything else gets a cProfile dump readable with pstats or snakeviz.
+    """
+    if not path:
+        yield
+        return
+    if path.endswith('.html'):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("HTML profiles require pyinstrument (pip install pyinstrument)") from None
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+@contextmanager
+def null_stage(*args, **kwargs):
+    yield {'rows_in': None, 'rows_out': None}
@@ -0,0 +1,144 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from scripts.storage import ENRICHED_DTYPES, FORMAT_EXTENSIONS, NPY_METADATA, apply_dtypes, infer_format, read_table
+
+PARTITION_INDEX_NAME = '_partition_index.json'
+
+def _stat_path(path):
+    # A npy table changes whenever its metadata is rewritten on close
+    return os.path.join(path, NPY_METADATA) if os.path.isdir(path) else path
+
+def list_partitions(root):
+    """Return the enriched tables under root's year=/month= layout, relative to root."""
+    paths = glob.glob(os.path.join(root, 'year=*', 'month=*', '*'))
+    tables = [path for path in paths if os.path.splitext(path)[1].lower() in FORMAT_EXTENSIONS
+              and os.path.exists(_stat_path(path))]
+    return sorted(os.path.relpath(path, root) for path in tables)
+
+def load_partition_index(root):
+    path = os.path.join(root, PARTITION_INDEX_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def update_partition_index(root):
+    """Record the row count and pickup_datetime range of every partition under root.
+
+    Partitions whose size and modification time match the existing index are not
+    read again, and entries of partitions that no longer exist are dropped.
+    """
+    previous = load_partition_index(root)
+    index = {}
+    for name in list_partitions(root):
+        stat = os.stat(_stat_path(os.path.join(root, name)))
+        entry = previous.get(name)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            index[name] = entry
+            continue
+        pickups = read_table(os.path.join(root, name), columns=['pickup_datetime'])['pickup_datetime']
+        index[name] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'rows': len(pickups),
+            'min_pickup': pickups.min().isoformat() if len(pickups) else None,
+            'max_pickup': pickups.max().isoformat() if len(pickups) else None,
+        }
+    tmp_path = os.path.join(root, PARTITION_INDEX_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(root, PARTITION_INDEX_NAME))
+    return index
+
+def select_partitions(index, start=None, end=None):
+    """Return the partitions whose pickups overlap [start, end), in index order."""
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    selected = []
+    for name, entry in index.items():
+        if entry['rows'] == 0:
+            continue
+        if start is not None and pd.Timestamp(entry['max_pickup']) < start:
+            continue
+        if end is not None and pd.Timestamp(entry['min_pickup']) >= end:
+            continue
+        selected.append(name)
+    return selected
+
+def _predicate_columns(start, end, hours, peak):
+    columns = []
+    if start is not None or end is not None:
+        columns.append('pickup_datetime')
+    if hours is not None:
+        columns.append('pickup_hour')
+    if peak is not None:
+        columns.append('is_peak_hour')
+    return columns
+
+def _parquet_filters(start, end, hours, peak):
+    filters = []
+    if start is not None:
+        filters.append(('pickup_datetime', '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append(('pickup_datetime', '<', pd.Timestamp(end)))
+    if hours is not None:
+        filters.append(('pickup_hour', 'in', list(hours)))
+    if peak is not None:
+        filters.append(('is_peak_hour', '==', int(peak)))
+    return filters or None
+
+def _predicate_mask(df, start, end, hours, peak):
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= (df['pickup_datetime'] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (df['pickup_datetime'] < pd.Timestamp(end)).to_numpy()
+    if hours is not None:
+        mask &= df['pickup_hour'].isin(list(hours)).to_numpy()
+    if peak is not None:
+        mask &= df['is_peak_hour'].to_numpy() == int(peak)
+    return mask
+
+def read_partition(path, columns=None, start=None, end=None, hours=None, peak=None, fmt=None):
+    """Read the rows of one partition matching the pickup range and hour predicates.
+
+    Parquet partitions push the predicates down to pyarrow, which skips row groups
+    whose statistics rule them out. Other formats are filtered right after reading.
+    """
+    fmt = infer_format(path, fmt)
+    predicates = _predicate_columns(start, end, hours, peak)
+    needed = None if columns is None else list(columns) + [c for c in predicates if c not in columns]
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        names = pq.read_schema(path).names
+        selected = None if needed is None else [c for c in names if c in needed]
+        df = pd.read_parquet(path, columns=selected, filters=_parquet_filters(start, end, hours, peak))
+        df = apply_dtypes(df, ENRICHED_DTYPES)
+    else:
+        df = read_table(path, columns=needed, fmt=fmt)
+        mask = _predicate_mask(df, start, end, hours, peak)
+        if not mask.all():
+            df = df.take(np.flatnonzero(mask))
+    if columns is not None:
+        df = df[[c for c in df.columns if c in columns]]
+    return df
+
+def load_trips(root, start=None, end=None, hours=None, peak=None, columns=None, fmt=None):
+    """Load enriched trips picked up in [start, end) from a year=/month= partitioned root.
+
+    hours keeps only trips with those pickup hours and peak only peak (True) or
+    off-peak (False) trips. Only partitions whose indexed pickup range overlaps
+    the requested one are opened, so the cost follows the size of the answer.
+    """
+    index = load_partition_index(root) or update_partition_index(root)
+    frames = [read_partition(os.path.join(root, name), columns, start, end, hours, peak, fmt)
+              for name in select_partitions(index, start, end)]
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
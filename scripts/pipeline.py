@@ -0,0 +1,169 @@
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from scripts.aggregates import AGGREGATED_COLUMNS, compute_plot_aggregates, merge_plot_aggregates
+from scripts.clean_curate import (DEFAULT_INPUT_FILE, DEFAULT_OUTPUT_FILE, add_curation_arguments, finish_outputs,
+                                  iter_curated, manifest_path, options_from_args, settings_from_args, with_cube)
+from scripts.manifest import input_fingerprint, is_up_to_date, load_manifest, record_input, save_manifest
+from scripts.metrics import PipelineMetrics, profiled
+from scripts.storage import FORMATS, TableWriter, iter_table, read_table
+from scripts.validate_curated import merge_rule_results, run_validation_rules
+
+def _merge_validation(left, right):
+    totals = {result.name: result for result in left}
+    merge_rule_results(totals, right)
+    return list(totals.values())
+
+def _visualize(aggregates, options):
+    # Imported on first use, so runs without charts never load matplotlib or seaborn
+    from scripts.visualize_data import CHARTS, render_charts
+    rendered = render_charts(aggregates, options['plots_dir'], dpi=options['dpi'],
+                             image_format=options['image_format'], workers=options['workers'])
+    print(f"Visualizations saved to {options['plots_dir']}/ ({len(rendered)} of {len(CHARTS)} charts redrawn)")
+    return rendered
+
+# Stage name -> (function, upstream stage, merge). Stages with a merge run on every
+# enriched chunk and fold the chunk results together; the others run once on the
+# folded result of their upstream stage. 'enriched' is the curated frame itself.
+PIPELINE_STAGES = {
+    'validate': (lambda chunk, options: run_validation_rules(chunk), 'enriched', _merge_validation),
+    'aggregate': (lambda chunk, options: compute_plot_aggregates(chunk), 'enriched', merge_plot_aggregates),
+    'visualize': (_visualize, 'aggregate', None),
+}
+STAGE_NAMES = ['curate'] + list(PIPELINE_STAGES)
+
+def resolve_stages(names):
+    """Return names with the stages they depend on, in pipeline order."""
+    required = set()
+    for name in names:
+        while name in PIPELINE_STAGES and name not in required:
+            required.add(name)
+            name = PIPELINE_STAGES[name][1]
+    return [name for name in PIPELINE_STAGES if name in required]
+
+def run_pipeline(chunks, stages=None, options=None, writer=None, metrics=None):
+    """Run the stages over enriched chunks in one process and return their results.
+
+    Every chunk is handed to the streaming stages while it is in memory, then
+    dropped, so the enriched data is never re-read. With a writer, each chunk is
+    also written out before the next is produced. Chunks are reindexed to their
+    row positions in the enriched output, matching validate_file.
+    """
+    stages = resolve_stages(PIPELINE_STAGES if stages is None else stages)
+    streaming = [name for name in stages if PIPELINE_STAGES[name][2] is not None]
+    options = options or {}
+    metrics = metrics or PipelineMetrics('pipeline')
+    results = {}
+    rows = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        rows += len(chunk)
+        if writer is not None:
+            with metrics.stage('write', rows_in=len(chunk)):
+                writer.write(chunk)
+        for name in streaming:
+            fn, _, merge = PIPELINE_STAGES[name]
+            with metrics.stage(name, rows_in=len(chunk)):
+                result = fn(chunk, options)
+            results[name] = merge(results[name], result) if name in results else result
+    for name in stages:
+        fn, upstream, merge = PIPELINE_STAGES[name]
+        if merge is None and upstream in results:
+            with metrics.stage(name):
+                results[name] = fn(results[upstream], options)
+    results['rows'] = rows
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Curate, validate and visualize NYC yellow taxi trips in a single process.')
+    parser.add_argument('--input', default=DEFAULT_INPUT_FILE, help='raw trip file')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE, help='enriched output file')
+    parser.add_argument('--stages', nargs='+', choices=STAGE_NAMES, default=STAGE_NAMES,
+                        help='stages to run (default: all). Without curate, the stages read the '
+                             'existing --output file instead of the raw input')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the data in chunks of this many rows to bound memory')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='with --chunksize, read this many chunks ahead on a background thread')
+    parser.add_argument('--input-format', choices=FORMATS, default=None,
+                        help='raw file format (default: from the file extension)')
+    parser.add_argument('--format', dest='output_format', choices=FORMATS, default=None,
+                        help='enriched file format (default: from the file extension)')
+    parser.add_argument('--plots-dir', default='plots', help='directory for the generated charts')
+    parser.add_argument('--workers', type=int, default=None, help='chart render processes (default: all cores)')
+    parser.add_argument('--dpi', type=int, default=300, help='resolution of the charts')
+    parser.add_argument('--image-format', default='png', choices=['png', 'svg', 'pdf', 'jpg'],
+                        help='file format of the charts')
+    parser.add_argument('--metrics-json', default=None,
+                        help='write per-stage timings, row counts and peak memory to this JSON file')
+    parser.add_argument('--profile', default=None,
+                        help='write a cProfile dump (or a pyinstrument report for .html) to this file')
+    add_curation_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.prefetch and not args.chunksize:
+        parser.error('--prefetch reads chunks ahead and needs --chunksize')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    curate = 'curate' in args.stages
+    if curate:
+        if not os.path.exists(args.input):
+            print(f"Input file {args.input} not found.")
+            return 1
+        # Share clean_curate's manifest, so either script skips what the other curated
+        manifest_file = manifest_path(args.output)
+        manifest = load_manifest(manifest_file)
+        fingerprint = input_fingerprint(args.input, checksum=args.checksum)
+        settings = settings_from_args(args)
+        if not args.force and is_up_to_date(manifest, args.input, fingerprint, settings):
+            print(f"{args.input} is unchanged since the last run, reusing {args.output}.")
+            curate = False
+    elif not os.path.exists(args.output):
+        print(f"Input file {args.output} not found.")
+        return 1
+
+    metrics = PipelineMetrics('pipeline')
+    options = {'plots_dir': args.plots_dir, 'workers': args.workers, 'dpi': args.dpi,
+               'image_format': args.image_format}
+    with profiled(args.profile):
+        if curate:
+            curate_options = options_from_args(args)
+            chunks = iter_curated(args.input, args.chunksize, args.input_format, metrics=metrics,
+                                  prefetch=args.prefetch, **curate_options)
+            if args.cube:
+                chunks = with_cube(chunks, args.cube, metrics)
+            with TableWriter(args.output, args.output_format) as writer:
+                results = run_pipeline(chunks, args.stages, options, writer, metrics)
+            record_input(manifest, args.input, fingerprint, settings,
+                         finish_outputs(args, curate_options['windows']))
+            save_manifest(manifest, manifest_file)
+            print(f"Enriched data saved to {args.output}")
+        elif not resolve_stages(args.stages):
+            results = {}
+        else:
+            if args.chunksize:
+                chunks = iter_table(args.output, args.chunksize, columns=AGGREGATED_COLUMNS, fmt=args.output_format)
+            else:
+                chunks = [read_table(args.output, columns=AGGREGATED_COLUMNS, fmt=args.output_format)]
+            results = run_pipeline(chunks, args.stages, options, metrics=metrics)
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+
+    if 'validate' in results:
+        errors = [result for result in results['validate'] if result.violations]
+        if errors:
+            print("Validation errors found:")
+            for result in errors:
+                rows = ', '.join(str(index) for index in result.sample_indices)
+                print(f"- {result.message}: {result.violations} records (e.g. rows {rows})")
+        else:
+            print("Data validated successfully.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+def read_ahead(iterator, depth=1):
+    """Yield the items of iterator while a background thread reads up to depth items ahead.
+
+    Items are produced one at a time on a single thread, so the iterator itself
+    needs no locking. At most depth items are buffered besides the one yielded.
+    """
+    iterator = iter(iterator)
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        pending = deque(executor.submit(next, iterator, _DONE) for _ in range(depth))
+        while True:
+            item = pending.popleft().result()
+            if item is _DONE:
+                return
+            pending.append(executor.submit(next, iterator, _DONE))
+            yield item
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def prefetched(items, load, depth=2):
+    """Yield (item, load(item)) in order, loading up to depth upcoming items concurrently.
+
+    Each load runs on its own thread while the caller works on the previous
+    result, so reads and decompression overlap with the caller's compute. At
+    most depth loaded results are held besides the one yielded.
+    """
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=depth)
+    try:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(load, item)))
+            if len(pending) == depth:
+                break
+        while pending:
+            item, future = pending.popleft()
+            result = future.result()
+            upcoming = next(items, _DONE)
+            if upcoming is not _DONE:
+                pending.append((upcoming, executor.submit(load, upcoming)))
+            yield item, result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from scripts.features import TRIP_TYPES, trip_type_codes
+from scripts.storage import iter_table, read_table
+
+STRATIFIED_COLUMNS = ['trip_type', 'is_peak_hour']
+# Trip types plus one stratum for missing or unknown types, times off-peak, peak and invalid flags
+N_STRATA = (len(TRIP_TYPES) + 1) * 3
+# Rows every non-empty stratum keeps where it has them, so rare strata are still seen
+MIN_STRATUM_ROWS = 100
+
+def stratum_codes(df):
+    """Code every row by trip type x peak flag, with rows of invalid values in strata of their own."""
+    trip_type = trip_type_codes(df['trip_type'])
+    trip_type = np.where(trip_type >= 0, trip_type, len(TRIP_TYPES))
+    peak = df['is_peak_hour'].to_numpy(dtype='float64', na_value=np.nan)
+    peak = np.select([peak == 0, peak == 1], [0, 1], 2)
+    return trip_type * 3 + peak
+
+def allocate(counts, size, minimum=MIN_STRATUM_ROWS):
+    """Split size sample rows over strata of counts rows, in proportion to their counts.
+
+    Every stratum first gets up to minimum rows, unless those alone exceed size.
+    The allocations always add up to size, or to every row when there are fewer.
+    """
+    counts = np.asarray(counts, dtype='int64')
+    if size >= counts.sum():
+        return counts.copy()
+    allocation = np.minimum(counts, minimum)
+    if allocation.sum() > size:
+        allocation = np.zeros_like(counts)
+    while allocation.sum() < size:
+        room = counts - allocation
+        remaining = size - allocation.sum()
+        share = remaining * room / room.sum()
+        added = np.floor(share).astype('int64')
+        if not added.any():
+            # Hand the last rows to the strata with the largest remainders
+            order = np.argsort(np.floor(share) - share, kind='stable')
+            added[order[room[order] > 0][:remaining]] = 1
+        allocation += added
+    return allocation
+
+class StratifiedReservoir:
+    """One-pass sample of a stream of frames, stratified by trip type and peak flag.
+
+    Every row draws a uniform key from a seeded generator and each stratum keeps
+    its size rows with the smallest keys, so whatever the stream length memory is
+    bounded by size rows per stratum. Keys are drawn in stream order, so the
+    sample depends on the seed and the data but not on how it is chunked.
+    """
+
+    def __init__(self, size, seed=0, minimum=MIN_STRATUM_ROWS):
+        self.size = size
+        self.minimum = minimum
+        self.counts = np.zeros(N_STRATA, dtype='int64')
+        self._rng = np.random.default_rng(seed)
+        self._rows = None
+        self._keys = np.empty(0)
+        self._strata = np.empty(0, dtype='int64')
+        # Key a row must beat to enter its stratum, infinite until the stratum is full
+        self._thresholds = np.full(N_STRATA, np.inf)
+
+    def update(self, df):
+        """Offer the rows of df, keeping their index labels."""
+        keys = self._rng.random(len(df))
+        strata = stratum_codes(df)
+        self.counts += np.bincount(strata, minlength=N_STRATA)
+        entering = np.flatnonzero(keys < self._thresholds[strata])
+        rows = df.take(entering)
+        keys = np.concatenate([self._keys, keys[entering]])
+        strata = np.concatenate([self._strata, strata[entering]])
+        if self._rows is not None:
+            rows = pd.concat([self._rows, rows])
+
+        order = np.lexsort((keys, strata))
+        strata = strata[order]
+        counts = np.bincount(strata, minlength=N_STRATA)
+        ranks = np.arange(len(strata)) - (np.cumsum(counts) - counts)[strata]
+        kept = order[ranks < self.size]
+        self._rows, self._keys, self._strata = rows.take(kept), keys[kept], strata[ranks < self.size]
+        # Kept rows are ordered by stratum then key, so a full stratum's last key is its largest
+        counts = np.bincount(self._strata, minlength=N_STRATA)
+        full = counts == self.size
+        self._thresholds = np.full(N_STRATA, np.inf)
+        self._thresholds[full] = self._keys[(np.cumsum(counts) - 1)[full]]
+        return self
+
+    def sample(self):
+        """The sample as a frame in stream order, with each row's sample_weight.
+
+        A row's weight is the number of rows of its stratum it stands for, so
+        weighted counts and means over the sample estimate those of the stream.
+        """
+        if self._rows is None:
+            return pd.DataFrame({'sample_weight': pd.Series(dtype='float64')})
+        allocation = allocate(self.counts, self.size, self.minimum)
+        counts = np.bincount(self._strata, minlength=N_STRATA)
+        ranks = np.arange(len(self._strata)) - (np.cumsum(counts) - counts)[self._strata]
+        chosen = np.flatnonzero(ranks < allocation[self._strata])
+        strata = self._strata[chosen]
+        sample = self._rows.take(chosen).assign(sample_weight=self.counts[strata] / allocation[strata])
+        return sample.sort_index(kind='stable')
+
+def sample_file(file_path, size, chunksize=None, columns=None, fmt=None, seed=0, minimum=MIN_STRATUM_ROWS):
+    """Draw a stratified sample of size rows from an enriched file in one pass.
+
+    The sample is indexed by row position in the file and has a sample_weight
+    column. With a chunksize only one chunk and the reservoirs are in memory.
+    """
+    if columns is not None:
+        columns = list(columns) + [column for column in STRATIFIED_COLUMNS if column not in columns]
+    if chunksize:
+        chunks = iter_table(file_path, chunksize, columns=columns, fmt=fmt)
+    else:
+        chunks = [read_table(file_path, columns=columns, fmt=fmt)]
+    reservoir = StratifiedReservoir(size, seed, minimum)
+    rows = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        reservoir.update(chunk)
+        rows += len(chunk)
+    return reservoir.sample()
@@ -0,0 +1,180 @@
+import numpy as np
+
+class KLLSketch:
+    """Mergeable quantile sketch (KLL) over a stream of floats.
+
+    Items live in levels where an item at level h stands for 2**h inputs. A level
+    that outgrows its capacity is sorted and every other item promoted to the
+    next level, so memory stays around 3 * k items whatever the stream length and
+    quantiles are off by roughly 1.7 / k in rank. Sketches of disjoint data merge
+    into the sketch of their union. Compaction offsets come from a seeded
+    generator, so the same inputs always give the same sketch.
+    """
+
+    def __init__(self, k=128, seed=0):
+        self.k = k
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        """Add an array of values, ignoring NaNs."""
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold other into this sketch and return it."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # An odd item out stays behind, the rest halves into the next level
+            kept, items = items[:len(items) % 2], items[len(items) % 2:]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = kept
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # Adding a level shrinks the capacity of the ones below it
+            level = 0
+
+    def _sorted_items(self):
+        # Every item with the cumulative number of inputs it and the smaller items stand for
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        """Approximate values at the quantiles qs; 0 and 1 give the exact min and max."""
+        qs = np.asarray(qs, dtype='float64')
+        if not self.count:
+            return np.full(qs.shape, np.nan)
+        items, cumulative = self._sorted_items()
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        result = items[np.clip(positions, 0, len(items) - 1)]
+        result = np.where(qs <= 0, self.min, result)
+        return np.where(qs >= 1, self.max, result)
+
+    def cdf(self, values, side='right'):
+        """Approximate fraction of inputs at or below values (below them with side='left')."""
+        values = np.asarray(values, dtype='float64')
+        if not self.count:
+            return np.full(values.shape, np.nan)
+        items, cumulative = self._sorted_items()
+        positions = np.searchsorted(items, values, side=side)
+        return np.concatenate([[0.0], cumulative])[positions] / cumulative[-1]
+
+    def median_absolute_deviation(self):
+        """Approximate median of |x - median| over the inputs, read off the sketched distribution."""
+        if not self.count:
+            return np.nan
+        median = self.quantiles([0.5])[0]
+        items, _ = self._sorted_items()
+        radii = np.unique(np.abs(items - median))
+        covered = self.cdf(median + radii) - self.cdf(median - radii, side='left')
+        return radii[min(np.searchsorted(covered, 0.5), len(radii) - 1)]
+
+    def to_arrays(self, prefix):
+        arrays = {f'{prefix}/meta': np.array([self.k, self.count, self.min, self.max, len(self.levels)])}
+        arrays.update({f'{prefix}/level{level}': items for level, items in enumerate(self.levels)})
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        k, count, low, high, n_levels = arrays[f'{prefix}/meta']
+        sketch = cls(int(k))
+        sketch.count = int(count)
+        sketch.min = float(low)
+        sketch.max = float(high)
+        sketch.levels = [np.asarray(arrays[f'{prefix}/level{level}']) for level in range(int(n_levels))]
+        return sketch
+
+class Moments:
+    """Running count, means and co-moments of a set of features, mergeable across chunks.
+
+    Chunks are combined with the pairwise update of Chan et al., which unlike
+    raw sums of squares keeps the variances accurate for large, offset values.
+    """
+
+    def __init__(self, n_features):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.comoment = np.zeros((n_features, n_features))
+
+    def update(self, matrix):
+        """Add the rows of a 2-D array, skipping rows with any NaN."""
+        matrix = np.asarray(matrix, dtype='float64')
+        matrix = matrix[~np.isnan(matrix).any(axis=1)]
+        if not len(matrix):
+            return self
+        chunk = Moments(matrix.shape[1])
+        chunk.count = len(matrix)
+        chunk.mean = matrix.mean(axis=0)
+        centered = matrix - chunk.mean
+        chunk.comoment = centered.T @ centered
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Fold other into these moments and return them."""
+        count = self.count + other.count
+        if not other.count:
+            return self
+        delta = other.mean - self.mean
+        self.comoment = (self.comoment + other.comoment
+                         + np.outer(delta, delta) * self.count * other.count / count)
+        self.mean = self.mean + delta * other.count / count
+        self.count = count
+        return self
+
+    def covariance(self):
+        return self.comoment / self.count if self.count else np.full(self.comoment.shape, np.nan)
+
+    def variance(self):
+        return np.diag(self.covariance())
+
+    def correlation(self):
+        covariance = self.covariance()
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return covariance / np.outer(std, std)
+
+    def to_arrays(self, prefix):
+        return {f'{prefix}/count': np.array(self.count), f'{prefix}/mean': self.mean,
+                f'{prefix}/comoment': self.comoment}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        moments = cls(len(arrays[f'{prefix}/mean']))
+        moments.count = int(arrays[f'{prefix}/count'])
+        moments.mean = np.asarray(arrays[f'{prefix}/mean'])
+        moments.comoment = np.asarray(arrays[f'{prefix}/comoment'])
+        return moments
@@ -0,0 +1,377 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from scripts.compression import CompressedWriter, infer_compression, open_decompressed, strip_compression
+from scripts.features import TRIP_TYPES
+
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.npy': 'npy',
+}
+FORMATS = sorted(set(FORMAT_EXTENSIONS.values()))
+
+# A npy table is a directory of one .npy file per column plus this metadata file
+NPY_METADATA = '_columns.json'
+
+TRIP_TYPE_DTYPE = pd.CategoricalDtype(TRIP_TYPES, ordered=True)
+
+# Column types of the enriched output, restored whenever it is read back
+ENRICHED_DTYPES = {
+    'pickup_datetime': 'datetime64[ns]',
+    'dropoff_datetime': 'datetime64[ns]',
+    'pickup_hour': 'int8',
+    'is_peak_hour': 'int8',
+    'pickup_weekday': 'int8',
+    'trip_type': TRIP_TYPE_DTYPE,
+    'bucket_trips': 'int32',
+    'zone_pickups_last_hour': 'int32',
+    # Categories come from the taxi zone lookup
+    **{f'{end}_{attribute}': 'category' for end in ['pickup', 'dropoff']
+       for attribute in ['borough', 'zone', 'service_zone']},
+}
+
+def infer_format(path, fmt=None):
+    """Return the storage format for path, taken from fmt or the file extension.
+
+    A compression extension is skipped, so trips.csv.gz is a CSV file.
+    """
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+        resolved = fmt
+    elif os.path.exists(os.path.join(path, NPY_METADATA)):
+        resolved = 'npy'
+    else:
+        ext = os.path.splitext(strip_compression(path))[1].lower()
+        resolved = FORMAT_EXTENSIONS.get(ext, 'csv')
+    if resolved != 'csv' and infer_compression(path):
+        raise ValueError(f"Only CSV files can be compressed, {resolved} compresses internally: {path}")
+    return resolved
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as exc:
+        raise ImportError("Parquet and Feather support requires pyarrow (pip install pyarrow)") from exc
+    return pyarrow
+
+def _is_datetime(dtype):
+    return isinstance(dtype, str) and dtype.startswith('datetime64')
+
+def _is_integer(dtype):
+    return not isinstance(dtype, pd.CategoricalDtype) and pd.api.types.is_integer_dtype(dtype)
+
+def _csv_dtype(dtype):
+    # Declared categories and integer types are applied afterwards by apply_dtypes,
+    # see _to_category and _to_integer
+    if isinstance(dtype, pd.CategoricalDtype):
+        return 'category'
+    return None if _is_integer(dtype) else dtype
+
+def _csv_source(path):
+    # Compressed CSV goes through the parallel decompression in scripts.compression
+    if infer_compression(path):
+        return open_decompressed(path)
+    return contextlib.nullcontext(path)
+
+def _csv_options(path, columns, dtypes, date_format):
+    header = pd.read_csv(path, nrows=0).columns
+    present = [c for c in header if columns is None or c in columns]
+    return {
+        'usecols': present,
+        'dtype': {c: _csv_dtype(t) for c, t in dtypes.items()
+                  if c in present and not _is_datetime(t) and _csv_dtype(t) is not None},
+        'parse_dates': [c for c, t in dtypes.items() if c in present and _is_datetime(t)],
+        'date_format': date_format,
+    }
+
+def _to_category(series, dtype):
+    """Cast series to the declared categorical dtype when every observed value is one of its categories.
+
+    Unknown labels are kept in an inferred categorical rather than silently
+    turned into missing values, so validation can still see them.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    categories = series.cat.categories
+    if pd.api.types.is_numeric_dtype(dtype.categories) and not pd.api.types.is_numeric_dtype(categories):
+        numeric = pd.to_numeric(categories, errors='coerce')
+        if numeric.isna().any():
+            return series
+        series = series.cat.rename_categories(numeric)
+        categories = series.cat.categories
+    if not categories.isin(dtype.categories).all():
+        return series
+    return series.cat.set_categories(dtype.categories, ordered=dtype.ordered)
+
+def _to_integer(series, dtype):
+    """Cast series to the declared integer dtype when that loses nothing.
+
+    Missing, fractional or non-numeric values keep the type they were parsed
+    with, so validation can still see them.
+    """
+    if not pd.api.types.is_numeric_dtype(series) or series.hasnans:
+        return series
+    values = series.to_numpy()
+    cast = values.astype(dtype)
+    if not (cast == values).all():
+        return series
+    return pd.Series(cast, index=series.index, name=series.name)
+
+def apply_dtypes(df, dtypes, date_format='ISO8601'):
+    """Cast the columns of df that appear in dtypes, leaving matching ones untouched."""
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        if _is_datetime(dtype):
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column], format=date_format)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            if df[column].dtype != dtype:
+                df[column] = _to_category(df[column], dtype)
+        elif _is_integer(dtype):
+            if df[column].dtype != dtype:
+                df[column] = _to_integer(df[column], dtype)
+        elif df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def _arrow_columns(schema_names, columns):
+    if columns is None:
+        return None
+    return [c for c in schema_names if c in columns]
+
+def _open_npy(path, columns):
+    """Memory-map the requested columns of a npy table, returning their metadata, arrays and row count."""
+    with open(os.path.join(path, NPY_METADATA), encoding='utf-8') as f:
+        meta = json.load(f)
+    selected = [column for column in meta['columns'] if columns is None or column['name'] in columns]
+    arrays = {column['name']: np.load(os.path.join(path, column['name'] + '.npy'), mmap_mode='r')
+              for column in selected}
+    return selected, arrays, meta['rows']
+
+def _npy_frame(selected, arrays, start, stop):
+    # Numeric and datetime columns stay views of the mapped files, nothing is parsed
+    data = {}
+    for column in selected:
+        values = np.asarray(arrays[column['name']][start:stop])
+        if column['categories'] is not None:
+            dtype = pd.CategoricalDtype(column['categories'], ordered=column['ordered'])
+            values = pd.Categorical.from_codes(values, dtype=dtype)
+        data[column['name']] = values
+    return pd.DataFrame(data, index=pd.RangeIndex(stop - start), copy=False)
+
+def read_table(path, columns=None, fmt=None, dtypes=None, date_format='ISO8601'):
+    """Read a trip table, loading only the requested columns that exist in it.
+
+    Columns are typed by dtypes (the enriched schema by default) whatever the
+    format: CSV is parsed straight into them and Arrow columns are cast. Columns
+    of a npy table are memory-mapped rather than read.
+    """
+    fmt = infer_format(path, fmt)
+    dtypes = ENRICHED_DTYPES if dtypes is None else dtypes
+    if fmt == 'csv':
+        with _csv_source(path) as source:
+            df = pd.read_csv(source, **_csv_options(path, columns, dtypes, date_format))
+        return apply_dtypes(df, dtypes, date_format)
+    if fmt == 'npy':
+        selected, arrays, rows = _open_npy(path, columns)
+        return apply_dtypes(_npy_frame(selected, arrays, 0, rows), dtypes, date_format)
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        names = pq.read_schema(path).names
+        df = pd.read_parquet(path, columns=_arrow_columns(names, columns))
+    else:
+        import pyarrow as pa
+        with pa.memory_map(str(path)) as source:
+            names = pa.ipc.open_file(source).schema.names
+        df = pd.read_feather(path, columns=_arrow_columns(names, columns))
+    return apply_dtypes(df, dtypes, date_format)
+
+def iter_table(path, chunksize, columns=None, fmt=None, dtypes=None, date_format='ISO8601'):
+    """Yield a trip table as DataFrames of at most chunksize rows."""
+    fmt = infer_format(path, fmt)
+    dtypes = ENRICHED_DTYPES if dtypes is None else dtypes
+    if fmt == 'csv':
+        with _csv_source(path) as source:
+            for chunk in pd.read_csv(source, chunksize=chunksize, **_csv_options(path, columns, dtypes, date_format)):
+                yield apply_dtypes(chunk, dtypes, date_format)
+        return
+    if fmt == 'npy':
+        selected, arrays, rows = _open_npy(path, columns)
+        for start in range(0, rows, chunksize):
+            yield apply_dtypes(_npy_frame(selected, arrays, start, min(start + chunksize, rows)), dtypes, date_format)
+        return
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        selected = _arrow_columns(parquet_file.schema_arrow.names, columns)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=selected):
+            yield apply_dtypes(batch.to_pandas(), dtypes, date_format)
+        return
+
+    import pyarrow as pa
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        selected = _arrow_columns(reader.schema.names, columns)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if selected is not None:
+                batch = batch.select(selected)
+            for start in range(0, batch.num_rows, chunksize):
+                yield apply_dtypes(batch.slice(start, chunksize).to_pandas(), dtypes, date_format)
+
+def write_table(df, path, fmt=None):
+    """Write a trip table in one go."""
+    with TableWriter(path, fmt) as writer:
+        writer.write(df)
+
+def remove_table(path):
+    """Delete a table file, or the directory of a npy table."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+def _codes_dtype(categories):
+    # The same code width pandas picks, so mapped codes are not widened on load
+    for dtype in ('int8', 'int16', 'int32'):
+        if len(categories) < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype('int64')
+
+class TableWriter:
+    """Append DataFrames to a single CSV, Parquet or Feather file.
+
+    Parquet chunks become row groups and Feather chunks record batches; later
+    chunks are cast to the schema of the first one so the file stays typed.
+    A npy table is a directory holding one .npy file per column: categorical
+    and text columns are stored as codes with their categories in the metadata,
+    which is written on close so a readable table is always complete. CSV is
+    compressed when the path ends in .gz, .zst or .bz2.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = infer_format(path, fmt)
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._started = False
+        self._columns = None
+        self._text = None
+        if self.fmt == 'csv' and infer_compression(path):
+            self._text = io.TextIOWrapper(CompressedWriter(path), encoding='utf-8', newline='')
+        if self.fmt in ('parquet', 'feather'):
+            _require_pyarrow()
+
+    def write(self, df):
+        if self._text is not None:
+            df.to_csv(self._text, header=not self._started, index=False)
+        elif self.fmt == 'csv':
+            df.to_csv(self.path, mode='a' if self._started else 'w', header=not self._started, index=False)
+        elif self.fmt == 'npy':
+            self._write_npy(df)
+        else:
+            self._write_arrow(df)
+        self._started = True
+        self.rows += len(df)
+
+    def _write_arrow(self, df):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.fmt == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(str(self.path), self._schema)
+        self._writer.write_table(table)
+
+    def _column_part(self, name):
+        return os.path.join(self.path, name + '.npy.part')
+
+    def _write_npy(self, df):
+        if self._columns is None:
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            os.makedirs(self.path)
+            self._columns = {}
+            for name, series in df.items():
+                categorical = (isinstance(series.dtype, pd.CategoricalDtype)
+                               or series.to_numpy().dtype == object)
+                self._columns[name] = {
+                    'categories': [] if categorical else None,
+                    'ordered': bool(isinstance(series.dtype, pd.CategoricalDtype) and series.cat.ordered),
+                    'dtype': None if categorical else series.to_numpy().dtype,
+                }
+        for name, column in self._columns.items():
+            series = df[name]
+            if column['categories'] is not None:
+                if not isinstance(series.dtype, pd.CategoricalDtype):
+                    series = series.astype('category')
+                known = column['categories']
+                known.extend(c for c in series.cat.categories.tolist() if c not in known)
+                values = series.cat.set_categories(known).cat.codes.to_numpy().astype('int64')
+            else:
+                values = series.to_numpy().astype(column['dtype'], copy=False)
+            with open(self._column_part(name), 'ab') as f:
+                np.ascontiguousarray(values).tofile(f)
+
+    def _close_npy(self):
+        # Prefix every column with its .npy header now that the row count is known
+        meta = {'rows': self.rows, 'columns': []}
+        for name, column in self._columns.items():
+            part_path = self._column_part(name)
+            if column['categories'] is not None:
+                dtype = _codes_dtype(column['categories'])
+            else:
+                dtype = column['dtype']
+            header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (self.rows,)}
+            with open(os.path.join(self.path, name + '.npy'), 'wb') as out, open(part_path, 'rb') as part:
+                np.lib.format.write_array_header_1_0(out, header)
+                if column['categories'] is None:
+                    shutil.copyfileobj(part, out)
+                else:
+                    while True:
+                        codes = np.fromfile(part, dtype='int64', count=1 << 20)
+                        if not len(codes):
+                            break
+                        codes.astype(dtype).tofile(out)
+            os.remove(part_path)
+            meta['columns'].append({'name': name, 'categories': column['categories'],
+                                    'ordered': column['ordered']})
+        with open(os.path.join(self.path, NPY_METADATA), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        self._columns = None
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._columns is not None:
+            self._close_npy()
+        if self._text is not None:
+            self._text.close()
+            self._text = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
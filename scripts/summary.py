@@ -0,0 +1,124 @@
+import argparse
+import os
+
+import numpy as np
+
+from scripts.aggregates import (AGGREGATED_COLUMNS, CORRELATION_FEATURES, compute_plot_aggregates,
+                                merge_plot_aggregates)
+from scripts.sketches import KLLSketch, Moments
+from scripts.storage import FORMATS, iter_table, read_table
+from scripts.validate_curated import VALIDATION_RULES, RuleResult, format_errors, run_validation_rules
+
+SKETCHED_FEATURES = ['trip_distance', 'trip_duration', 'trip_speed_mph', 'tip_percentage']
+REPORTED_QUANTILES = [0.5, 0.9, 0.99]
+
+def summarize_frame(df):
+    """Reduce an enriched frame to a summary whose size does not depend on the rows.
+
+    A summary holds the plot aggregates, the violation count of every validation
+    rule, a KLL quantile sketch of each SKETCHED_FEATURES column and the running
+    moments of CORRELATION_FEATURES. Summaries of disjoint rows merge exactly,
+    except for the sketches, which merge within their error bound.
+    """
+    features = np.column_stack([df[c].to_numpy(dtype='float64', na_value=np.nan) for c in CORRELATION_FEATURES])
+    return {
+        'rows': len(df),
+        'aggregates': compute_plot_aggregates(df),
+        'violations': {result.name: result.violations for result in run_validation_rules(df, sample_size=0)},
+        'sketches': {column: KLLSketch().update(df[column].to_numpy(dtype='float64', na_value=np.nan))
+                     for column in SKETCHED_FEATURES},
+        'moments': Moments(len(CORRELATION_FEATURES)).update(features),
+    }
+
+def merge_summaries(left, right):
+    """Fold the summary of right's rows into left and return it."""
+    left['rows'] += right['rows']
+    left['aggregates'] = merge_plot_aggregates(left['aggregates'], right['aggregates'])
+    for name, count in right['violations'].items():
+        left['violations'][name] = left['violations'].get(name, 0) + count
+    for column, sketch in right['sketches'].items():
+        left['sketches'][column].merge(sketch)
+    left['moments'].merge(right['moments'])
+    return left
+
+def summarize_file(file_path, chunksize=None, fmt=None):
+    """Summarize an enriched file in one pass, streaming it when chunksize is set."""
+    if not chunksize:
+        return summarize_frame(read_table(file_path, columns=AGGREGATED_COLUMNS, fmt=fmt))
+    summary = None
+    for chunk in iter_table(file_path, chunksize, columns=AGGREGATED_COLUMNS, fmt=fmt):
+        chunk_summary = summarize_frame(chunk)
+        summary = chunk_summary if summary is None else merge_summaries(summary, chunk_summary)
+    return summary
+
+def save_summary(summary, path):
+    arrays = {'rows': np.array(summary['rows'])}
+    arrays.update({f'aggregates/{key}': value for key, value in summary['aggregates'].items()})
+    arrays.update({f'violations/{name}': np.array(count) for name, count in summary['violations'].items()})
+    for column, sketch in summary['sketches'].items():
+        arrays.update(sketch.to_arrays(f'sketch/{column}'))
+    arrays.update(summary['moments'].to_arrays('moments'))
+    # np.savez would append .npz to any other name
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+def load_summary(path):
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    return {
+        'rows': int(arrays['rows']),
+        'aggregates': {key.split('/', 1)[1]: value for key, value in arrays.items() if key.startswith('aggregates/')},
+        'violations': {key.split('/', 1)[1]: int(value) for key, value in arrays.items()
+                       if key.startswith('violations/')},
+        'sketches': {column: KLLSketch.from_arrays(arrays, f'sketch/{column}') for column in SKETCHED_FEATURES
+                     if f'sketch/{column}/meta' in arrays},
+        'moments': Moments.from_arrays(arrays, 'moments'),
+    }
+
+def summary_rule_results(summary):
+    """Validation results from a summary, without sample rows."""
+    return [RuleResult(name, message, summary['violations'][name], [])
+            for name, _, message, _ in VALIDATION_RULES if name in summary['violations']]
+
+def format_quantiles(summary, quantiles=REPORTED_QUANTILES):
+    header = f"{'feature':<16}" + ''.join(f"{f'p{q * 100:g}':>10}" for q in quantiles)
+    lines = [header]
+    for column, sketch in summary['sketches'].items():
+        lines.append(f"{column:<16}" + ''.join(f"{value:>10.2f}" for value in sketch.quantiles(quantiles)))
+    return lines
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize enriched NYC yellow taxi trips into mergeable sketches.')
+    parser.add_argument('inputs', nargs='+',
+                        help='enriched trip files, or .npz summaries of other partitions to merge')
+    parser.add_argument('--output', default='data/nyc_taxi_summary.npz', help='summary file to write')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='enriched file format (default: from the file extension)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream each file in chunks of this many rows instead of loading it whole')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    missing = [path for path in args.inputs if not os.path.exists(path)]
+    if missing:
+        print(f"Input files not found: {', '.join(missing)}")
+        return
+
+    summary = None
+    for path in args.inputs:
+        if path.endswith('.npz'):
+            part = load_summary(path)
+        else:
+            part = summarize_file(path, chunksize=args.chunksize, fmt=args.format)
+        summary = part if summary is None else merge_summaries(summary, part)
+    save_summary(summary, args.output)
+
+    print(f"Summary of {summary['rows']} trips saved to {args.output} ({os.path.getsize(args.output)} bytes)")
+    for line in format_quantiles(summary):
+        print(line)
+    for error in format_errors(summary_rule_results(summary)):
+        print(f"- {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# Share of pickups per hour of day, shaped like the TLC yellow cab demand curve
+HOURLY_DEMAND = np.array([3.0, 2.2, 1.6, 1.1, 0.9, 1.0, 2.0, 3.4, 4.3, 4.4, 4.4, 4.6,
+                          4.8, 4.8, 5.0, 5.1, 5.0, 5.8, 6.4, 6.2, 5.6, 5.3, 5.0, 4.0])
+HOURLY_DEMAND = HOURLY_DEMAND / HOURLY_DEMAND.sum()
+
+# Share of rows carrying each kind of defect the cleaning stage has to cope with
+DEFECT_RATES = {
+    'missing_passenger_info': 0.03,
+    'missing_distance': 0.001,
+    'zero_distance': 0.01,
+    'refund': 0.005,
+    'reversed_timestamps': 0.001,
+    'meter_glitch_distance': 0.0002,
+}
+
+def generate_trips(rows, seed=0, start='2024-01-01', days=31):
+    """Return rows synthetic yellow cab trips in the TLC raw layout.
+
+    Pickups follow the daily demand curve, distances, speeds and fares follow
+    the usual skewed shapes, card payments carry tips, and DEFECT_RATES of the
+    rows carry nulls and outliers. The same seed always gives the same frame.
+    """
+    rng = np.random.default_rng(seed)
+    start_seconds = pd.Timestamp(start).value // 10**9
+    day = rng.integers(0, days, rows)
+    hour = rng.choice(24, size=rows, p=HOURLY_DEMAND)
+    pickup = start_seconds + day * 86400 + hour * 3600 + rng.integers(0, 3600, rows)
+
+    distance = np.round(rng.lognormal(0.6, 0.85, rows), 2)
+    speed = np.clip(rng.lognormal(2.4, 0.35, rows), 2, 60)
+    duration = np.round(distance / speed * 3600 + rng.integers(30, 240, rows))
+
+    fare = np.round(3.0 + 2.5 * distance + 0.5 * duration / 60, 2)
+    payment = rng.choice([1, 2, 3, 4], size=rows, p=[0.74, 0.22, 0.02, 0.02])
+    tip = np.where(payment == 1, np.round(fare * rng.uniform(0.1, 0.3, rows), 2), 0.0)
+    tolls = np.where(rng.random(rows) < 0.05, 6.94, 0.0)
+    congestion = np.where(rng.random(rows) < 0.9, 2.5, 0.0)
+    total = np.round(fare + 1.0 + 0.5 + 1.0 + tip + tolls + congestion, 2)
+
+    df = pd.DataFrame({
+        'VendorID': rng.choice([1, 2], size=rows, p=[0.3, 0.7]),
+        'tpep_pickup_datetime': pd.to_datetime(pickup, unit='s'),
+        'tpep_dropoff_datetime': pd.to_datetime(pickup + duration.astype('int64'), unit='s'),
+        'passenger_count': rng.choice([1.0, 2.0, 3.0, 4.0, 5.0, 6.0], size=rows,
+                                      p=[0.72, 0.15, 0.04, 0.02, 0.04, 0.03]),
+        'trip_distance': distance,
+        'RatecodeID': 1.0,
+        'store_and_fwd_flag': 'N',
+        'PULocationID': rng.integers(1, 266, rows),
+        'DOLocationID': rng.integers(1, 266, rows),
+        'payment_type': payment,
+        'fare_amount': fare,
+        'extra': 1.0,
+        'mta_tax': 0.5,
+        'tip_amount': tip,
+        'tolls_amount': tolls,
+        'improvement_surcharge': 1.0,
+        'total_amount': total,
+        'congestion_surcharge': congestion,
+        'airport_fee': 0.0,
+    })
+
+    def pick(rate):
+        return rng.random(rows) < rate
+
+    missing = pick(DEFECT_RATES['missing_passenger_info'])
+    df.loc[missing, ['passenger_count', 'RatecodeID', 'congestion_surcharge', 'airport_fee']] = np.nan
+    df['store_and_fwd_flag'] = df['store_and_fwd_flag'].where(~missing)
+    df.loc[pick(DEFECT_RATES['missing_distance']), 'trip_distance'] = np.nan
+    df.loc[pick(DEFECT_RATES['zero_distance']), 'trip_distance'] = 0.0
+    refund = pick(DEFECT_RATES['refund'])
+    df.loc[refund, ['fare_amount', 'tip_amount', 'total_amount']] *= -1
+    reversed_rows = pick(DEFECT_RATES['reversed_timestamps'])
+    df.loc[reversed_rows, ['tpep_pickup_datetime', 'tpep_dropoff_datetime']] = \
+        df.loc[reversed_rows, ['tpep_dropoff_datetime', 'tpep_pickup_datetime']].to_numpy()
+    glitch = pick(DEFECT_RATES['meter_glitch_distance'])
+    df.loc[glitch, 'trip_distance'] = np.round(rng.uniform(1000, 200000, glitch.sum()), 2)
+    return df
+
+def write_trips(path, rows, seed=0, chunk_rows=1_000_000, **options):
+    """Write rows synthetic trips to a CSV file, generating them chunk by chunk.
+
+    Every chunk gets its own child seed, so large files never need to fit in
+    memory and the output is the same for the same seed and chunk_rows.
+    """
+    chunk_seeds = np.random.SeedSequence(seed).spawn(max(1, -(-rows // chunk_rows)))
+    written = 0
+    for chunk_seed in chunk_seeds:
+        size = min(chunk_rows, rows - written)
+        chunk = generate_trips(size, seed=chunk_seed, **options)
+        chunk.to_csv(path, mode='w' if written == 0 else 'a', header=written == 0, index=False,
+                     date_format='%Y-%m-%d %H:%M:%S')
+        written += size
+    return written
@@ -1,51 +1,202 @@
-import pandas as pd
+import argparse
 import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from scripts.anomalies import detect_file_anomalies
+from scripts.features import trip_type_codes
+from scripts.metrics import PipelineMetrics, null_stage, profiled
+from scripts.sampling import sample_file
+from scripts.storage import FORMATS, iter_table, read_table, write_table
+
+DEFAULT_INPUT_FILE = 'data/nyc_taxi_enriched.csv'
+VALIDATED_COLUMNS = ['trip_speed_mph', 'tip_percentage', 'trip_type', 'is_peak_hour']
+
+@dataclass(frozen=True)
+class RuleResult:
+    name: str
+    message: str
+    violations: int
+    sample_indices: list
+
+def _numeric(series):
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+def _unrealistic_speed(series):
+    return _numeric(series) > 100
+
+def _invalid_tip(series):
+    values = _numeric(series)
+    return (values < 0) | (values > 100)
+
+def _invalid_trip_type(series):
+    # Codes of -1 mark missing values and labels outside TRIP_TYPES
+    return trip_type_codes(series) == -1
+
+def _invalid_peak_flag(series):
+    if not pd.api.types.is_numeric_dtype(series):
+        return ~series.isin([0, 1]).to_numpy()
+    values = _numeric(series)
+    return (values != 0) & (values != 1)
+
+# name, checked column, message and violation mask of every validation rule
+VALIDATION_RULES = [
+    ('unrealistic_speed', 'trip_speed_mph', 'Unrealistic speeds found', _unrealistic_speed),
+    ('invalid_tip_percentage', 'tip_percentage', 'Invalid tip percentages', _invalid_tip),
+    ('invalid_trip_type', 'trip_type', 'Invalid trip types', _invalid_trip_type),
+    ('invalid_peak_hour', 'is_peak_hour', 'Invalid peak hour indicators', _invalid_peak_flag),
+]
+
+def run_validation_rules(df, sample_size=5, weights=None):
+    """Evaluate every rule whose column is present as a boolean mask over df.
+
+    Nothing is copied out of df; each rule reports its violation count and the
+    index labels of the first sample_size offending rows. With per-row weights,
+    e.g. the sample_weight of a stratified sample, violations are weighted counts.
+    """
+    results = []
+    for name, column, message, rule in VALIDATION_RULES:
+        if column not in df.columns:
+            continue
+        mask = rule(df[column])
+        positions = np.flatnonzero(mask)
+        violations = len(positions) if weights is None else int(round(weights[positions].sum()))
+        results.append(RuleResult(name, message, violations, df.index[positions[:sample_size]].tolist()))
+    return results
+
+def merge_rule_results(totals, results, sample_size=5):
+    """Add per-chunk rule results into running totals keyed by rule name."""
+    for result in results:
+        previous = totals.get(result.name)
+        if previous is None:
+            totals[result.name] = result
+            continue
+        samples = (previous.sample_indices + result.sample_indices)[:sample_size]
+        totals[result.name] = RuleResult(result.name, result.message,
+                                         previous.violations + result.violations, samples)
+    return totals
+
+def validate_file(file_path, chunksize=None, fmt=None, fail_fast=False, sample_size=5, metrics=None):
+    """Validate an enriched file, streaming it chunk by chunk when chunksize is set.
+
+    Violation counts are accumulated across chunks and sample indices are row
+    positions within the file. With fail_fast, reading stops after the first
+    chunk that has any violation. Returns the rule results and the rows checked.
+    """
+    stage = metrics.stage if metrics is not None else null_stage
+    if chunksize:
+        chunks = iter(iter_table(file_path, chunksize, columns=VALIDATED_COLUMNS, fmt=fmt))
+    else:
+        chunks = iter([read_table(file_path, columns=VALIDATED_COLUMNS, fmt=fmt)])
+
+    totals = {}
+    rows = 0
+    while True:
+        with stage('read') as record:
+            chunk = next(chunks, None)
+            record['rows_out'] = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            break
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        with stage('validate', rows_in=len(chunk)):
+            results = run_validation_rules(chunk, sample_size)
+        merge_rule_results(totals, results, sample_size)
+        rows += len(chunk)
+        if fail_fast and any(result.violations for result in results):
+            break
+    return list(totals.values()), rows
+
+def validate_sample(file_path, size, chunksize=None, fmt=None, seed=0, sample_size=5):
+    """Estimate the violations of an enriched file from a stratified sample of size rows.
+
+    Returns the rule results, with violation counts weighted up to the whole
+    file, and the number of rows the sample was drawn from.
+    """
+    sample = sample_file(file_path, size, chunksize, columns=VALIDATED_COLUMNS, fmt=fmt, seed=seed)
+    weights = sample['sample_weight'].to_numpy()
+    return run_validation_rules(sample, sample_size, weights), int(round(weights.sum()))
+
+def format_errors(results):
+    return [f"{result.message}: {result.violations} records" for result in results if result.violations]
 
 def validate_curated_data(df):
-    errors = []
-    
-    # Check trip speed
-    if 'trip_speed_mph' in df.columns:
-        invalid_speed = df[df['trip_speed_mph'] > 100]
-        if not invalid_speed.empty:
-            errors.append(f"Unrealistic speeds found: {len(invalid_speed)} records")
-    
-    # Check tip percentage
-    if 'tip_percentage' in df.columns:
-        invalid_tip = df[(df['tip_percentage'] < 0) | (df['tip_percentage'] > 100)]
-        if not invalid_tip.empty:
-            errors.append(f"Invalid tip percentages: {len(invalid_tip)} records")
-    
-    # Check trip type
-    if 'trip_type' in df.columns:
-        invalid_type = df[~df['trip_type'].isin(['short', 'medium', 'long'])]
-        if not invalid_type.empty:
-            errors.append(f"Invalid trip types: {len(invalid_type)} records")
-    
-    # Check peak hour indicator
-    if 'is_peak_hour' in df.columns:
-        invalid_peak = df[~df['is_peak_hour'].isin([0, 1])]
-        if not invalid_peak.empty:
-            errors.append(f"Invalid peak hour indicators: {len(invalid_peak)} records")
-    
-    return errors
+    return format_errors(run_validation_rules(df))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Validate enriched NYC yellow taxi trip data.')
+    parser.add_argument('--input', default=DEFAULT_INPUT_FILE, help='enriched trip file')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='enriched file format (default: from the file extension)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the file in chunks of this many rows instead of loading it whole')
+    parser.add_argument('--summary', default=None,
+                        help='validate from the violation counts of a scripts.summary file instead of --input')
+    parser.add_argument('--sample', type=int, default=None,
+                        help='estimate the violation counts from a stratified sample of this many trips')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the --sample draw')
+    parser.add_argument('--anomalies', default=None,
+                        help='write the IDs of outlier trips by hour and trip type to this quarantine file')
+    parser.add_argument('--fail-fast', action='store_true',
+                        help='exit with status 1 on violations; when streaming --input, stop at the first failing chunk')
+    parser.add_argument('--metrics-json', default=None,
+                        help='write per-stage timings, row counts and peak memory to this JSON file')
+    parser.add_argument('--profile', default=None,
+                        help='write a cProfile dump (or a pyinstrument report for .html) to this file')
+    return parser.parse_args(argv)
 
-def main():
-    file_path = 'data/nyc_taxi_enriched.csv'
+def main(argv=None):
+    args = parse_args(argv)
+    file_path = args.summary or args.input
     
     if not os.path.exists(file_path):
         print(f"File {file_path} not found.")
-        return
+        return 1
     
-    df = pd.read_csv(file_path)
-    errors = validate_curated_data(df)
+    metrics = PipelineMetrics('validate_curated')
+    if args.summary:
+        # Imported here, scripts.summary itself builds on the rules in this module
+        from scripts.summary import load_summary, summary_rule_results
+        summary = load_summary(file_path)
+        results, checked = summary_rule_results(summary), summary['rows']
+    else:
+        with profiled(args.profile):
+            if args.sample:
+                with metrics.stage('sample') as record:
+                    results, checked = validate_sample(file_path, args.sample, chunksize=args.chunksize,
+                                                       fmt=args.format, seed=args.seed)
+                    record['rows_in'] = checked
+                print(f"Violation counts estimated from a stratified sample of {min(args.sample, checked)} "
+                      f"of {checked} trips.")
+            else:
+                results, checked = validate_file(file_path, chunksize=args.chunksize, fmt=args.format,
+                                                 fail_fast=args.fail_fast, metrics=metrics)
+            if args.anomalies:
+                with metrics.stage('anomalies', rows_in=checked) as record:
+                    anomalies = detect_file_anomalies(file_path, chunksize=args.chunksize, fmt=args.format)
+                    write_table(anomalies, args.anomalies)
+                    record['rows_out'] = len(anomalies)
+                counts = anomalies['metric'].value_counts(sort=False)
+                print(f"Quarantined {anomalies['row_id'].nunique()} outlier trips to {args.anomalies} ("
+                      + ', '.join(f"{metric}: {count}" for metric, count in counts.items()) + ")")
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    results = [result for result in results if result.violations]
     
-    if errors:
+    if results:
         print("Validation errors found:")
-        for error in errors:
-            print(f"- {error}")
+        for result in results:
+            rows = ', '.join(str(index) for index in result.sample_indices)
+            print(f"- {result.message}: {result.violations} records" + (f" (e.g. rows {rows})" if rows else ''))
+        if args.fail_fast:
+            if args.chunksize and not (args.summary or args.sample):
+                print(f"Stopped after the first failing chunk ({checked} rows checked).")
+            return 1
     else:
         print("Data validated successfully.")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,24 +1,84 @@
+import argparse
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import seaborn as sns
-import os
 
-def create_visualizations():
+from scripts.aggregates import (CORRELATION_FEATURES, DENSITY_DISTANCE_BINS, DENSITY_SPEED_BINS, SPEED_BINS,
+                                TIP_BINS, aggregate_file, box_stats, correlation_matrix, mean)
+from scripts.features import TRIP_TYPES
+from scripts.manifest import load_manifest, save_manifest
+from scripts.metrics import PipelineMetrics, null_stage, profiled
+from scripts.sampling import sample_file
+from scripts.storage import FORMATS, read_table
+from scripts.summary import load_summary
+
+DEFAULT_INPUT_FILE = 'data/nyc_taxi_enriched.csv'
+PLOTTED_COLUMNS = ['trip_distance', 'trip_duration', 'trip_speed_mph', 'tip_percentage',
+                   'trip_type', 'is_peak_hour']
+
+def create_visualizations(file_path=DEFAULT_INPUT_FILE, fmt=None, plots_dir='plots', aggregate=False,
+                          chunksize=None, batch=False, dpi=300, image_format='png', workers=None, force=False,
+                          metrics=None, summary=None, sample=None, seed=0):
+    """Plot the enriched trips in file_path, or the aggregates of a summary file if given.
+
+    With sample, the row-level charts are drawn from a weighted stratified
+    sample of that many trips, streamed in chunks of chunksize rows if set.
+    """
+    stage = metrics.stage if metrics is not None else null_stage
     # Load enriched data
-    file_path = 'data/nyc_taxi_enriched.csv'
+    if not os.path.exists(summary or file_path):
+        print(f"File {summary or file_path} not found. Please run data enrichment first.")
+        return
 
-    if not os.path.exists(file_path):
-        print(f"File {file_path} not found. Please run data enrichment first.")
+    if aggregate or (chunksize and not sample) or batch or summary:
+        with stage('aggregate') as record:
+            if summary:
+                aggregates = load_summary(summary)['aggregates']
+            else:
+                aggregates = aggregate_file(file_path, chunksize=chunksize, fmt=fmt)
+            record['rows_in'] = aggregates['rows']
+        with stage('render'):
+            rendered = render_charts(aggregates, plots_dir, dpi=dpi, image_format=image_format,
+                                     workers=workers if batch else 1, force=force)
+        print(f"Visualizations saved to {plots_dir}/ ({len(rendered)} of {len(CHARTS)} charts redrawn)")
         return
 
-    df = pd.read_csv(file_path)
+    with stage('sample' if sample else 'read') as record:
+        if sample:
+            df = sample_file(file_path, sample, chunksize, columns=PLOTTED_COLUMNS, fmt=fmt, seed=seed)
+        else:
+            df = read_table(file_path, columns=PLOTTED_COLUMNS, fmt=fmt)
+        record['rows_out'] = len(df)
+    with stage('plot', rows_in=len(df)):
+        _plot_rows(df, plots_dir)
+
+def _weights(df):
+    # Sampled rows stand for sample_weight trips each, full data for one
+    return df['sample_weight'] if 'sample_weight' in df.columns else pd.Series(1.0, index=df.index)
+
+def _weighted_corr(features, weights):
+    values = features.to_numpy(dtype='float64', na_value=np.nan)
+    complete = ~np.isnan(values).any(axis=1)
+    covariance = np.cov(values[complete], rowvar=False, aweights=weights.to_numpy()[complete])
+    std = np.sqrt(np.diag(covariance))
+    return pd.DataFrame(covariance / np.outer(std, std), index=features.columns, columns=features.columns)
+
+def _plot_rows(df, plots_dir):
+    weights = _weights(df)
+    speed_mean = np.average(df['trip_speed_mph'], weights=weights)
+    tip_mean = np.average(df['tip_percentage'], weights=weights)
 
     # Set up the plotting style
     plt.style.use('default')
     sns.set_palette("husl")
 
     # Create a directory for plots if it doesn't exist
-    plots_dir = 'plots'
     os.makedirs(plots_dir, exist_ok=True)
 
     # Create subplots for multiple visualizations
@@ -26,23 +86,24 @@ def create_visualizations():
     fig.suptitle('NYC Taxi Data - New Features Analysis', fontsize=16, fontweight='bold')
 
     # 1. Trip Speed Distribution
-    axes[0, 0].hist(df['trip_speed_mph'], bins=30, alpha=0.7, color='skyblue', edgecolor='black')
+    axes[0, 0].hist(df['trip_speed_mph'], bins=30, weights=weights, alpha=0.7, color='skyblue', edgecolor='black')
     axes[0, 0].set_title('Trip Speed Distribution (mph)', fontweight='bold')
     axes[0, 0].set_xlabel('Speed (mph)')
     axes[0, 0].set_ylabel('Frequency')
-    axes[0, 0].axvline(df['trip_speed_mph'].mean(), color='red', linestyle='--', label=f'Mean: {df["trip_speed_mph"].mean():.1f} mph')
+    axes[0, 0].axvline(speed_mean, color='red', linestyle='--', label=f'Mean: {speed_mean:.1f} mph')
     axes[0, 0].legend()
 
     # 2. Tip Percentage Distribution
-    axes[0, 1].hist(df['tip_percentage'], bins=20, alpha=0.7, color='lightgreen', edgecolor='black')
+    axes[0, 1].hist(df['tip_percentage'], bins=20, weights=weights, alpha=0.7, color='lightgreen', edgecolor='black')
     axes[0, 1].set_title('Tip Percentage Distribution', fontweight='bold')
     axes[0, 1].set_xlabel('Tip Percentage (%)')
     axes[0, 1].set_ylabel('Frequency')
-    axes[0, 1].axvline(df['tip_percentage'].mean(), color='red', linestyle='--', label=f'Mean: {df["tip_percentage"].mean():.1f}%')
+    axes[0, 1].axvline(tip_mean, color='red', linestyle='--', label=f'Mean: {tip_mean:.1f}%')
     axes[0, 1].legend()
 
     # 3. Trip Type Distribution
-    trip_type_counts = df['trip_type'].value_counts()
+    trip_type_counts = weights.groupby(df['trip_type'], observed=False).sum().round().astype('int64')
+    trip_type_counts = trip_type_counts.sort_values(ascending=False, kind='stable')
     axes[1, 0].bar(trip_type_counts.index, trip_type_counts.values, alpha=0.7, color=['lightcoral', 'gold', 'lightblue'])
     axes[1, 0].set_title('Trip Type Distribution', fontweight='bold')
     axes[1, 0].set_xlabel('Trip Type')
@@ -53,7 +114,7 @@ def create_visualizations():
         axes[1, 0].text(i, v + 0.5, str(v), ha='center', fontweight='bold')
 
     # 4. Peak Hour Analysis
-    peak_hour_counts = df['is_peak_hour'].value_counts().sort_index()
+    peak_hour_counts = weights.groupby(df['is_peak_hour']).sum().sort_index()
     peak_hour_labels = ['Off-Peak', 'Peak Hour']
     axes[1, 1].pie(peak_hour_counts.values, labels=peak_hour_labels, autopct='%1.1f%%',
                    colors=['lightgray', 'orange'], startangle=90)
@@ -90,8 +151,10 @@ def create_detailed_plots(df, plots_dir):
 
     # Speed distribution by peak hour
     plt.figure(figsize=(10, 6))
+    # Seaborn cannot pick bins automatically for weighted data
+    weighted = {'weights': 'sample_weight', 'bins': 30} if 'sample_weight' in df.columns else {}
     sns.histplot(data=df, x='trip_speed_mph', hue='is_peak_hour', multiple='stack',
-                palette=['lightblue', 'salmon'], alpha=0.7)
+                palette=['lightblue', 'salmon'], alpha=0.7, **weighted)
     plt.title('Speed Distribution by Peak Hour', fontweight='bold')
     plt.xlabel('Trip Speed (mph)')
     plt.ylabel('Frequency')
@@ -101,7 +164,10 @@ def create_detailed_plots(df, plots_dir):
 
     # Correlation heatmap of new features
     new_features = ['trip_distance', 'trip_duration', 'trip_speed_mph', 'tip_percentage', 'is_peak_hour']
-    corr_matrix = df[new_features].corr()
+    if 'sample_weight' in df.columns:
+        corr_matrix = _weighted_corr(df[new_features], df['sample_weight'])
+    else:
+        corr_matrix = df[new_features].corr()
 
     plt.figure(figsize=(8, 6))
     sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0, fmt='.2f')
@@ -109,5 +175,207 @@ def create_detailed_plots(df, plots_dir):
     plt.savefig(f'{plots_dir}/correlation_matrix.png', dpi=300, bbox_inches='tight')
     plt.close()
 
+# Rendering settings that keep repeated renders of unchanged data byte-identical
+RENDER_RC = {'svg.hashsalt': 'ny-yellowcab-advanced'}
+SAVE_METADATA = {'svg': {'Date': None}, 'pdf': {'CreationDate': None}}
+# Bump when a render_* function changes, so cached charts are redrawn
+RENDER_VERSION = 1
+RENDER_MANIFEST = '_render_manifest.json'
+
+def _bin_centers(edges):
+    return (edges[:-1] + edges[1:]) / 2
+
+def _subplots(nrows=1, ncols=1, figsize=None):
+    # A figure outside pyplot, so rendering needs no backend and leaves pyplot's figures alone
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots(nrows, ncols)
+
+def _save(fig, path, dpi, image_format):
+    fig.savefig(path, dpi=dpi, format=image_format, bbox_inches='tight',
+                metadata=SAVE_METADATA.get(image_format))
+
+def render_overview(aggregates, path, dpi=300, image_format='png'):
+    # Same dashboard as create_visualizations, drawn from the binned aggregates
+    fig, axes = _subplots(2, 2, figsize=(15, 12))
+    fig.suptitle('NYC Taxi Data - New Features Analysis', fontsize=16, fontweight='bold')
+
+    speed_mean = mean(aggregates, 'speed')
+    axes[0, 0].hist(_bin_centers(SPEED_BINS), bins=SPEED_BINS, weights=aggregates['speed_hist'],
+                    alpha=0.7, color='skyblue', edgecolor='black')
+    axes[0, 0].set_title('Trip Speed Distribution (mph)', fontweight='bold')
+    axes[0, 0].set_xlabel('Speed (mph)')
+    axes[0, 0].set_ylabel('Frequency')
+    axes[0, 0].axvline(speed_mean, color='red', linestyle='--', label=f'Mean: {speed_mean:.1f} mph')
+    axes[0, 0].legend()
+
+    tip_mean = mean(aggregates, 'tip')
+    axes[0, 1].hist(_bin_centers(TIP_BINS), bins=TIP_BINS, weights=aggregates['tip_hist'],
+                    alpha=0.7, color='lightgreen', edgecolor='black')
+    axes[0, 1].set_title('Tip Percentage Distribution', fontweight='bold')
+    axes[0, 1].set_xlabel('Tip Percentage (%)')
+    axes[0, 1].set_ylabel('Frequency')
+    axes[0, 1].axvline(tip_mean, color='red', linestyle='--', label=f'Mean: {tip_mean:.1f}%')
+    axes[0, 1].legend()
+
+    trip_type_counts = aggregates['trip_type_counts']
+    axes[1, 0].bar(TRIP_TYPES, trip_type_counts, alpha=0.7, color=['lightcoral', 'gold', 'lightblue'])
+    axes[1, 0].set_title('Trip Type Distribution', fontweight='bold')
+    axes[1, 0].set_xlabel('Trip Type')
+    axes[1, 0].set_ylabel('Count')
+    for i, v in enumerate(trip_type_counts):
+        axes[1, 0].text(i, v + 0.5, str(v), ha='center', fontweight='bold')
+
+    if aggregates['peak_counts'].sum():
+        axes[1, 1].pie(aggregates['peak_counts'], labels=['Off-Peak', 'Peak Hour'], autopct='%1.1f%%',
+                       colors=['lightgray', 'orange'], startangle=90)
+    else:
+        axes[1, 1].text(0.5, 0.5, 'No trips', ha='center', va='center')
+        axes[1, 1].set_axis_off()
+    axes[1, 1].set_title('Peak Hour Distribution', fontweight='bold')
+
+    fig.tight_layout()
+    _save(fig, path, dpi, image_format)
+
+def render_speed_vs_distance(aggregates, path, dpi=300, image_format='png'):
+    # Speed vs distance density, one weighted point per non-empty 2-D bin
+    distance, speed = np.meshgrid(_bin_centers(DENSITY_DISTANCE_BINS), _bin_centers(DENSITY_SPEED_BINS), indexing='ij')
+    counts = aggregates['density']
+    filled = counts > 0
+    fig, ax = _subplots(figsize=(10, 6))
+    if filled.any():
+        hexes = ax.hexbin(distance[filled], speed[filled], C=counts[filled], reduce_C_function=np.sum,
+                          gridsize=40, bins='log', cmap='Purples')
+        fig.colorbar(hexes, ax=ax, label='Trips')
+    ax.set_title('Trip Speed vs Distance', fontweight='bold')
+    ax.set_xlabel('Trip Distance (miles)')
+    ax.set_ylabel('Trip Speed (mph)')
+    ax.grid(True, alpha=0.3)
+    _save(fig, path, dpi, image_format)
+
+def render_tip_by_trip_type(aggregates, path, dpi=300, image_format='png'):
+    # Tip percentage by trip type from histogram quantiles
+    fig, ax = _subplots(figsize=(10, 6))
+    boxes = ax.bxp(box_stats(aggregates), showfliers=False, patch_artist=True)
+    for patch, color in zip(boxes['boxes'], sns.color_palette('Set3', len(TRIP_TYPES))):
+        patch.set_facecolor(color)
+    ax.set_title('Tip Percentage by Trip Type', fontweight='bold')
+    ax.set_xlabel('Trip Type')
+    ax.set_ylabel('Tip Percentage (%)')
+    _save(fig, path, dpi, image_format)
+
+def render_speed_by_peak_hour(aggregates, path, dpi=300, image_format='png'):
+    centers = _bin_centers(SPEED_BINS)
+    fig, ax = _subplots(figsize=(10, 6))
+    ax.hist([centers, centers], bins=SPEED_BINS, weights=list(aggregates['speed_peak_hist']), stacked=True,
+            color=['lightblue', 'salmon'], alpha=0.7, label=['Off-Peak', 'Peak Hour'])
+    ax.set_title('Speed Distribution by Peak Hour', fontweight='bold')
+    ax.set_xlabel('Trip Speed (mph)')
+    ax.set_ylabel('Frequency')
+    ax.legend()
+    _save(fig, path, dpi, image_format)
+
+def render_correlation_matrix(aggregates, path, dpi=300, image_format='png'):
+    corr_matrix = pd.DataFrame(correlation_matrix(aggregates), index=CORRELATION_FEATURES,
+                               columns=CORRELATION_FEATURES)
+    fig, ax = _subplots(figsize=(8, 6))
+    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0, fmt='.2f', ax=ax)
+    ax.set_title('Correlation Matrix of New Features', fontweight='bold')
+    _save(fig, path, dpi, image_format)
+
+# Chart file name -> render function and the aggregates it is drawn from
+CHARTS = {
+    'nyc_taxi_features_overview': (render_overview, ['speed_hist', 'speed_sum', 'speed_count', 'tip_hist',
+                                                     'tip_sum', 'tip_count', 'trip_type_counts', 'peak_counts']),
+    'speed_vs_distance': (render_speed_vs_distance, ['density']),
+    'tip_by_trip_type': (render_tip_by_trip_type, ['tip_type_hist']),
+    'speed_by_peak_hour': (render_speed_by_peak_hour, ['speed_peak_hist']),
+    'correlation_matrix': (render_correlation_matrix, ['moments/count', 'moments/mean', 'moments/comoment']),
+}
+
+def chart_fingerprint(name, aggregates, dpi, image_format):
+    """Hash of everything a chart is drawn from: its aggregates and the render settings."""
+    digest = hashlib.sha256(f'{name}:{RENDER_VERSION}:{dpi}:{image_format}'.encode())
+    for key in CHARTS[name][1]:
+        value = np.ascontiguousarray(aggregates[key])
+        digest.update(f'{key}:{value.dtype}:{value.shape}'.encode())
+        digest.update(value.tobytes())
+    return digest.hexdigest()
+
+def _render_chart(task):
+    name, aggregates, path, dpi, image_format = task
+    with plt.rc_context(RENDER_RC):
+        CHARTS[name][0](aggregates, path, dpi, image_format)
+    return name
+
+def render_charts(aggregates, plots_dir, dpi=300, image_format='png', workers=None, force=False):
+    """Render every chart from aggregates in parallel processes, without touching pyplot's state.
+
+    Charts whose aggregates and settings hash the same as in the previous render
+    into plots_dir are skipped. Returns the names of the charts that were drawn.
+    """
+    os.makedirs(plots_dir, exist_ok=True)
+    manifest_path = os.path.join(plots_dir, RENDER_MANIFEST)
+    manifest = load_manifest(manifest_path)
+
+    tasks = []
+    fingerprints = {}
+    for name, (_, keys) in CHARTS.items():
+        path = os.path.join(plots_dir, f'{name}.{image_format}')
+        fingerprints[name] = chart_fingerprint(name, aggregates, dpi, image_format)
+        if not force and manifest.get(path) == fingerprints[name] and os.path.exists(path):
+            continue
+        tasks.append((name, {key: aggregates[key] for key in keys}, path, dpi, image_format))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        rendered = [_render_chart(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            rendered = list(executor.map(_render_chart, tasks))
+
+    for name, _, path, _, _ in tasks:
+        manifest[path] = fingerprints[name]
+    save_manifest(manifest, manifest_path)
+    return rendered
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Plot the derived NYC yellow taxi features.')
+    parser.add_argument('--input', default=DEFAULT_INPUT_FILE, help='enriched trip file')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='enriched file format (default: from the file extension)')
+    parser.add_argument('--plots-dir', default='plots', help='directory for the generated charts')
+    parser.add_argument('--aggregate', action='store_true',
+                        help='plot from fixed-bin aggregates instead of every row')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the file in chunks of this many rows while aggregating (implies --aggregate)')
+    parser.add_argument('--summary', default=None,
+                        help='draw the aggregated charts from a scripts.summary file instead of --input')
+    parser.add_argument('--sample', type=int, default=None,
+                        help='draw the row-level charts from a weighted stratified sample of this many trips')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the --sample draw')
+    parser.add_argument('--batch', action='store_true',
+                        help='non-interactive: render the aggregated charts in parallel without a display')
+    parser.add_argument('--workers', type=int, default=None, help='render processes in batch mode (default: all cores)')
+    parser.add_argument('--dpi', type=int, default=300, help='resolution of aggregated charts')
+    parser.add_argument('--image-format', default='png', choices=['png', 'svg', 'pdf', 'jpg'],
+                        help='file format of aggregated charts')
+    parser.add_argument('--force', action='store_true', help='redraw charts even if their aggregates are unchanged')
+    parser.add_argument('--metrics-json', default=None,
+                        help='write per-stage timings, row counts and peak memory to this JSON file')
+    parser.add_argument('--profile', default=None,
+                        help='write a cProfile dump (or a pyinstrument report for .html) to this file')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = PipelineMetrics('visualize_data')
+    with profiled(args.profile):
+        create_visualizations(args.input, fmt=args.format, plots_dir=args.plots_dir, aggregate=args.aggregate,
+                              chunksize=args.chunksize, batch=args.batch, dpi=args.dpi,
+                              image_format=args.image_format, workers=args.workers, force=args.force,
+                              metrics=metrics, summary=args.summary, sample=args.sample, seed=args.seed)
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+
 if __name__ == "__main__":
-    create_visualizations()
\ No newline at end of file
+    main()
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from scripts.anomalies import grouped_median
+
+BUCKET_MINUTES = 15
+ZONE_WINDOW_MINUTES = 60
+WINDOW_INPUT_COLUMNS = ['PULocationID']
+WINDOW_COLUMNS = ['bucket_trips', 'bucket_median_speed', 'zone_pickups_last_hour']
+# Zones sit above the second offsets in the combined sort key, 2**40 s is far longer than any history
+_ZONE_SHIFT = 40
+
+def _seconds(df):
+    return df['pickup_datetime'].to_numpy().astype('datetime64[s]').astype('int64')
+
+def _speed(df):
+    if 'trip_speed_mph' in df.columns:
+        return df['trip_speed_mph'].to_numpy(dtype='float64', na_value=np.nan)
+    return (df['trip_distance'].to_numpy(dtype='float64', na_value=np.nan)
+            / (df['trip_duration'].to_numpy(dtype='float64', na_value=np.nan) / 3600))
+
+def _zones(df):
+    # Missing zones count as one zone of their own
+    return df['PULocationID'].to_numpy(dtype='float64', na_value=-1).astype('int64') + 1
+
+class WindowAggregator:
+    """Time-window features over a stream of chunks sorted by pickup bucket.
+
+    Adds to every trip the number of trips and the median speed of its
+    bucket_minutes pickup bucket, and the number of earlier pickups in the same
+    zone within window_minutes. Trips of the last, still open bucket are held
+    back until a later chunk or finish() closes it, and the pickups of the last
+    window are carried to the next chunk, so features match those of the whole
+    history in memory while only one chunk, one bucket and one window are held.
+    Trips may arrive in any order within the open bucket, but a trip for a
+    bucket that has already been closed raises ValueError.
+    """
+
+    def __init__(self, bucket_minutes=BUCKET_MINUTES, window_minutes=ZONE_WINDOW_MINUTES):
+        self.bucket = bucket_minutes * 60
+        self.window = window_minutes * 60
+        self._pending = None
+        self._history_seconds = np.empty(0, dtype='int64')
+        self._history_zones = np.empty(0, dtype='int64')
+        self._closed_until = None
+        self._series = []
+
+    def update(self, df):
+        """Add df's trips and return those whose buckets are complete, with the window features."""
+        if not len(df):
+            return df.iloc[:0]
+        earliest = _seconds(df).min()
+        if self._closed_until is not None and earliest < self._closed_until:
+            raise ValueError(f"Chunks must be sorted by pickup_datetime: a trip at "
+                             f"{pd.Timestamp(earliest, unit='s')} arrived after its bucket was closed")
+        rows = df if self._pending is None else pd.concat([self._pending, df])
+        seconds = _seconds(rows)
+        order = np.argsort(seconds, kind='stable')
+        rows, seconds = rows.take(order), seconds[order]
+        buckets = seconds // self.bucket
+        closed = buckets < buckets[-1]
+        self._pending = rows[~closed]
+        self._closed_until = int(buckets[-1]) * self.bucket
+        return self._emit(rows[closed])
+
+    def finish(self):
+        """Return the held back trips of the last bucket once the stream has ended."""
+        rows, self._pending = self._pending, None
+        return self._emit(rows) if rows is not None else pd.DataFrame(columns=WINDOW_COLUMNS)
+
+    def _emit(self, rows):
+        if not len(rows):
+            return rows
+        rows['zone_pickups_last_hour'] = self._zone_counts(_seconds(rows), _zones(rows))
+        return self._bucket_features(rows)
+
+    def _zone_counts(self, seconds, zones):
+        all_seconds = np.concatenate([self._history_seconds, seconds])
+        all_zones = np.concatenate([self._history_zones, zones])
+        keys = (all_zones << _ZONE_SHIFT) | (all_seconds - all_seconds.min())
+        order = np.argsort(keys, kind='stable')
+        positions = np.empty(len(keys), dtype='int64')
+        positions[order] = np.arange(len(keys))
+        # Earlier pickups of a zone within the window sit just before a trip in key order
+        counts = positions - np.searchsorted(keys[order], keys - self.window, side='right')
+
+        # Trips still to come start at the first open bucket, older pickups are out of their window
+        recent = all_seconds > self._closed_until - self.window
+        self._history_seconds, self._history_zones = all_seconds[recent], all_zones[recent]
+        return counts[len(counts) - len(seconds):].astype('int32')
+
+    def _bucket_features(self, rows):
+        if not len(rows):
+            return rows
+        buckets = _seconds(rows) // self.bucket
+        codes = buckets - buckets[0]
+        n_buckets = int(codes[-1]) + 1
+        trips = np.bincount(codes, minlength=n_buckets)
+        speed = _speed(rows)
+        finite = np.isfinite(speed)
+        median = grouped_median(speed[finite], codes[finite], n_buckets)
+        rows['bucket_trips'] = trips[codes].astype('int32')
+        rows['bucket_median_speed'] = median[codes].astype('float32')
+
+        present = np.flatnonzero(trips)
+        self._series.append(pd.DataFrame({
+            'bucket_start': pd.to_datetime((buckets[0] + present) * self.bucket, unit='s'),
+            'trips': trips[present],
+            'median_speed': median[present],
+        }))
+        return rows
+
+    def bucket_series(self):
+        """One row per non-empty bucket emitted so far: its start, trip count and median speed."""
+        if not self._series:
+            return pd.DataFrame({'bucket_start': pd.Series(dtype='datetime64[s]'), 'trips': pd.Series(dtype='int64'),
+                                 'median_speed': pd.Series(dtype='float64')})
+        return pd.concat(self._series, ignore_index=True)
+
+def add_window_features(chunks, bucket_minutes=BUCKET_MINUTES, window_minutes=ZONE_WINDOW_MINUTES):
+    """Yield time-sorted chunks with the WindowAggregator features, in one streaming pass."""
+    aggregator = WindowAggregator(bucket_minutes, window_minutes)
+    for chunk in chunks:
+        chunk = aggregator.update(chunk)
+        if len(chunk):
+            yield chunk
+    chunk = aggregator.finish()
+    if len(chunk):
+        yield chunk
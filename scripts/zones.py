@@ -0,0 +1,172 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from scripts.storage import FORMATS, iter_table, read_table
+
+# The TLC taxi zone lookup, from https://d37ci6vzurychx.cloudfront.net/misc/taxi_zone_lookup.csv
+DEFAULT_ZONE_LOOKUP_FILE = 'data/taxi_zone_lookup.csv'
+ZONE_INPUT_COLUMNS = ['PULocationID', 'DOLocationID']
+# Lookup column -> suffix of the enriched columns it fills
+ZONE_ATTRIBUTES = {'Borough': 'borough', 'Zone': 'zone', 'service_zone': 'service_zone'}
+ZONE_PREFIXES = {'PULocationID': 'pickup', 'DOLocationID': 'dropoff'}
+ZONE_COLUMNS = [f'{prefix}_{suffix}' for prefix in ZONE_PREFIXES.values() for suffix in ZONE_ATTRIBUTES.values()]
+# Location IDs run from 1 to 265; every other ID shares the last slot
+MAX_LOCATION_ID = 265
+LOCATION_SLOTS = MAX_LOCATION_ID + 2
+# Per pickup zone sums kept by compute_zone_aggregates
+ZONE_MEASURES = ['trip_distance', 'trip_duration', 'total_amount']
+ZONE_AGGREGATED_COLUMNS = ZONE_INPUT_COLUMNS + ZONE_MEASURES
+
+def build_zone_lookup(zones):
+    """Turn the TLC zone table into dense code arrays indexed by location ID.
+
+    Returns attribute -> (codes, categories), where codes[location_id] is the
+    category code of that location, or -1 for IDs the table does not name.
+    """
+    ids = zones['LocationID'].to_numpy(dtype='int64')
+    if (ids < 0).any() or (ids > MAX_LOCATION_ID).any():
+        raise ValueError(f"Location IDs must lie between 0 and {MAX_LOCATION_ID}")
+    lookup = {}
+    for column in ZONE_ATTRIBUTES:
+        values = pd.Categorical(zones[column])
+        codes = np.full(LOCATION_SLOTS, -1, dtype='int16')
+        codes[ids] = values.codes
+        lookup[column] = (codes, values.categories)
+    return lookup
+
+def load_zone_lookup(path=DEFAULT_ZONE_LOOKUP_FILE):
+    return build_zone_lookup(pd.read_csv(path, dtype={'Borough': 'str', 'Zone': 'str', 'service_zone': 'str'}))
+
+def location_slots(series):
+    """Location IDs as array positions, with missing and out of range IDs in the last slot."""
+    if series.hasnans:
+        ids = series.to_numpy(dtype='float64', na_value=-1)
+    else:
+        ids = series.to_numpy()
+    valid = (ids >= 0) & (ids <= MAX_LOCATION_ID)
+    return np.where(valid, ids, LOCATION_SLOTS - 1).astype(np.intp)
+
+def add_zone_columns(df, lookup):
+    """Add the borough, zone and service zone of pickup and dropoff to df as categoricals.
+
+    Each column is one array gather of the lookup codes by location ID, so the
+    frame is never merged or copied.
+    """
+    for id_column, prefix in ZONE_PREFIXES.items():
+        if id_column not in df.columns:
+            continue
+        slots = location_slots(df[id_column])
+        for attribute, suffix in ZONE_ATTRIBUTES.items():
+            codes, categories = lookup[attribute]
+            df[f'{prefix}_{suffix}'] = pd.Categorical.from_codes(codes[slots], categories)
+    return df
+
+def compute_zone_aggregates(df):
+    """Reduce a frame to trip counts per pickup zone, dropoff zone and origin-destination pair.
+
+    Pickup zones also get the sums of ZONE_MEASURES and OD pairs the sum of
+    trip durations, all from np.bincount over location IDs. The result has a
+    fixed size and aggregates of disjoint rows add up.
+    """
+    pickup = location_slots(df['PULocationID'])
+    dropoff = location_slots(df['DOLocationID'])
+    pairs = pickup * LOCATION_SLOTS + dropoff
+    duration = df['trip_duration'].to_numpy(dtype='float64', na_value=0)
+    aggregates = {
+        'pickups': np.bincount(pickup, minlength=LOCATION_SLOTS),
+        'dropoffs': np.bincount(dropoff, minlength=LOCATION_SLOTS),
+        'od_trips': np.bincount(pairs, minlength=LOCATION_SLOTS ** 2).reshape(LOCATION_SLOTS, LOCATION_SLOTS),
+        'od_duration_sum': np.bincount(pairs, duration, minlength=LOCATION_SLOTS ** 2).reshape(LOCATION_SLOTS,
+                                                                                             LOCATION_SLOTS),
+    }
+    for measure in ZONE_MEASURES:
+        values = df[measure].to_numpy(dtype='float64', na_value=0)
+        aggregates[f'{measure}_sum'] = np.bincount(pickup, values, minlength=LOCATION_SLOTS)
+    return aggregates
+
+def merge_zone_aggregates(left, right):
+    """Combine the zone aggregates of two disjoint sets of rows."""
+    return {key: left[key] + right[key] for key in left}
+
+def zone_aggregate_file(file_path, chunksize=None, fmt=None):
+    """Compute zone aggregates for an enriched file, streaming it when chunksize is set."""
+    if not chunksize:
+        return compute_zone_aggregates(read_table(file_path, columns=ZONE_AGGREGATED_COLUMNS, fmt=fmt))
+    totals = None
+    for chunk in iter_table(file_path, chunksize, columns=ZONE_AGGREGATED_COLUMNS, fmt=fmt):
+        aggregates = compute_zone_aggregates(chunk)
+        totals = aggregates if totals is None else merge_zone_aggregates(totals, aggregates)
+    return totals
+
+def _names(lookup, slots):
+    return {suffix: pd.Categorical.from_codes(lookup[attribute][0][slots], lookup[attribute][1])
+            for attribute, suffix in ZONE_ATTRIBUTES.items()}
+
+def zone_table(aggregates, lookup):
+    """Per location pickups, dropoffs and mean pickup measures, with zone names."""
+    slots = np.arange(LOCATION_SLOTS)
+    pickups = aggregates['pickups']
+    table = pd.DataFrame({'LocationID': slots, **_names(lookup, slots), 'pickups': pickups,
+                          'dropoffs': aggregates['dropoffs']})
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for measure in ZONE_MEASURES:
+            table[f'mean_{measure}'] = aggregates[f'{measure}_sum'] / pickups
+    return table[(table['pickups'] > 0) | (table['dropoffs'] > 0)].reset_index(drop=True)
+
+def borough_table(aggregates, lookup):
+    """Pickups and dropoffs per borough, reduced from the per location counts."""
+    codes, categories = lookup['Borough']
+    known = codes >= 0
+    return pd.DataFrame({
+        'pickups': np.bincount(codes[known], aggregates['pickups'][known], minlength=len(categories)),
+        'dropoffs': np.bincount(codes[known], aggregates['dropoffs'][known], minlength=len(categories)),
+    }, index=pd.Index(categories, name='borough')).astype('int64')
+
+def top_od_pairs(aggregates, lookup, n=10):
+    """The n busiest origin-destination pairs with their mean trip duration."""
+    trips = aggregates['od_trips'].ravel()
+    n = min(n, np.count_nonzero(trips))
+    top = np.argpartition(trips, -n)[-n:] if n else np.empty(0, dtype=np.intp)
+    top = top[np.argsort(-trips[top], kind='stable')]
+    pickup, dropoff = np.divmod(top, LOCATION_SLOTS)
+    pickup_names, dropoff_names = _names(lookup, pickup), _names(lookup, dropoff)
+    return pd.DataFrame({
+        'PULocationID': pickup, 'pickup_zone': pickup_names['zone'],
+        'DOLocationID': dropoff, 'dropoff_zone': dropoff_names['zone'],
+        'trips': trips[top], 'mean_duration': aggregates['od_duration_sum'].ravel()[top] / trips[top],
+    })
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Trip counts per taxi zone and origin-destination pair.')
+    parser.add_argument('--input', default='data/nyc_taxi_enriched.csv', help='enriched trip file')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='enriched file format (default: from the file extension)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the file in chunks of this many rows instead of loading it whole')
+    parser.add_argument('--zone-lookup', default=DEFAULT_ZONE_LOOKUP_FILE, help='TLC taxi zone lookup CSV')
+    parser.add_argument('--top', type=int, default=10, help='number of zones and OD pairs to list')
+    parser.add_argument('--output', default=None, help='write the per zone table to this CSV file')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    for path in [args.input, args.zone_lookup]:
+        if not os.path.exists(path):
+            print(f"File {path} not found.")
+            return
+    lookup = load_zone_lookup(args.zone_lookup)
+    aggregates = zone_aggregate_file(args.input, chunksize=args.chunksize, fmt=args.format)
+    zones = zone_table(aggregates, lookup)
+    if args.output:
+        zones.to_csv(args.output, index=False)
+        print(f"Zone table saved to {args.output}")
+    print(borough_table(aggregates, lookup).to_string())
+    print(zones.nlargest(args.top, 'pickups')[['LocationID', 'borough', 'zone', 'pickups', 'dropoffs']]
+          .to_string(index=False))
+    print(top_od_pairs(aggregates, lookup, args.top).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
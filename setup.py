@@ -45,6 +45,12 @@ setup(
         "Pillow>=10.0.0",
     ],
     extras_require={
+        "parquet": [
+            "pyarrow>=12.0.0",
+        ],
+        "compression": [
+            "zstandard>=0.21.0",
+        ],
         "dev": [
             "jupyter>=1.0.0",
             "ipykernel>=6.0.0",
@@ -59,7 +65,7 @@ setup(
     },
     entry_points={
         "console_scripts": [
-            "ny-yellowcab-advanced=scripts.clean_curate:main",
+            "ny-yellowcab-advanced=scripts.pipeline:main",
         ],
     },
     include_package_data=True,
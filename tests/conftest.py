@@ -0,0 +1,17 @@
+import pytest
+from scripts.clean_curate import curate_frame
+from scripts.synthetic import generate_trips
+
+@pytest.fixture
+def enriched_trips():
+    """Build seeded synthetic trips, cleaned and enriched and indexed from 0.
+
+    Call it with the number of rows, the seed, the days the pickups span and
+    sort=True for trips in pickup order.
+    """
+    def build(rows=20_000, seed=0, days=31, sort=False):
+        df = curate_frame(generate_trips(rows, seed=seed, days=days))
+        if sort:
+            df = df.sort_values('pickup_datetime', kind='stable')
+        return df.reset_index(drop=True)
+    return build
@@ -0,0 +1,49 @@
+import numpy as np
+from scripts.aggregates import (AGGREGATED_COLUMNS, CORRELATION_FEATURES, aggregate_file, box_stats,
+                                compute_plot_aggregates, correlation_matrix, empty_plot_aggregates, mean,
+                                merge_plot_aggregates)
+from scripts.storage import write_table
+
+def test_aggregates_match_exact_statistics(enriched_trips):
+    df = enriched_trips(2000)
+    aggregates = compute_plot_aggregates(df)
+
+    assert aggregates['speed_hist'].sum() == len(df)
+    assert np.isclose(mean(aggregates, 'speed'), df['trip_speed_mph'].mean())
+    assert aggregates['trip_type_counts'].tolist() == df['trip_type'].value_counts(sort=False).tolist()
+    np.testing.assert_allclose(correlation_matrix(aggregates), df[CORRELATION_FEATURES].corr().to_numpy(), atol=1e-9)
+
+    medians = [stats['med'] for stats in box_stats(aggregates)]
+    exact = df.groupby('trip_type', observed=True)['tip_percentage'].median().tolist()
+    np.testing.assert_allclose(medians, exact, atol=0.1)
+
+def test_box_whiskers_stay_within_the_data(enriched_trips):
+    df = enriched_trips(2000)
+    df['tip_percentage'] = np.random.default_rng(1).uniform(10, 20, len(df))
+    for stats in box_stats(compute_plot_aggregates(df)):
+        assert 9.9 <= stats['whislo'] <= stats['q1']
+        assert stats['q3'] <= stats['whishi'] <= 20.1
+
+def test_merged_chunks_equal_whole_frame(enriched_trips):
+    df = enriched_trips(2000)
+    whole = compute_plot_aggregates(df)
+    merged = merge_plot_aggregates(compute_plot_aggregates(df.iloc[:700]), compute_plot_aggregates(df.iloc[700:]))
+    for key in whole:
+        np.testing.assert_allclose(merged[key], whole[key])
+
+def test_correlation_stays_accurate_for_offset_values(enriched_trips):
+    df = enriched_trips(2000)
+    df['trip_duration'] += 1e10
+    merged = merge_plot_aggregates(compute_plot_aggregates(df.iloc[:700]), compute_plot_aggregates(df.iloc[700:]))
+    np.testing.assert_allclose(correlation_matrix(merged), df[CORRELATION_FEATURES].corr().to_numpy(), atol=1e-8)
+
+def test_empty_input_gives_empty_aggregates(tmp_path, enriched_trips):
+    write_table(enriched_trips(100)[AGGREGATED_COLUMNS].iloc[:0], tmp_path / 'empty.csv')
+    for chunksize in (None, 50):
+        aggregates = aggregate_file(tmp_path / 'empty.csv', chunksize=chunksize)
+        assert aggregates['rows'] == 0 and aggregates['speed_hist'].sum() == 0
+        assert np.isnan(mean(aggregates, 'speed')) and np.isnan(correlation_matrix(aggregates)).all()
+    df = enriched_trips(500)
+    merged = merge_plot_aggregates(empty_plot_aggregates(), compute_plot_aggregates(df))
+    for key, value in compute_plot_aggregates(df).items():
+        np.testing.assert_allclose(merged[key], value)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from scripts.anomalies import (MIN_GROUP_ROWS, detect_anomalies, detect_file_anomalies, grouped_median,
+                               robust_stats)
+from scripts.storage import read_table, write_table
+from scripts.validate_curated import main as validate_main
+
+def test_grouped_statistics_match_pandas():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(size=5000)
+    groups = rng.integers(0, 10, size=5000)
+    expected = pd.Series(values).groupby(groups)
+    median, mad, counts = robust_stats(values, groups, n_groups=12)
+
+    np.testing.assert_allclose(median[:10], expected.median())
+    np.testing.assert_allclose(mad[:10], expected.apply(lambda v: np.median(np.abs(v - v.median()))))
+    assert counts.tolist() == np.bincount(groups, minlength=12).tolist()
+    assert np.isnan(grouped_median(values, groups, n_groups=12)[10:]).all()
+
+def test_planted_outliers_are_flagged_without_touching_the_frame(enriched_trips):
+    df = enriched_trips()
+    df.loc[[10, 20], 'trip_distance'] = df.loc[[10, 20], 'trip_distance'] * 40
+    df.loc[30, 'fare_amount'] = df.loc[30, 'fare_amount'] * 50
+    before = df.copy()
+    anomalies = detect_anomalies(df)
+
+    pd.testing.assert_frame_equal(df, before)
+    flagged = set(zip(anomalies['row_id'], anomalies['metric']))
+    assert {(10, 'speed_mph'), (20, 'speed_mph'), (30, 'fare_per_mile')} <= flagged
+    assert (anomalies['robust_z'].abs() > 3.5).all()
+    # Typical trips stay put: well under 5% of rows are flagged
+    assert anomalies['row_id'].nunique() < 0.05 * len(df)
+
+def test_small_groups_are_not_scored(enriched_trips):
+    df = enriched_trips(2000)
+    df = df[df['pickup_hour'] == 3].head(MIN_GROUP_ROWS - 1).copy()
+    df.loc[df.index[0], 'trip_distance'] = 500.0
+    assert detect_anomalies(df).empty
+
+def test_streamed_detection_agrees_with_in_memory(tmp_path, enriched_trips):
+    df = enriched_trips()
+    write_table(df, tmp_path / 'enriched.csv')
+    exact = detect_anomalies(df)
+    streamed = detect_file_anomalies(tmp_path / 'enriched.csv', chunksize=3000)
+
+    exact_ids = set(zip(exact['row_id'], exact['metric']))
+    streamed_ids = set(zip(streamed['row_id'], streamed['metric']))
+    assert len(exact_ids & streamed_ids) >= 0.9 * len(exact_ids | streamed_ids)
+
+def test_validate_writes_quarantine_file(tmp_path, capsys, enriched_trips):
+    df = enriched_trips(5000)
+    df.loc[42, 'trip_distance'] = df.loc[42, 'trip_distance'] * 40
+    write_table(df, tmp_path / 'enriched.csv')
+
+    validate_main(['--input', str(tmp_path / 'enriched.csv'), '--anomalies', str(tmp_path / 'quarantine.csv')])
+
+    quarantine = read_table(tmp_path / 'quarantine.csv', dtypes={})
+    assert 42 in quarantine['row_id'].tolist()
+    assert 'Quarantined' in capsys.readouterr().out
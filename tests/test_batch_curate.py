@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+import pytest
+from scripts.batch_curate import curate_incremental, curate_many, expand_inputs, parse_args
+
+def write_month(path, start, rows=20):
+    pickups = pd.date_range(start, periods=rows, freq='19h')
+    pd.DataFrame({
+        'pickup_datetime': pickups.strftime('%Y-%m-%d %H:%M:%S'),
+        'dropoff_datetime': (pickups + pd.Timedelta(minutes=12)).strftime('%Y-%m-%d %H:%M:%S'),
+        'trip_distance': [2.5] * rows,
+        'tip_amount': [1.0] * rows,
+        'total_amount': [15.0] * rows,
+    }).to_csv(path, index=False)
+
+def test_curate_many_writes_year_month_partitions_in_input_order(tmp_path):
+    write_month(tmp_path / 'trips_2024-02.csv', '2024-02-20')
+    write_month(tmp_path / 'trips_2024-01.csv', '2024-01-01')
+    inputs = expand_inputs([str(tmp_path / 'trips_*.csv')])
+    out = tmp_path / 'enriched'
+
+    results = curate_many(inputs, str(out), workers=2, fmt='csv')
+
+    assert [os.path.basename(r[0]) for r in results] == ['trips_2024-01.csv', 'trips_2024-02.csv']
+    feb_outputs = [os.path.relpath(path, out) for path, _ in results[1][1]]
+    assert feb_outputs == [os.path.join('year=2024', 'month=02', 'trips_2024-02.csv'),
+                           os.path.join('year=2024', 'month=03', 'trips_2024-02.csv')]
+    assert sum(rows for _, outputs in results for _, rows in outputs) == 40
+
+def test_expand_inputs_rejects_duplicate_names(tmp_path):
+    for sub in ('a', 'b'):
+        os.makedirs(tmp_path / sub)
+        write_month(tmp_path / sub / 'trips.csv', '2024-01-01')
+    with pytest.raises(ValueError):
+        expand_inputs([str(tmp_path / '*' / 'trips.csv')])
+
+def test_curate_incremental_skips_unchanged_inputs(tmp_path):
+    jan = tmp_path / 'trips_2024-01.csv'
+    feb = tmp_path / 'trips_2024-02.csv'
+    write_month(jan, '2024-01-01')
+    write_month(feb, '2024-02-01')
+    out = str(tmp_path / 'enriched')
+
+    results, skipped = curate_incremental([str(jan), str(feb)], out, workers=1, fmt='csv')
+    assert len(results) == 2 and skipped == []
+
+    results, skipped = curate_incremental([str(jan), str(feb)], out, workers=1, fmt='csv')
+    assert results == [] and skipped == [str(jan), str(feb)]
+
+    write_month(feb, '2024-02-01', rows=5)
+    results, skipped = curate_incremental([str(jan), str(feb)], out, workers=1, fmt='csv')
+    assert [r[0] for r in results] == [str(feb)] and skipped == [str(jan)]
+    assert sum(rows for _, rows in results[0][1]) == 5
+
+def test_curate_many_with_prefetch_matches_sequential_run(tmp_path):
+    inputs = []
+    for month in ('2024-01', '2024-02', '2024-03'):
+        write_month(tmp_path / f'trips_{month}.csv', f'{month}-01')
+        inputs.append(str(tmp_path / f'trips_{month}.csv'))
+
+    pooled = curate_many(inputs, str(tmp_path / 'pooled'), workers=1, fmt='csv')
+    prefetched = curate_many(inputs, str(tmp_path / 'prefetched'), workers=2, fmt='csv', chunksize=7, prefetch=2)
+    assert [(r[0], [rows for _, rows in r[1]]) for r in pooled] == \
+        [(r[0], [rows for _, rows in r[1]]) for r in prefetched]
+    for (_, pooled_outputs), (_, prefetched_outputs) in zip(pooled, prefetched):
+        for (pooled_path, _), (prefetched_path, _) in zip(pooled_outputs, prefetched_outputs):
+            with open(pooled_path, 'rb') as a, open(prefetched_path, 'rb') as b:
+                assert a.read() == b.read()
+
+def test_sequential_prefetch_reads_across_inputs(tmp_path):
+    inputs = []
+    for month in ('2024-01', '2024-02', '2024-03'):
+        write_month(tmp_path / f'trips_{month}.csv', f'{month}-01', rows=15)
+        inputs.append(str(tmp_path / f'trips_{month}.csv'))
+
+    plain = curate_many(inputs, str(tmp_path / 'plain'), workers=1, fmt='csv', chunksize=4)
+    prefetched = curate_many(inputs, str(tmp_path / 'prefetched'), workers=1, fmt='csv', chunksize=4, prefetch=3)
+    assert [r[0] for r in prefetched] == inputs
+    assert [[rows for _, rows in r[1]] for r in prefetched] == [[rows for _, rows in r[1]] for r in plain]
+
+def test_prefetch_requires_chunksize():
+    with pytest.raises(SystemExit):
+        parse_args(['trips.csv', '--prefetch', '2'])
+    assert parse_args(['trips.csv', '--prefetch', '2', '--chunksize', '1000']).prefetch == 2
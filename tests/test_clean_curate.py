@@ -0,0 +1,61 @@
+import pandas as pd
+from scripts.clean_curate import clean_data, curate_file, main, read_raw
+
+def write_raw(path, rows=50):
+    pickups = pd.date_range('2024-01-01 06:00:00', periods=rows, freq='17min')
+    df = pd.DataFrame({
+        'pickup_datetime': pickups.strftime('%Y-%m-%d %H:%M:%S'),
+        'dropoff_datetime': (pickups + pd.to_timedelta([(i % 7 - 1) * 600 for i in range(rows)], unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'trip_distance': [(i % 5) * 1.3 for i in range(rows)],
+        'fare_amount': [10.5 + i for i in range(rows)],
+        'tip_amount': [i % 4 * 1.25 for i in range(rows)],
+        'total_amount': [(i % 9 - 1) * 6.5 for i in range(rows)],
+    })
+    df.to_csv(path, index=False)
+
+def test_curate_file_streaming_matches_in_memory(tmp_path):
+    raw = tmp_path / 'raw.csv'
+    write_raw(raw)
+    full_out = tmp_path / 'full.csv'
+    chunked_out = tmp_path / 'chunked.csv'
+
+    full_rows = curate_file(raw, full_out)
+    chunked_rows = curate_file(raw, chunked_out, chunksize=7)
+
+    assert full_rows == chunked_rows > 0
+    assert full_out.read_bytes() == chunked_out.read_bytes()
+
+def test_rerun_rewrites_an_output_another_input_replaced(tmp_path, capsys):
+    write_raw(tmp_path / 'a.csv', rows=50)
+    write_raw(tmp_path / 'b.csv', rows=30)
+    output = tmp_path / 'out' / 'out.csv'
+    output.parent.mkdir()
+    main(['--input', str(tmp_path / 'a.csv'), '--output', str(output)])
+    first = output.read_bytes()
+    main(['--input', str(tmp_path / 'b.csv'), '--output', str(output)])
+    assert output.read_bytes() != first
+    capsys.readouterr()
+    main(['--input', str(tmp_path / 'a.csv'), '--output', str(output)])
+    assert 'up to date' not in capsys.readouterr().out
+    assert output.read_bytes() == first
+    main(['--input', str(tmp_path / 'a.csv'), '--output', str(output)])
+    assert 'up to date' in capsys.readouterr().out
+
+def test_read_raw_applies_compact_schema(tmp_path):
+    raw = tmp_path / 'raw.csv'
+    write_raw(raw)
+    df = read_raw(raw)[0]
+    assert df['pickup_datetime'].dtype.kind == 'M'
+    assert df['trip_distance'].dtype == 'float32'
+    assert df['total_amount'].dtype == 'float32'
+
+def test_clean_data_parses_timestamps_when_trip_duration_exists():
+    df = pd.DataFrame({
+        'pickup_datetime': ['2024-01-01 08:10:00', '2024-01-01 19:45:30'],
+        'dropoff_datetime': ['2024-01-01 08:25:00', '2024-01-01 20:05:30'],
+        'trip_distance': [3.1, 4.2],
+        'total_amount': [18.5, 22.0],
+        'trip_duration': [900.0, 1200.0],
+    })
+    cleaned = clean_data(df)
+    assert cleaned['pickup_hour'].tolist() == [8, 19]
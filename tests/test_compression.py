@@ -0,0 +1,74 @@
+import bz2
+import gzip
+
+import pandas as pd
+import pytest
+from scripts.clean_curate import curate_file
+from scripts.compression import CompressedWriter, infer_compression, iter_decompressed, strip_compression
+from scripts.storage import infer_format, iter_table, read_table
+from scripts.synthetic import write_trips
+
+def payload(size=300_000):
+    return b''.join(b'%d,trip,%d\n' % (i, i * 7) for i in range(size))
+
+def test_extensions():
+    assert infer_compression('data/trips.csv.gz') == 'gzip'
+    assert infer_compression('data/trips.csv.zst') == 'zstd'
+    assert infer_compression('data/trips.csv') is None
+    assert strip_compression('data/trips.csv.bz2') == 'data/trips.csv'
+    assert infer_format('data/trips.csv.gz') == 'csv'
+    with pytest.raises(ValueError):
+        infer_format('data/trips.parquet.gz')
+
+@pytest.mark.parametrize('name', ['data.gz', 'data.zst', 'data.bz2'])
+def test_written_pieces_decompress_in_parallel(tmp_path, name, monkeypatch):
+    if name.endswith('.zst'):
+        pytest.importorskip('zstandard')
+    monkeypatch.setattr('scripts.compression.TASK_BYTES', 1 << 16)
+    data = payload()
+    path = tmp_path / name
+    with CompressedWriter(path, threads=3) as writer:
+        writer.write(data[:1000])
+        writer.write(data[1000:])
+    assert b''.join(iter_decompressed(path, threads=3)) == data
+
+def test_standard_tools_read_written_files(tmp_path):
+    data = payload(50_000)
+    for name, opener in (('data.gz', gzip.open), ('data.bz2', bz2.open)):
+        with CompressedWriter(tmp_path / name) as writer:
+            writer.write(data)
+        with opener(tmp_path / name) as f:
+            assert f.read() == data
+
+def test_reads_files_from_standard_tools(tmp_path):
+    data = payload(50_000)
+    (tmp_path / 'plain.gz').write_bytes(gzip.compress(data))
+    (tmp_path / 'plain.bz2').write_bytes(bz2.compress(data))
+    assert b''.join(iter_decompressed(tmp_path / 'plain.gz')) == data
+    assert b''.join(iter_decompressed(tmp_path / 'plain.bz2')) == data
+    zstandard = pytest.importorskip('zstandard')
+    (tmp_path / 'plain.zst').write_bytes(zstandard.ZstdCompressor(write_content_size=False).compress(data))
+    assert b''.join(iter_decompressed(tmp_path / 'plain.zst')) == data
+
+def test_single_zstd_frame_streams_in_bounded_blocks(tmp_path, monkeypatch):
+    zstandard = pytest.importorskip('zstandard')
+    monkeypatch.setattr('scripts.compression.TASK_BYTES', 1 << 16)
+    data = payload()
+    # One frame holding the whole file, as the zstd command line tool writes
+    (tmp_path / 'single.zst').write_bytes(zstandard.ZstdCompressor().compress(data))
+    blocks = list(iter_decompressed(tmp_path / 'single.zst', threads=3))
+    assert len(blocks) > 1
+    assert max(len(block) for block in blocks) <= 1 << 16
+    assert b''.join(blocks) == data
+
+def test_curate_compressed_input_and_output(tmp_path):
+    raw = tmp_path / 'raw.csv'
+    write_trips(raw, 2000, seed=4)
+    with open(raw, 'rb') as f, gzip.open(tmp_path / 'raw.csv.gz', 'wb') as out:
+        out.write(f.read())
+
+    curate_file(raw, tmp_path / 'plain.csv')
+    curate_file(tmp_path / 'raw.csv.gz', tmp_path / 'enriched.csv.gz', chunksize=300)
+    expected = read_table(tmp_path / 'plain.csv')
+    pd.testing.assert_frame_equal(read_table(tmp_path / 'enriched.csv.gz'), expected)
+    assert sum(len(c) for c in iter_table(tmp_path / 'enriched.csv.gz', 500)) == len(expected)
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from scripts.clean_curate import main as curate_main
+from scripts.cube import CubeStore, compute_cube, load_cube, make_handler, merge_cubes, query_cube, save_cube
+from scripts.storage import read_table
+from scripts.synthetic import write_trips
+
+def test_group_bys_match_pandas(enriched_trips):
+    df = enriched_trips()
+    cube = merge_cubes(compute_cube(df.iloc[:8000]), compute_cube(df.iloc[8000:]))
+
+    speed = query_cube(cube, 'trip_speed_mph', ['pickup_hour'])
+    expected = df.groupby('pickup_hour')['trip_speed_mph'].agg(['count', 'mean'])
+    np.testing.assert_array_equal(speed.loc[expected.index, 'count'], expected['count'])
+    np.testing.assert_allclose(speed.loc[expected.index, 'mean'], expected['mean'])
+
+    tips = query_cube(cube, 'tip_percentage', ['trip_type'])
+    expected = df.groupby('trip_type', observed=True)['tip_percentage'].agg(['mean', lambda v: v.std(ddof=0)])
+    np.testing.assert_allclose(tips.loc[expected.index, 'mean'], expected['mean'])
+    np.testing.assert_allclose(tips.loc[expected.index, 'std'], expected.iloc[:, 1])
+
+    peak = query_cube(cube, by=['is_peak_hour'])
+    assert peak['count'].tolist() == df['is_peak_hour'].value_counts().sort_index().tolist()
+
+def test_filters_and_group_order(enriched_trips):
+    df = enriched_trips()
+    cube = compute_cube(df)
+    weekend = df[df['pickup_datetime'].dt.dayofweek >= 5]
+    result = query_cube(cube, 'trip_distance', ['is_peak_hour', 'trip_type'],
+                        where={'pickup_weekday': [5, 6], 'trip_type': ['long', 'short']})
+    assert result.index.names == ['is_peak_hour', 'trip_type']
+    assert list(result.index.get_level_values('trip_type').unique()) == ['long', 'short']
+    expected = weekend.groupby(['is_peak_hour', 'trip_type'], observed=True)['trip_distance'].sum()
+    np.testing.assert_allclose(result.loc[(1, 'short'), 'sum'], expected.loc[(1, 'short')], rtol=1e-6)
+
+def test_store_caches_results_until_the_cube_changes(tmp_path, enriched_trips):
+    df = enriched_trips(5000)
+    path = tmp_path / 'cube.npz'
+    save_cube(compute_cube(df), path)
+    store = CubeStore(str(path), cache_size=2)
+
+    first = store.query('trip_speed_mph', ['pickup_hour'])
+    first['mean'] = 0
+    again = store.query('trip_speed_mph', ['pickup_hour'])
+    assert store.cache_info().hits == 1
+    assert (again['mean'] > 0).any()
+
+    save_cube(compute_cube(df.iloc[:100]), path)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+    assert store.query(by=['pickup_hour'])['count'].sum() == 100
+    assert store.query('trip_speed_mph', ['pickup_hour'])['count'].sum() <= 100
+
+def test_http_endpoint(tmp_path, enriched_trips):
+    save_cube(compute_cube(enriched_trips(5000)), tmp_path / 'cube.npz')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(CubeStore(str(tmp_path / 'cube.npz'))))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{server.server_port}/query?measure=tip_percentage&by=trip_type&is_peak_hour=1'
+        with urllib.request.urlopen(url) as response:
+            body = json.load(response)
+        assert body['columns'] == ['trip_type', 'count', 'sum', 'mean', 'std']
+        assert [row[0] for row in body['rows']] == ['short', 'medium', 'long']
+
+        bad = f'http://127.0.0.1:{server.server_port}/query?trip_type=huge'
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(bad)
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_clean_curate_writes_the_cube(tmp_path):
+    write_trips(tmp_path / 'raw.csv', 3000)
+    curate_main(['--input', str(tmp_path / 'raw.csv'), '--output', str(tmp_path / 'enriched.csv'),
+                 '--chunksize', '1000', '--cube', str(tmp_path / 'cube.npz')])
+    cube = load_cube(tmp_path / 'cube.npz')
+    assert cube['count'].shape == (24, 7, 3, 2)
+    assert 0 < cube['count'].sum() <= 3000
+
+def test_cube_adds_the_features_it_needs(tmp_path):
+    write_trips(tmp_path / 'raw.csv', 3000)
+    curate_main(['--input', str(tmp_path / 'raw.csv'), '--output', str(tmp_path / 'enriched.csv'),
+                 '--features', 'trip_speed_mph', '--cube', str(tmp_path / 'cube.npz')])
+    enriched = read_table(tmp_path / 'enriched.csv')
+    assert {'trip_speed_mph', 'trip_type', 'is_peak_hour', 'tip_percentage'} <= set(enriched.columns)
+    assert load_cube(tmp_path / 'cube.npz')['count'].sum() == len(enriched)
@@ -0,0 +1,47 @@
+import pandas as pd
+from scripts.clean_curate import clean_data, derive_features
+from scripts.feature_cache import FeatureCache, column_digest
+
+def cleaned_trips(rows=40):
+    pickups = pd.date_range('2024-01-01 06:00:00', periods=rows, freq='23min')
+    df = pd.DataFrame({
+        'pickup_datetime': pickups,
+        'dropoff_datetime': pickups + pd.to_timedelta([(i % 6 + 1) * 420 for i in range(rows)], unit='s'),
+        'trip_distance': [(i % 5 + 1) * 1.1 for i in range(rows)],
+        'tip_amount': [i % 4 * 1.25 for i in range(rows)],
+        'total_amount': [(i % 9 + 1) * 6.5 for i in range(rows)],
+    })
+    return clean_data(df)
+
+def test_cached_features_match_computed_ones(tmp_path):
+    expected = derive_features(cleaned_trips())
+    cache = FeatureCache(tmp_path / 'cache')
+
+    first = derive_features(cleaned_trips(), cache)
+    second = derive_features(cleaned_trips(), cache)
+
+    assert cache.misses == 4 and cache.hits == 4
+    pd.testing.assert_frame_equal(first, expected)
+    pd.testing.assert_frame_equal(second, expected)
+
+def test_changed_inputs_miss_the_cache(tmp_path):
+    cache = FeatureCache(tmp_path / 'cache')
+    df = cleaned_trips()
+    derive_features(df.copy(), cache)
+    df['tip_amount'] = df['tip_amount'] + 1
+    derive_features(df, cache)
+    # Only tip_percentage reads tip_amount
+    assert cache.hits == 3 and cache.misses == 5
+
+def test_column_digest_ignores_index():
+    series = pd.Series([1.0, 2.0, 3.0])
+    assert column_digest(series) == column_digest(series.set_axis([7, 8, 9]))
+    assert column_digest(series) != column_digest(series.astype('float32'))
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = FeatureCache(tmp_path / 'cache')
+    df = cleaned_trips()
+    derive_features(df.copy(), cache)
+    cache.max_bytes = cache.size_bytes() - 1
+    cache.evict()
+    assert 0 < cache.size_bytes() <= cache.max_bytes
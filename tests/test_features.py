@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+from scripts.clean_curate import curate_file, raw_columns
+from scripts.features import feature_inputs, register_feature, resolve_features
+from scripts.storage import read_table
+from scripts.synthetic import write_trips
+
+def test_resolve_features_orders_dependencies_first():
+    registry = {}
+    register_feature('speed', ['trip_distance', 'trip_duration'], registry=registry)(lambda df: None)
+    register_feature('speed_band', ['speed'], registry=registry)(lambda df: None)
+    register_feature('weekday', ['pickup_datetime'], registry=registry)(lambda df: None)
+
+    assert resolve_features(['speed_band'], registry) == ['speed', 'speed_band']
+    assert feature_inputs(['speed_band'], registry) == ['trip_distance', 'trip_duration']
+    with pytest.raises(ValueError):
+        resolve_features(['missing'], registry)
+
+def test_resolve_features_rejects_cycles():
+    registry = {}
+    register_feature('a', ['b'], registry=registry)(lambda df: None)
+    register_feature('b', ['a'], registry=registry)(lambda df: None)
+    with pytest.raises(ValueError, match='depend on each other'):
+        resolve_features(['a'], registry)
+
+def test_raw_columns_cover_clean_data_and_aliases():
+    columns = raw_columns(['fare_per_mile'])
+    assert 'fare_amount' in columns and 'tpep_pickup_datetime' in columns
+    assert 'tip_amount' not in columns and 'pickup_hour' not in columns
+
+def test_curate_file_derives_only_requested_features(tmp_path):
+    raw = tmp_path / 'raw.csv'
+    write_trips(raw, 500, seed=2)
+    full_out = tmp_path / 'full.csv'
+    pruned_out = tmp_path / 'pruned.csv'
+    curate_file(raw, full_out)
+    curate_file(raw, pruned_out, features=['trip_speed_mph', 'pickup_weekday'])
+
+    full = read_table(full_out)
+    pruned = read_table(pruned_out)
+    assert 'tip_amount' not in pruned.columns and 'trip_type' not in pruned.columns
+    pd.testing.assert_series_equal(pruned['trip_speed_mph'], full['trip_speed_mph'])
+    assert (pruned['pickup_weekday'] == full['pickup_datetime'].dt.dayofweek).all()
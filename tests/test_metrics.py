@@ -0,0 +1,36 @@
+import json
+
+import pandas as pd
+from scripts.clean_curate import clean_data
+from scripts.metrics import PipelineMetrics
+
+def test_stage_accumulates_calls_and_rows(tmp_path):
+    metrics = PipelineMetrics('test')
+    for rows in (3, 4):
+        with metrics.stage('clean', rows_in=rows) as record:
+            record['rows_out'] = rows - 1
+    metrics.count_filtered('bad_rows', 2)
+    metrics.count_filtered('bad_rows', 1)
+
+    path = tmp_path / 'metrics.json'
+    metrics.write_json(path)
+    report = json.loads(path.read_text())
+    assert report['stages']['clean']['calls'] == 2
+    assert report['stages']['clean']['rows_in'] == 7
+    assert report['stages']['clean']['rows_out'] == 5
+    assert report['filters'] == {'bad_rows': 3}
+    assert report['peak_rss_mb'] > 0
+
+def test_clean_data_reports_rows_dropped_per_filter():
+    df = pd.DataFrame({
+        'pickup_datetime': ['2024-01-01 08:00:00', None, '2024-01-01 09:00:00',
+                            '2024-01-01 10:00:00', '2024-01-01 11:00:00'],
+        'dropoff_datetime': ['2024-01-01 08:10:00', '2024-01-01 08:10:00', '2024-01-01 09:10:00',
+                             '2024-01-01 10:10:00', '2024-01-01 10:50:00'],
+        'trip_distance': [1.0, 1.0, 0.0, 2.0, 3.0],
+        'total_amount': [10.0, 10.0, 10.0, -5.0, 12.0],
+    })
+    metrics = PipelineMetrics('test')
+    assert len(clean_data(df, metrics)) == 1
+    assert metrics.filters == {'missing_values': 1, 'non_positive_distance': 1,
+                               'non_positive_total_amount': 1, 'non_positive_duration': 1}
@@ -0,0 +1,52 @@
+import json
+
+import pandas as pd
+import pytest
+from scripts.batch_curate import curate_incremental
+from scripts.partitions import PARTITION_INDEX_NAME, load_trips, select_partitions, update_partition_index
+from scripts.synthetic import write_trips
+
+@pytest.fixture
+def enriched_root(tmp_path, request):
+    fmt = getattr(request, 'param', 'csv')
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    inputs = []
+    for seed, month in enumerate(('2024-01', '2024-02', '2024-03')):
+        path = tmp_path / f'trips_{month}.csv'
+        write_trips(path, 300, seed=seed, start=f'{month}-01', days=28)
+        inputs.append(str(path))
+    root = str(tmp_path / 'enriched')
+    curate_incremental(inputs, root, workers=1, fmt=fmt)
+    return root
+
+def test_index_records_pickup_range_per_partition(enriched_root):
+    with open(f'{enriched_root}/{PARTITION_INDEX_NAME}') as f:
+        index = json.load(f)
+    everything = load_trips(enriched_root)
+    assert sum(entry['rows'] for entry in index.values()) == len(everything) > 0
+    january = [entry for name, entry in index.items() if 'month=01' in name]
+    assert pd.Timestamp(january[0]['min_pickup']) == everything['pickup_datetime'].min()
+
+    assert select_partitions(index, '2024-02-10', '2024-02-12') == [name for name in index if 'month=02' in name]
+
+@pytest.mark.parametrize('enriched_root', ['csv', 'parquet', 'npy'], indirect=True)
+def test_load_trips_matches_filtering_everything(enriched_root):
+    everything = load_trips(enriched_root)
+    expected = everything[(everything['pickup_datetime'] >= '2024-02-03')
+                          & (everything['pickup_datetime'] < '2024-02-20')
+                          & (everything['is_peak_hour'] == 1)]
+
+    loaded = load_trips(enriched_root, start='2024-02-03', end='2024-02-20', peak=True,
+                        columns=['pickup_datetime', 'trip_speed_mph'])
+    assert list(loaded.columns) == ['pickup_datetime', 'trip_speed_mph']
+    pd.testing.assert_frame_equal(loaded, expected[loaded.columns].reset_index(drop=True))
+
+    hours = load_trips(enriched_root, hours=[7, 19], columns=['pickup_hour'])
+    assert len(hours) == everything['pickup_hour'].isin([7, 19]).sum()
+
+def test_update_partition_index_drops_removed_partitions(enriched_root, tmp_path):
+    index = update_partition_index(enriched_root)
+    removed = next(iter(index))
+    (tmp_path / 'enriched' / removed).unlink()
+    assert removed not in update_partition_index(enriched_root)
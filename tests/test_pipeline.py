@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+from scripts.aggregates import aggregate_file
+from scripts.clean_curate import main as curate_main
+from scripts.cube import load_cube
+from scripts.pipeline import main, resolve_stages, run_pipeline
+from scripts.storage import read_table
+from scripts.synthetic import write_trips
+from scripts.validate_curated import validate_file
+
+def test_stages_pull_in_their_dependencies():
+    assert resolve_stages(['visualize']) == ['aggregate', 'visualize']
+    assert resolve_stages(['validate']) == ['validate']
+
+def test_pipeline_matches_the_separate_scripts(tmp_path, capsys):
+    write_trips(tmp_path / 'raw.csv', 12_000, seed=4)
+    assert main(['--input', str(tmp_path / 'raw.csv'), '--output', str(tmp_path / 'enriched.csv'),
+                 '--chunksize', '5000', '--plots-dir', str(tmp_path / 'plots'), '--workers', '1']) == 0
+
+    out = capsys.readouterr().out
+    assert 'Data validated successfully.' in out
+    assert sorted(p.name for p in (tmp_path / 'plots').glob('*.png')) == [
+        'correlation_matrix.png', 'nyc_taxi_features_overview.png', 'speed_by_peak_hour.png',
+        'speed_vs_distance.png', 'tip_by_trip_type.png']
+
+    # The aggregates handed over in memory are the ones the standalone stages compute from the file
+    enriched = read_table(tmp_path / 'enriched.csv')
+    results = run_pipeline([enriched], ['validate', 'aggregate'])
+    expected = aggregate_file(tmp_path / 'enriched.csv')
+    for key, value in expected.items():
+        np.testing.assert_allclose(results['aggregate'][key], value)
+    validated, rows = validate_file(tmp_path / 'enriched.csv')
+    assert results['rows'] == rows == len(enriched)
+    assert [r.violations for r in results['validate']] == [r.violations for r in validated]
+
+def test_validation_only_run_does_not_import_plotting(tmp_path):
+    write_trips(tmp_path / 'raw.csv', 2000)
+    code = ('import sys; from scripts.pipeline import main; '
+            f"main(['--input', {str(tmp_path / 'raw.csv')!r}, '--output', {str(tmp_path / 'out.csv')!r}, "
+            "'--stages', 'curate', 'validate']); "
+            "print('seaborn' in sys.modules, 'matplotlib' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == 'False False'
+
+def test_pipeline_shares_the_curation_manifest(tmp_path, capsys):
+    write_trips(tmp_path / 'raw.csv', 3000)
+    raw, enriched = str(tmp_path / 'raw.csv'), str(tmp_path / 'enriched.csv')
+    curate_main(['--input', raw, '--output', enriched, '--cube', str(tmp_path / 'cube.npz')])
+    written = os.path.getmtime(enriched)
+    capsys.readouterr()
+
+    assert main(['--input', raw, '--output', enriched, '--cube', str(tmp_path / 'cube.npz'),
+                 '--stages', 'curate', 'validate']) == 0
+    out = capsys.readouterr().out
+    assert 'unchanged since the last run' in out and 'Data validated successfully.' in out
+    assert os.path.getmtime(enriched) == written
+
+    # Other curate options make the pipeline curate again and pass through
+    assert main(['--input', raw, '--output', enriched, '--cube', str(tmp_path / 'cube.npz'),
+                 '--features', 'trip_speed_mph', '--stages', 'curate', 'validate']) == 0
+    assert 'Enriched data saved' in capsys.readouterr().out
+    df = read_table(enriched)
+    assert load_cube(tmp_path / 'cube.npz')['count'].sum() == len(df)
+    curate_main(['--input', raw, '--output', enriched, '--cube', str(tmp_path / 'cube.npz'),
+                 '--features', 'trip_speed_mph'])
+    assert 'is up to date' in capsys.readouterr().out
@@ -0,0 +1,41 @@
+import threading
+import time
+
+import pytest
+from scripts.prefetch import prefetched, read_ahead
+
+def test_read_ahead_keeps_order_and_bounds_the_buffer():
+    produced = []
+
+    def numbers():
+        for i in range(6):
+            produced.append(i)
+            yield i
+
+    consumed = []
+    for item in read_ahead(numbers(), depth=2):
+        time.sleep(0.01)
+        # The item being consumed plus at most two buffered ones
+        assert len(produced) <= item + 3
+        consumed.append(item)
+    assert consumed == list(range(6))
+
+def test_read_ahead_reraises_iterator_errors():
+    def failing():
+        yield 1
+        raise OSError('disk gone')
+
+    with pytest.raises(OSError, match='disk gone'):
+        list(read_ahead(failing()))
+
+def test_prefetched_loads_concurrently_in_input_order():
+    threads = set()
+
+    def load(item):
+        threads.add(threading.get_ident())
+        time.sleep(0.02 * (3 - item % 3))
+        return item * 10
+
+    results = list(prefetched(range(7), load, depth=3))
+    assert results == [(i, i * 10) for i in range(7)]
+    assert len(threads) > 1
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from scripts.sampling import N_STRATA, StratifiedReservoir, allocate, sample_file, stratum_codes
+from scripts.storage import write_table
+from scripts.validate_curated import main as validate_main
+from scripts.validate_curated import validate_file, validate_sample
+
+def test_allocation_is_exact_and_keeps_rare_strata():
+    counts = np.array([90_000, 9_000, 900, 90, 0, 10])
+    allocation = allocate(counts, 1000, minimum=50)
+    assert allocation.sum() == 1000
+    assert (allocation <= counts).all()
+    assert allocation[2] >= 50 and allocation[3] == 50 and allocation[5] == 10
+    assert allocate(counts, 10**6).tolist() == counts.tolist()
+
+def test_sample_has_the_requested_size_and_reweights_to_the_file(tmp_path, enriched_trips):
+    df = enriched_trips(30_000)
+    write_table(df, tmp_path / 'enriched.csv')
+    sample = sample_file(tmp_path / 'enriched.csv', 2000, chunksize=7000)
+
+    assert len(sample) == 2000
+    assert sample.index.is_monotonic_increasing
+    weighted = pd.Series(sample['sample_weight'].to_numpy()).groupby(stratum_codes(sample)).sum()
+    expected = pd.Series(np.bincount(stratum_codes(df), minlength=N_STRATA))
+    np.testing.assert_allclose(weighted, expected[weighted.index])
+    mean = np.average(sample['trip_speed_mph'], weights=sample['sample_weight'])
+    assert abs(mean - df['trip_speed_mph'].mean()) < 0.05 * df['trip_speed_mph'].mean()
+
+def test_sample_is_seeded_and_independent_of_chunking(enriched_trips):
+    df = enriched_trips(10_000)
+    def draw(chunk_rows, seed=0):
+        reservoir = StratifiedReservoir(500, seed=seed)
+        for start in range(0, len(df), chunk_rows):
+            reservoir.update(df.iloc[start:start + chunk_rows])
+        return reservoir.sample().index.tolist()
+    assert draw(1000) == draw(3333) == draw(len(df))
+    assert draw(1000, seed=1) != draw(1000)
+
+def test_sampled_validation_estimates_violations(tmp_path, capsys, enriched_trips):
+    df = enriched_trips(20_000)
+    df['tip_percentage'] = df['tip_percentage'].astype('float64')
+    df.loc[df.index[::10], 'tip_percentage'] = 150.0
+    write_table(df, tmp_path / 'enriched.csv')
+
+    exact, rows = validate_file(tmp_path / 'enriched.csv')
+    estimated, sampled_rows = validate_sample(tmp_path / 'enriched.csv', 3000, chunksize=6000)
+    assert sampled_rows == rows
+    exact_tips = next(r.violations for r in exact if r.name == 'invalid_tip_percentage')
+    estimated_tips = next(r.violations for r in estimated if r.name == 'invalid_tip_percentage')
+    assert abs(estimated_tips - exact_tips) < 0.15 * exact_tips
+
+    validate_main(['--input', str(tmp_path / 'enriched.csv'), '--sample', '3000'])
+    out = capsys.readouterr().out
+    assert 'stratified sample of 3000' in out
+    assert 'Invalid tip percentages' in out
@@ -0,0 +1,43 @@
+import numpy as np
+from scripts.sketches import KLLSketch, Moments
+
+def test_kll_quantiles_within_rank_error():
+    values = np.random.default_rng(1).lognormal(2, 0.8, 200_000)
+    sketch = KLLSketch(k=128)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+    assert sketch.count == len(values)
+    assert sum(len(level) for level in sketch.levels) < 3 * 128 + len(sketch.levels)
+
+    qs = np.array([0.01, 0.25, 0.5, 0.75, 0.99])
+    ranks = np.searchsorted(np.sort(values), sketch.quantiles(qs)) / len(values)
+    assert np.abs(ranks - qs).max() < 0.03
+    assert sketch.quantiles([0, 1]).tolist() == [values.min(), values.max()]
+
+def test_kll_merge_matches_single_pass_accuracy():
+    values = np.random.default_rng(2).normal(30, 10, 100_000)
+    parts = [KLLSketch().update(part) for part in np.array_split(values, 4)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.count == len(values)
+    assert abs(merged.quantiles([0.5])[0] - np.median(values)) < 0.5
+
+def test_kll_round_trips_through_arrays():
+    sketch = KLLSketch().update(np.arange(10_000.0))
+    loaded = KLLSketch.from_arrays(sketch.to_arrays('speed'), 'speed')
+    assert loaded.quantiles([0.1, 0.9]).tolist() == sketch.quantiles([0.1, 0.9]).tolist()
+
+def test_moments_merge_matches_numpy():
+    rng = np.random.default_rng(3)
+    matrix = rng.normal([1e6, 5, -3], [1, 2, 0.5], size=(50_000, 3))
+    matrix[10, 1] = np.nan
+    moments = Moments(3)
+    for chunk in np.array_split(matrix, 7):
+        moments.update(chunk)
+
+    complete = matrix[~np.isnan(matrix).any(axis=1)]
+    assert moments.count == len(complete)
+    np.testing.assert_allclose(moments.mean, complete.mean(axis=0))
+    np.testing.assert_allclose(moments.covariance(), np.cov(complete, rowvar=False, ddof=0), rtol=1e-7, atol=1e-10)
+    np.testing.assert_allclose(moments.correlation(), np.corrcoef(complete, rowvar=False), atol=1e-9)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.storage import TableWriter, infer_format, iter_table, read_table, write_table
+
+STORED_COLUMNS = ['pickup_datetime', 'trip_speed_mph', 'tip_percentage', 'is_peak_hour', 'trip_type']
+
+def test_infer_format_from_extension():
+    assert infer_format('data/trips.parquet') == 'parquet'
+    assert infer_format('data/trips.feather') == 'feather'
+    assert infer_format('data/trips.csv') == 'csv'
+    assert infer_format('data/trips.csv', 'parquet') == 'parquet'
+    with pytest.raises(ValueError):
+        infer_format('data/trips.csv', 'xlsx')
+
+@pytest.mark.parametrize('name', ['trips.csv', 'trips.parquet', 'trips.feather', 'trips.npy'])
+def test_round_trip_keeps_types(tmp_path, name, enriched_trips):
+    if name.endswith(('.parquet', '.feather')):
+        pytest.importorskip('pyarrow')
+    df = enriched_trips(3)[STORED_COLUMNS]
+    # Text timestamps parse at microseconds, synthetic pickups are whole seconds
+    df['pickup_datetime'] = df['pickup_datetime'].astype('datetime64[us]')
+    path = tmp_path / name
+    with TableWriter(path) as writer:
+        writer.write(df.iloc[:2])
+        writer.write(df.iloc[2:])
+
+    loaded = read_table(path)
+    pd.testing.assert_frame_equal(loaded, df)
+    assert loaded['trip_type'].dtype == df['trip_type'].dtype
+    assert loaded['pickup_datetime'].dtype.kind == 'M'
+
+@pytest.mark.parametrize('name', ['trips.csv', 'trips.parquet', 'trips.npy'])
+def test_reads_only_requested_columns(tmp_path, name, enriched_trips):
+    if name.endswith('.parquet'):
+        pytest.importorskip('pyarrow')
+    path = tmp_path / name
+    with TableWriter(path) as writer:
+        writer.write(enriched_trips(3)[STORED_COLUMNS])
+
+    loaded = read_table(path, columns=['trip_type', 'is_peak_hour', 'missing'])
+    assert list(loaded.columns) == ['is_peak_hour', 'trip_type']
+    chunks = list(iter_table(path, 2, columns=['trip_speed_mph']))
+    assert [len(c) for c in chunks] == [2, 1]
+
+def test_npy_table_is_memory_mapped(tmp_path, enriched_trips):
+    path = tmp_path / 'trips.npy'
+    write_table(enriched_trips(3)[STORED_COLUMNS], path)
+    assert infer_format(path, None) == 'npy'
+    assert sorted(p.name for p in path.iterdir()) == ['_columns.json', 'is_peak_hour.npy', 'pickup_datetime.npy',
+                                                      'tip_percentage.npy', 'trip_speed_mph.npy', 'trip_type.npy']
+    assert np.load(path / 'trip_type.npy').dtype == 'int8'
+
+    values = read_table(path)['trip_speed_mph'].to_numpy()
+    while not isinstance(values, np.memmap):
+        values = values.base
+    assert values.filename == str(path / 'trip_speed_mph.npy')
+
+def test_npy_table_merges_text_categories_across_chunks(tmp_path):
+    path = tmp_path / 'trips.npy'
+    with TableWriter(path) as writer:
+        writer.write(pd.DataFrame({'store_and_fwd_flag': ['N', 'N']}))
+        writer.write(pd.DataFrame({'store_and_fwd_flag': ['Y', None]}))
+    loaded = read_table(path, dtypes={})
+    assert loaded['store_and_fwd_flag'].tolist()[:3] == ['N', 'N', 'Y']
+    assert loaded['store_and_fwd_flag'].isna().tolist() == [False, False, False, True]
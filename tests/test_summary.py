@@ -0,0 +1,39 @@
+import numpy as np
+from scripts.storage import write_table
+from scripts.summary import (load_summary, merge_summaries, save_summary, summarize_file, summarize_frame,
+                             summary_rule_results)
+from scripts.validate_curated import main as validate_main
+
+def test_partition_summaries_merge_into_the_whole(enriched_trips):
+    df = enriched_trips()
+    whole = summarize_frame(df)
+    merged = merge_summaries(summarize_frame(df.iloc[:7000]), summarize_frame(df.iloc[7000:]))
+
+    assert merged['rows'] == whole['rows'] == len(df)
+    for key, value in whole['aggregates'].items():
+        np.testing.assert_allclose(merged['aggregates'][key], value)
+    assert merged['violations'] == whole['violations']
+    np.testing.assert_allclose(merged['moments'].correlation(), whole['moments'].correlation(), atol=1e-9)
+    median = np.median(df['trip_speed_mph'])
+    assert abs(merged['sketches']['trip_speed_mph'].quantiles([0.5])[0] - median) < 1.0
+
+def test_summary_file_is_small_and_round_trips(tmp_path, enriched_trips):
+    path = tmp_path / 'enriched.csv'
+    write_table(enriched_trips(), path)
+    summary = summarize_file(path, chunksize=4000)
+    save_summary(summary, tmp_path / 'summary.npz')
+
+    assert (tmp_path / 'summary.npz').stat().st_size < 64 * 1024
+    loaded = load_summary(tmp_path / 'summary.npz')
+    assert loaded['rows'] == summary['rows']
+    assert loaded['violations'] == summary['violations']
+    assert loaded['sketches']['tip_percentage'].quantiles([0.9]) == summary['sketches']['tip_percentage'].quantiles([0.9])
+    assert [r.name for r in summary_rule_results(loaded)] == ['unrealistic_speed', 'invalid_tip_percentage',
+                                                              'invalid_trip_type', 'invalid_peak_hour']
+
+def test_validate_from_summary(tmp_path, capsys, enriched_trips):
+    df = enriched_trips(2000)
+    df.loc[:2, 'trip_speed_mph'] = 150.0
+    save_summary(summarize_frame(df), tmp_path / 'summary.npz')
+    validate_main(['--summary', str(tmp_path / 'summary.npz')])
+    assert 'Unrealistic speeds found: 3 records' in capsys.readouterr().out
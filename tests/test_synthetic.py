@@ -0,0 +1,18 @@
+import pandas as pd
+from scripts.clean_curate import curate_frame, read_raw
+from scripts.synthetic import generate_trips, write_trips
+
+def test_generate_trips_is_reproducible():
+    pd.testing.assert_frame_equal(generate_trips(500, seed=3), generate_trips(500, seed=3))
+    assert not generate_trips(500, seed=3).equals(generate_trips(500, seed=4))
+
+def test_written_trips_survive_curation(tmp_path):
+    path = tmp_path / 'trips.csv'
+    assert write_trips(path, 2500, seed=1, chunk_rows=1000) == 2500
+
+    raw = read_raw(path)[0]
+    assert len(raw) == 2500
+    assert raw['passenger_count'].isna().any()
+    enriched = curate_frame(raw)
+    assert 0 < len(enriched) < len(raw)
+    assert (enriched['trip_speed_mph'] <= 100).all()
@@ -1,6 +1,7 @@
 import pytest
 import pandas as pd
-from scripts.validate_curated import validate_curated_data
+from scripts.storage import write_table
+from scripts.validate_curated import main, run_validation_rules, validate_curated_data, validate_file
 
 def test_validate_curated_data_valid():
     df = pd.DataFrame({
@@ -54,4 +55,62 @@ def test_validate_curated_data_invalid_peak():
     })
     errors = validate_curated_data(df)
     assert len(errors) == 1
-    assert "Invalid peak hour indicators" in errors[0]
\ No newline at end of file
+    assert "Invalid peak hour indicators" in errors[0]
+
+def test_run_validation_rules_reports_counts_and_sample_rows():
+    df = pd.DataFrame({
+        'trip_speed_mph': [50, 150, 30, 120],
+        'tip_percentage': [10, 20, -5, 5],
+        'trip_type': pd.Categorical(['short', 'medium', None, 'long']),
+        'is_peak_hour': [0, 1, 0, 1]
+    }, index=[10, 11, 12, 13])
+    results = {r.name: r for r in run_validation_rules(df, sample_size=1)}
+    assert results['unrealistic_speed'].violations == 2
+    assert results['unrealistic_speed'].sample_indices == [11]
+    assert results['invalid_tip_percentage'].sample_indices == [12]
+    assert results['invalid_trip_type'].violations == 1
+    assert results['invalid_peak_hour'].violations == 0
+
+@pytest.mark.parametrize('name', ['enriched.csv', 'enriched.npy'])
+def test_validate_file_streaming_matches_full_read(tmp_path, name):
+    path = tmp_path / name
+    write_table(pd.DataFrame({
+        'trip_speed_mph': [50, 150, 30, 120, 20, 130, 40],
+        'tip_percentage': [10, 20, 5, 5, 200, 5, 5],
+        'trip_type': ['short', 'medium', 'long', 'short', 'long', 'bogus', 'short'],
+        'is_peak_hour': [0, 1, 0, 1, 0, 1, 0],
+    }), path)
+
+    full, full_rows = validate_file(path)
+    streamed, streamed_rows = validate_file(path, chunksize=3)
+    assert full_rows == streamed_rows == 7
+    assert {r.name: (r.violations, r.sample_indices) for r in full} == \
+        {r.name: (r.violations, r.sample_indices) for r in streamed}
+
+    first_failure, checked = validate_file(path, chunksize=3, fail_fast=True)
+    assert checked == 3
+    assert sum(r.violations for r in first_failure) == 1
+
+def test_main_exit_status(tmp_path, capsys):
+    assert main(['--input', str(tmp_path / 'missing.csv'), '--fail-fast']) == 1
+    write_table(pd.DataFrame({
+        'trip_speed_mph': [50, 150], 'tip_percentage': [10, 20],
+        'trip_type': ['short', 'long'], 'is_peak_hour': [0, 1],
+    }), tmp_path / 'enriched.csv')
+    assert main(['--input', str(tmp_path / 'enriched.csv')]) == 0
+    assert main(['--input', str(tmp_path / 'enriched.csv'), '--fail-fast']) == 1
+    assert 'Stopped after' not in capsys.readouterr().out
+    assert main(['--input', str(tmp_path / 'enriched.csv'), '--chunksize', '1', '--fail-fast']) == 1
+    assert 'Stopped after the first failing chunk (2 rows checked)' in capsys.readouterr().out
+    assert main(['--input', str(tmp_path / 'enriched.csv'), '--sample', '10', '--fail-fast']) == 1
+
+def test_malformed_peak_flags_in_csv_are_reported(tmp_path):
+    path = tmp_path / 'enriched.csv'
+    path.write_text('trip_speed_mph,tip_percentage,trip_type,is_peak_hour\n'
+                    '50,10,short,0\n30,20,medium,\n20,5,long,1.0\n40,5,short,2\n')
+    for chunksize in (None, 2):
+        results, checked = validate_file(path, chunksize=chunksize)
+        peak = {r.name: r for r in results}['invalid_peak_hour']
+        assert checked == 4
+        assert peak.violations == 2 and peak.sample_indices == [1, 3]
+    assert main(['--input', str(path), '--fail-fast']) == 1
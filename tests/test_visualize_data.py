@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+pytest.importorskip('matplotlib')
+pytest.importorskip('seaborn')
+
+import matplotlib.pyplot as plt
+from scripts.aggregates import compute_plot_aggregates
+from scripts.storage import write_table
+from scripts.visualize_data import CHARTS, create_visualizations, render_charts
+
+def test_render_charts_skips_unchanged_charts(tmp_path, enriched_trips):
+    aggregates = compute_plot_aggregates(enriched_trips(500))
+    plots_dir = str(tmp_path)
+    first = render_charts(aggregates, plots_dir, dpi=20, workers=1)
+    assert sorted(first) == sorted(CHARTS)
+    assert all(os.path.exists(os.path.join(plots_dir, f'{name}.png')) for name in CHARTS)
+
+    assert render_charts(aggregates, plots_dir, dpi=20, workers=1) == []
+
+    changed = dict(aggregates)
+    changed['trip_type_counts'] = changed['trip_type_counts'] + 1
+    assert render_charts(changed, plots_dir, dpi=20, workers=1) == ['nyc_taxi_features_overview']
+    assert len(render_charts(changed, plots_dir, dpi=30, workers=1)) == len(CHARTS)
+
+def test_sampled_row_charts(tmp_path, monkeypatch, enriched_trips):
+    monkeypatch.setattr(plt, 'show', lambda: None)
+    write_table(enriched_trips(5000), tmp_path / 'enriched.csv')
+    create_visualizations(str(tmp_path / 'enriched.csv'), plots_dir=str(tmp_path / 'plots'), sample=1000,
+                          chunksize=2000)
+    assert len(list((tmp_path / 'plots').glob('*.png'))) == 5
+
+def test_render_charts_leaves_pyplot_state_alone(tmp_path, enriched_trips):
+    aggregates = compute_plot_aggregates(enriched_trips(500))
+    backend, salt = plt.get_backend(), plt.rcParams['svg.hashsalt']
+    figure = plt.figure()
+    render_charts(aggregates, str(tmp_path / 'a'), dpi=20, image_format='svg', workers=1)
+    render_charts(aggregates, str(tmp_path / 'b'), dpi=20, image_format='svg', workers=1)
+    assert plt.get_backend() == backend and plt.rcParams['svg.hashsalt'] == salt
+    assert plt.fignum_exists(figure.number)
+    plt.close(figure)
+    for name in CHARTS:
+        assert (tmp_path / 'a' / f'{name}.svg').read_bytes() == (tmp_path / 'b' / f'{name}.svg').read_bytes()
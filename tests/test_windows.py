@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.clean_curate import main as curate_main
+from scripts.storage import read_table
+from scripts.synthetic import generate_trips
+from scripts.windows import WINDOW_COLUMNS, WindowAggregator, add_window_features
+
+def chunked(df, size):
+    return (df.iloc[start:start + size].copy() for start in range(0, len(df), size))
+
+def test_chunked_features_match_one_pass(enriched_trips):
+    df = enriched_trips(days=3, sort=True)
+    whole = pd.concat(add_window_features([df.copy()]))
+    streamed = pd.concat(add_window_features(chunked(df, 1234)))
+    assert set(WINDOW_COLUMNS) <= set(streamed.columns)
+    pd.testing.assert_frame_equal(streamed, whole)
+
+def test_bucket_features_match_a_group_by(enriched_trips):
+    df = enriched_trips(days=3, sort=True)
+    result = pd.concat(add_window_features(chunked(df, 5000)))
+    buckets = result['pickup_datetime'].dt.floor('15min')
+    np.testing.assert_array_equal(result['bucket_trips'], buckets.map(buckets.value_counts()))
+    medians = result.groupby(buckets)['trip_speed_mph'].median()
+    np.testing.assert_allclose(result['bucket_median_speed'], buckets.map(medians), rtol=1e-5)
+
+def test_zone_pickups_count_the_last_hour(enriched_trips):
+    df = enriched_trips(3000, days=3, sort=True)
+    result = pd.concat(add_window_features(chunked(df, 700)))
+    seconds = result['pickup_datetime'].to_numpy().astype('datetime64[s]').astype('int64')
+    zones = result['PULocationID'].to_numpy()
+    for row in range(0, len(result), 97):
+        earlier = np.arange(len(result)) < row
+        expected = (earlier & (zones == zones[row]) & (seconds > seconds[row] - 3600)).sum()
+        assert result['zone_pickups_last_hour'].iloc[row] == expected
+
+def test_unsorted_rows_within_a_bucket_do_not_depend_on_chunking(enriched_trips):
+    df = pd.DataFrame({
+        'pickup_datetime': pd.to_datetime(['2024-01-01 00:00:00', '2024-01-01 00:59:30',
+                                           '2024-01-01 01:00:50', '2024-01-01 01:00:20']),
+        'PULocationID': [5, 5, 5, 5],
+        'trip_speed_mph': [10.0, 12.0, 14.0, 16.0],
+    })
+    whole = pd.concat(add_window_features([df.copy()]))
+    split = pd.concat(add_window_features([df.iloc[:3].copy(), df.iloc[3:].copy()]))
+    pd.testing.assert_frame_equal(split, whole)
+    assert whole.set_index('pickup_datetime').loc['2024-01-01 01:00:50', 'zone_pickups_last_hour'] == 2
+
+    # Shuffle the trips of every bucket, keeping the buckets in order
+    trips = enriched_trips(days=3, sort=True)
+    buckets = trips['pickup_datetime'].dt.floor('15min')
+    shuffled = trips.assign(_key=np.random.default_rng(3).random(len(trips)), _bucket=buckets)
+    shuffled = shuffled.sort_values(['_bucket', '_key']).drop(columns=['_key', '_bucket'])
+    expected = pd.concat(add_window_features([trips.copy()]))
+    for size in (700, 2500):
+        result = pd.concat(add_window_features(chunked(shuffled, size)))
+        pd.testing.assert_frame_equal(result.sort_index(), expected.sort_index())
+
+def test_bucket_series_lists_every_bucket(enriched_trips):
+    df = enriched_trips(days=3, sort=True)
+    aggregator = WindowAggregator()
+    for chunk in chunked(df, 3000):
+        aggregator.update(chunk)
+    aggregator.finish()
+    series = aggregator.bucket_series()
+    assert series['trips'].sum() == len(df)
+    assert series['bucket_start'].is_monotonic_increasing
+    assert series['bucket_start'].is_unique
+
+def test_out_of_order_chunks_are_rejected(enriched_trips):
+    df = enriched_trips(2000, days=3, sort=True)
+    aggregator = WindowAggregator()
+    aggregator.update(df.iloc[1000:].copy())
+    with pytest.raises(ValueError):
+        aggregator.update(df.iloc[:1000].copy())
+
+def test_clean_curate_adds_window_features(tmp_path):
+    raw = generate_trips(5000, days=2).sort_values('tpep_pickup_datetime', kind='stable')
+    raw.to_csv(tmp_path / 'raw.csv', index=False)
+    curate_main(['--input', str(tmp_path / 'raw.csv'), '--output', str(tmp_path / 'enriched.csv'),
+                 '--chunksize', '800', '--windows', '--window-series', str(tmp_path / 'series.csv')])
+
+    df = read_table(tmp_path / 'enriched.csv')
+    assert set(WINDOW_COLUMNS) <= set(df.columns)
+    assert df['pickup_datetime'].is_monotonic_increasing
+    series = read_table(tmp_path / 'series.csv')
+    assert series['trips'].sum() == len(df)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from scripts.clean_curate import main as curate_main
+from scripts.storage import read_table
+from scripts.synthetic import write_trips
+from scripts.zones import (ZONE_COLUMNS, add_zone_columns, borough_table, build_zone_lookup,
+                           compute_zone_aggregates, merge_zone_aggregates, top_od_pairs, zone_table)
+
+BOROUGHS = ['Bronx', 'Brooklyn', 'EWR', 'Manhattan', 'Queens', 'Staten Island']
+
+def zone_frame():
+    # Same layout as the TLC taxi_zone_lookup.csv, with a zone missing its name like ID 265
+    ids = np.arange(1, 266)
+    return pd.DataFrame({
+        'LocationID': ids,
+        'Borough': [BOROUGHS[i % len(BOROUGHS)] for i in ids],
+        'Zone': [f'Zone {i}' if i != 265 else None for i in ids],
+        'service_zone': ['Yellow Zone' if i % 3 else 'Boro Zone' for i in ids],
+    })
+
+def test_zone_columns_match_a_merge(enriched_trips):
+    df = enriched_trips()
+    df.loc[:4, 'PULocationID'] = [0, 264, 265, 300, -5]
+    zones = zone_frame()
+    add_zone_columns(df, build_zone_lookup(zones))
+
+    merged = df[['PULocationID']].merge(zones, left_on='PULocationID', right_on='LocationID', how='left')
+    assert df['pickup_borough'].astype(object).equals(merged['Borough'].astype(object))
+    assert df['pickup_zone'].astype(object).equals(merged['Zone'].astype(object))
+    assert isinstance(df['dropoff_service_zone'].dtype, pd.CategoricalDtype)
+    assert df.loc[:4, 'pickup_zone'].isna().tolist() == [True, False, True, True, True]
+
+def test_zone_aggregates_match_group_bys(enriched_trips):
+    df = enriched_trips()
+    aggregates = merge_zone_aggregates(compute_zone_aggregates(df.iloc[:5000]),
+                                       compute_zone_aggregates(df.iloc[5000:]))
+    lookup = build_zone_lookup(zone_frame())
+
+    pickups = df['PULocationID'].value_counts()
+    assert (aggregates['pickups'][pickups.index] == pickups.to_numpy()).all()
+    pairs = df.groupby(['PULocationID', 'DOLocationID']).size()
+    assert aggregates['od_trips'].sum() == len(df)
+    assert aggregates['od_trips'][pairs.index[0]] == pairs.iloc[0]
+
+    zones = zone_table(aggregates, lookup)
+    expected = df.groupby('PULocationID')['trip_distance'].mean()
+    np.testing.assert_allclose(zones.set_index('LocationID').loc[expected.index, 'mean_trip_distance'], expected,
+                               rtol=1e-5)
+    assert borough_table(aggregates, lookup)['pickups'].sum() == len(df)
+
+    top = top_od_pairs(aggregates, lookup, n=5)
+    assert top['trips'].tolist() == sorted(pairs.nlargest(5).tolist(), reverse=True)
+    assert top['trips'].is_monotonic_decreasing
+
+def test_clean_curate_adds_zone_columns(tmp_path):
+    write_trips(tmp_path / 'raw.csv', 3000)
+    zone_frame().to_csv(tmp_path / 'zones.csv', index=False)
+    curate_main(['--input', str(tmp_path / 'raw.csv'), '--output', str(tmp_path / 'enriched.csv'),
+                 '--features', 'trip_type', '--zone-lookup', str(tmp_path / 'zones.csv')])
+
+    df = read_table(tmp_path / 'enriched.csv')
+    assert set(ZONE_COLUMNS) <= set(df.columns)
+    assert isinstance(df['pickup_borough'].dtype, pd.CategoricalDtype)
+    assert set(df['pickup_borough'].dropna().unique()) <= set(BOROUGHS)